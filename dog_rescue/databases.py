@@ -0,0 +1,59 @@
+"""
+SQLite connection settings for the database profiles chosen with DOG_RESCUE_DB_PROFILE.
+
+development: Django's defaults - rollback journal, a connection per request.
+
+production: write-ahead logging, so readers never wait for the writer and the writer never
+waits for readers; synchronous=NORMAL, which is durable in WAL mode except for the last
+transactions on power loss; a memory map and a larger page cache for reads; and a busy
+timeout, so a writer waits for the lock instead of failing with "database is locked".
+Write transactions start with BEGIN IMMEDIATE: a deferred transaction that reads first
+cannot wait for the lock when it later writes and fails at once. Connections are kept
+open between requests.
+"""
+
+PROFILES = ('development', 'production')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    # Negative values are KiB: 64 MB per connection
+    'cache_size': -65536,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Seconds a connection is kept open between requests (checked before reuse)
+CONN_MAX_AGE = 600
+
+
+def init_command(pragmas):
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items())
+
+
+def sqlite_database(path, profile='development', read_only=False):
+    """DATABASES entry for the SQLite file at path."""
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown database profile {profile!r}, expected one of {", ".join(PROFILES)}')
+    database = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+    }
+    if profile == 'development':
+        return database
+
+    pragmas = dict(SQLITE_PRAGMAS)
+    if read_only:
+        # Set last: the pragmas above may need to write (journal_mode on a new file)
+        pragmas['query_only'] = 'ON'
+    database.update({
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': init_command(pragmas),
+            # A read-only connection never writes, and must not take the write lock
+            'transaction_mode': 'DEFERRED' if read_only else 'IMMEDIATE',
+        },
+    })
+    return database
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from dog_rescue.databases import sqlite_database
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,12 +44,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'records.replicas.ReplicaMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -76,12 +80,30 @@ WSGI_APPLICATION = 'dog_rescue.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DOG_RESCUE_DB_PROFILE=production turns on WAL, pragmas and persistent connections
+# (see dog_rescue/databases.py) and adds a read-only 'replica' connection. The views marked
+# with records.replicas.ReplicaReadMixin (dashboard, charter detail, lists, exports) read
+# from it, except for users who just wrote something. DOG_RESCUE_REPLICA_PATH points it at a
+# copy of the database (e.g. one kept by Litestream, or for a local test a copy made with
+# sqlite3 db.sqlite3 ".backup replica.sqlite3"); by default it is the same file, opened
+# query-only, which in WAL mode reads alongside the writer. A copy that lags behind must not
+# be used while records.caching is on, as a page cached from it would keep the old data.
+
+DATABASE_PROFILE = os.environ.get('DOG_RESCUE_DB_PROFILE', 'development')
+DATABASE_PATH = os.environ.get('DOG_RESCUE_DB_PATH', BASE_DIR / 'db.sqlite3')
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': sqlite_database(DATABASE_PATH, DATABASE_PROFILE),
 }
+if DATABASE_PROFILE == 'production':
+    DATABASES['replica'] = sqlite_database(
+        os.environ.get('DOG_RESCUE_REPLICA_PATH', DATABASE_PATH), DATABASE_PROFILE, read_only=True
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+# Connection read-only views read the records models from (records.replicas), or None
+RECORDS_REPLICA_DATABASE = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['records.replicas.ReplicaRouter']
 
 
 # Password validation
@@ -129,4 +151,48 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL='main:login'
-LOGIN_REDIRECT_URL='main:dashboard'
\ No newline at end of file
+LOGIN_REDIRECT_URL='main:dashboard'
+
+# Caching
+# records.caching keys cached pages data and template fragments on per-model version counters
+# stored in this cache, so every process that writes records (web workers, process_photo_jobs,
+# import_records, generate_test_database, benchmark) has to share it to see the bumps: files
+# under DOG_RESCUE_CACHE_DIR by default, or Memcached/Redis. Tests run on a local memory
+# cache of their own (main.testing.TestRunner).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DOG_RESCUE_CACHE_DIR', BASE_DIR / 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+# Cached context and fragments expire after this many seconds even if no bump retires them
+RECORDS_CACHE_TIMEOUT = 60 * 60
+TEST_RUNNER = 'main.testing.TestRunner'
+
+# Request instrumentation (main.middleware)
+# Per-request query counts and timings, aggregated per URL name on /performance/ (staff only).
+# Off by default as it wraps every query; turn on with DOG_RESCUE_INSTRUMENTATION=1 while
+# profiling. The test runner (main.testing) always turns it on for the query budget tests.
+PERFORMANCE_INSTRUMENTATION = os.environ.get('DOG_RESCUE_INSTRUMENTATION') == '1'
+PERFORMANCE_SLOWEST_QUERIES = 5
+
+# Async views (records.asynchronous)
+# Serves the dashboard, charter detail and dog list with async views that run a page's
+# independent queries at the same time. Turn on when serving dog_rescue.asgi from an ASGI
+# server (e.g. uvicorn dog_rescue.asgi:application); under WSGI each async view would get
+# an event loop of its own.
+ASYNC_VIEWS = os.environ.get('DOG_RESCUE_ASYNC_VIEWS') == '1'
+
+# Document downloads (records.downloads)
+# Set to 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache, lighttpd) to let the front proxy
+# send document files; with X-Accel-Redirect the proxy maps RECORDS_SENDFILE_URL to MEDIA_ROOT.
+RECORDS_SENDFILE_HEADER = None
+RECORDS_SENDFILE_URL = '/protected/'
+
+# Changes feed (records.sync)
+# Changes are only served once they are this many seconds old, so a transaction that commits
+# a moment after stamping its rows is never skipped. Keep it above the SQLite busy timeout.
+RECORDS_SYNC_SETTLE_SECONDS = 10
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from .middleware import instrument
+        # Before the first connection is opened, whichever thread opens it. instrument()
+        # checks PERFORMANCE_INSTRUMENTATION itself, so the test runner can turn it on later.
+        connection_created.connect(instrument, dispatch_uid='main.middleware.instrument')
@@ -0,0 +1,202 @@
+import heapq
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Per-request SQL and rendering measurements, aggregated per URL name in this process.
+# Enabled with PERFORMANCE_INSTRUMENTATION; numbers are visible to staff (and to everyone
+# when DEBUG is on) as response headers and on the main:performance report page.
+
+
+class QueryRecorder:
+    """connection.execute_wrapper() hook timing every query run during a request."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Async views run queries on several threads at once
+            with self.lock:
+                self.count += 1
+                self.duration += elapsed
+                self.queries.append((elapsed, context['connection'].alias, sql))
+
+    def slowest(self, count):
+        return heapq.nlargest(count, self.queries, key=lambda query: query[0])
+
+
+# The recorder of the request being served. Every connection runs its queries through
+# record_query, which finds the recorder in the current context: that covers the threads
+# async requests use too (sync_to_async copies the context), each of which has its own
+# connections.
+active_recorder = ContextVar('active_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = active_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def instrument(connection, **kwargs):
+    """connection_created handler (connected by MainConfig) adding record_query to a connection."""
+    if not getattr(settings, 'PERFORMANCE_INSTRUMENTATION', False):
+        return
+    if record_query not in connection.execute_wrappers:
+        # At the front, so execute_wrapper() blocks still pop the wrapper they pushed
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class ViewStats:
+    """Running totals for one URL name."""
+
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.slowest_queries = []
+
+    def add(self, total, recorder, render, keep):
+        self.requests += 1
+        self.total_time += total
+        self.max_time = max(self.max_time, total)
+        self.db_time += recorder.duration
+        self.render_time += render
+        self.queries += recorder.count
+        self.max_queries = max(self.max_queries, recorder.count)
+        self.slowest_queries = heapq.nlargest(
+            keep, self.slowest_queries + recorder.slowest(keep), key=lambda query: query[0]
+        )
+
+    @property
+    def avg_time_ms(self):
+        return self.total_time / self.requests * 1000
+
+    @property
+    def max_time_ms(self):
+        return self.max_time * 1000
+
+    @property
+    def avg_db_time_ms(self):
+        return self.db_time / self.requests * 1000
+
+    @property
+    def avg_render_time_ms(self):
+        return self.render_time / self.requests * 1000
+
+    @property
+    def slowest_queries_ms(self):
+        return [(duration * 1000, alias, sql) for duration, alias, sql in self.slowest_queries]
+
+    @property
+    def avg_queries(self):
+        return self.queries / self.requests
+
+
+class PerformanceReport:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, name, total, recorder, render):
+        keep = getattr(settings, 'PERFORMANCE_SLOWEST_QUERIES', 5)
+        with self.lock:
+            if name not in self.views:
+                self.views[name] = ViewStats(name)
+            self.views[name].add(total, recorder, render, keep)
+
+    def snapshot(self):
+        """Per-view stats, slowest on average first"""
+        with self.lock:
+            return sorted(self.views.values(), key=lambda stats: stats.avg_time_ms, reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+
+report = PerformanceReport()
+
+
+class InstrumentationMiddleware:
+    """
+    Counts and times the SQL queries of every request, measures template rendering and
+    records them under the request's URL name (e.g. 'records:dog_list'). Place it near the
+    top of MIDDLEWARE so the totals cover the rest of the stack. Supports both sync and
+    async requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder, token, start = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            active_recorder.reset(token)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder, token, start = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            active_recorder.reset(token)
+        return self.finish(request, response, recorder, start)
+
+    def start(self, request):
+        request._render_time = 0.0
+        recorder = QueryRecorder()
+        return recorder, active_recorder.set(recorder), time.perf_counter()
+
+    def finish(self, request, response, recorder, start):
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        name = match.view_name if match else 'unresolved'
+        report.record(name, total, recorder, request._render_time)
+
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['X-Query-Count'] = str(recorder.count)
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f}, '
+                f'render;dur={request._render_time * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}'
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        """Times render(), including any lazy queries the template runs."""
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._render_time += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
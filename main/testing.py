@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests on a local memory cache, so they neither read nor clear the shared one,
+    and with request instrumentation on whatever the environment says.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(CACHES=TEST_CACHES, PERFORMANCE_INSTRUMENTATION=True)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for declaring how many SQL queries a page may run. A budget is an upper
+    bound, so it only fails when a change adds queries, typically an N+1 in a template.
+    Caches are cleared before every test so budgets measure the uncached path.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = get_user_model().objects.create_user('budget', password='budget', is_staff=True)
+        self.client.force_login(self.user)
+
+    def assertQueryBudget(self, budget, url_name, *args, query=None, using='default', **kwargs):
+        url = reverse(url_name, args=args, kwargs=kwargs)
+        if query:
+            url = f'{url}?{query}'
+        with CaptureQueriesContext(connections[using]) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, f'GET {url}')
+        executed = len(queries.captured_queries)
+        if executed > budget:
+            listing = '\n'.join(
+                f'{number}. {query["sql"]}' for number, query in enumerate(queries.captured_queries, 1)
+            )
+            self.fail(f'GET {url} ran {executed} queries, over its budget of {budget}:\n{listing}')
+        return response
@@ -1,3 +1,108 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.utils import ConnectionHandler, OperationalError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from dog_rescue.databases import sqlite_database
+from main.testing import QueryBudgetMixin
+from records.models import DogHealthStatus, DogIntakeStatus, DogVaccinationStatus
+from records.tests import create_charter, create_contact, create_dogs
 
 # Create your tests here.
+
+
+class DashboardQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(5):
+            create_dogs(create_charter(f'Charter {number}'), 4)
+
+    def test_dashboard(self):
+        self.assertQueryBudget(3, 'main:dashboard')
+
+    def test_instrumentation_headers(self):
+        response = self.client.get(reverse('main:dashboard'))
+        self.assertIn('X-Query-Count', response)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    async def test_instrumentation_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('main:dashboard'))
+        self.assertEqual(response['X-Query-Count'], '3')
+
+
+class DashboardStatisticsTests(TestCase):
+
+    def setUp(self):
+        # Versions are only bumped on commit, which a TestCase never reaches
+        cache.clear()
+        self.client.force_login(get_user_model().objects.create_user('dashboard'))
+
+    def test_counters_match_the_dogs(self):
+        owner = create_contact('Dashboard Owner', '555-500-0000')
+        first, second = create_charter('First Charter'), create_charter('Second Charter')
+        dogs = create_dogs(first, 3) + create_dogs(second, 2, owner=owner)
+        for dog in dogs[:2]:
+            dog.health_status = DogHealthStatus.SICK
+            dog.vaccination_status = DogVaccinationStatus.COMPLETE
+            dog.save()
+        dogs[3].intake_status = DogIntakeStatus.HOTEL
+        dogs[3].save()
+
+        context = self.client.get(reverse('main:dashboard')).context
+        self.assertEqual(context['total_dogs'], 5)
+        self.assertEqual((context['owned_dogs'], context['unowned_dogs']), (2, 3))
+        self.assertEqual((context['sick_dogs'], context['complete_vaccination_dogs']), (2, 2))
+        self.assertEqual((context['rescue_dogs'], context['hotel_dogs']), (4, 1))
+        per_charter = {charter.pk: charter.dog_count for charter in context['charters']}
+        self.assertEqual(per_charter, {first.pk: 3, second.pk: 2})
+
+
+class PerformanceReportTests(TestCase):
+
+    def test_staff_only(self):
+        user = get_user_model().objects.create_user('volunteer', password='volunteer')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('main:performance')).status_code, 403)
+
+    def test_report_lists_views(self):
+        user = get_user_model().objects.create_user('staff', password='staff', is_staff=True)
+        self.client.force_login(user)
+        self.client.post(reverse('main:performance'))
+        self.client.get(reverse('main:dashboard'))
+        response = self.client.get(reverse('main:performance'))
+        self.assertContains(response, 'main:dashboard')
+
+
+class DatabaseProfileTests(SimpleTestCase):
+
+    def test_development_keeps_the_defaults(self):
+        self.assertEqual(sqlite_database('db.sqlite3'), {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'})
+        with self.assertRaises(ValueError):
+            sqlite_database('db.sqlite3', 'staging')
+
+    def test_production_connections(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'db.sqlite3'
+        handler = ConnectionHandler({
+            'default': {},
+            # Not aliases of the test databases, which SimpleTestCase keeps closed
+            'primary': sqlite_database(path, 'production'),
+            'copy': sqlite_database(path, 'production', read_only=True),
+        })
+        self.addCleanup(handler.close_all)
+        with handler['primary'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone(), ('wal',))
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone(), (5000,))
+            cursor.execute('CREATE TABLE kennel (name TEXT)')
+        with handler['copy'].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM kennel')
+            self.assertEqual(cursor.fetchone(), (0,))
+            with self.assertRaises(OperationalError):
+                cursor.execute("INSERT INTO kennel VALUES ('north')")
@@ -1,10 +1,12 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
+from records.asynchronous import select_view
 from . import views
 
 app_name = 'main'
 urlpatterns = [
-    path('', views.DashboardView.as_view(), name='dashboard'),
+    path('', select_view(views.DashboardView, views.AsyncDashboardView), name='dashboard'),
     path('login/', auth_views.LoginView.as_view(template_name='main/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='main:login'), name='logout'),
+    path('performance/', views.PerformanceReportView.as_view(), name='performance'),
 ]
\ No newline at end of file
@@ -1,51 +1,64 @@
-from django.shortcuts import render
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import render, redirect
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.conf import settings
 from django.views.generic import TemplateView
-from records.models import Dog, Charter, DogHealthStatus, DogVaccinationStatus, DogIntakeStatus
-from django.db.models import Count, Q
+from records.asynchronous import AsyncLoginRequiredMixin, run_concurrently
+from records.caching import VersionedCacheMixin, cached
+from records.models import Charter, CharterStats, EntityInfo
+from records.replicas import ReplicaReadMixin
+from records.statistics import read_charter_statistics, global_context, annotate_charters
+from .middleware import report
 # Create your views here.
 # =============================================================================
 # DASHBOARD & MAIN VIEWS (Function-based - complex logic)
 # =============================================================================
 
-class DashboardView(LoginRequiredMixin, TemplateView):
+class DashboardView(LoginRequiredMixin, ReplicaReadMixin, VersionedCacheMixin, TemplateView):
     """Main dashboard - using TemplateView for custom context"""
     template_name = 'main/dashboard.html'
+    cache_models = (Charter, CharterStats, EntityInfo)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.update(self.get_cached_statistics())
+        return context
 
-        # Global statistics
-        context.update({
-            'total_dogs': Dog.objects.count(),
-            'rescue_dogs': Dog.objects.filter(intake_status=DogIntakeStatus.RESCUE).count(),
-            'training_dogs': Dog.objects.filter(intake_status=DogIntakeStatus.TRAINING).count(),
-            'hotel_dogs': Dog.objects.filter(intake_status=DogIntakeStatus.HOTEL).count(),
-            'owned_dogs': Dog.objects.filter(owner__isnull=False).count(),
-            'unowned_dogs': Dog.objects.filter(owner__isnull=True).count(),
-            'healthy_dogs': Dog.objects.filter(health_status=DogHealthStatus.HEALTHY).count(),
-            'sick_dogs': Dog.objects.filter(health_status=DogHealthStatus.SICK).count(),
-            'passed_away_dogs': Dog.objects.filter(health_status=DogHealthStatus.PASSED_AWAY).count(),
-            'unspecified_health_dogs': Dog.objects.filter(health_status=DogHealthStatus.UNSPECIFIED).count(),
-            'complete_vaccination_dogs': Dog.objects.filter(vaccination_status=DogVaccinationStatus.COMPLETE).count(),
-            'incomplete_vaccination_dogs': Dog.objects.filter(vaccination_status=DogVaccinationStatus.INCOMPLETE).count(),
-            'not_vaccinated_dogs': Dog.objects.filter(vaccination_status=DogVaccinationStatus.NOT_VACCINATED).count(),
-            'unspecified_vaccination_dogs': Dog.objects.filter(vaccination_status=DogVaccinationStatus.UNSPECIFIED).count(),
-            'charters': Charter.objects.annotate(
-                dog_count=Count('housed_dogs'),
-                rescue_count=Count('housed_dogs', filter=Q(housed_dogs__intake_status=DogIntakeStatus.RESCUE)),
-                training_count=Count('housed_dogs', filter=Q(housed_dogs__intake_status=DogIntakeStatus.TRAINING)),
-                hotel_count=Count('housed_dogs', filter=Q(housed_dogs__intake_status=DogIntakeStatus.HOTEL)),
-                owned_count=Count('housed_dogs', filter=Q(housed_dogs__owner__isnull=False)),
-                unowned_count=Count('housed_dogs', filter=Q(housed_dogs__owner__isnull=True)),
-                healthy_count=Count('housed_dogs', filter=Q(housed_dogs__health_status=DogHealthStatus.HEALTHY)),
-                sick_count=Count('housed_dogs', filter=Q(housed_dogs__health_status=DogHealthStatus.SICK)),
-                passed_away_count=Count('housed_dogs', filter=Q(housed_dogs__health_status=DogHealthStatus.PASSED_AWAY)),
-                unspecified_health_count=Count('housed_dogs', filter=Q(housed_dogs__health_status=DogHealthStatus.UNSPECIFIED)),
-                complete_vaccination_count=Count('housed_dogs', filter=Q(housed_dogs__vaccination_status=DogVaccinationStatus.COMPLETE)),
-                incomplete_vaccination_count=Count('housed_dogs', filter=Q(housed_dogs__vaccination_status=DogVaccinationStatus.INCOMPLETE)),
-                not_vaccinated_count=Count('housed_dogs', filter=Q(housed_dogs__vaccination_status=DogVaccinationStatus.NOT_VACCINATED)),
-                unspecified_vaccination_count=Count('housed_dogs', filter=Q(housed_dogs__vaccination_status=DogVaccinationStatus.UNSPECIFIED)),
-            ).all(),
-        })
-        return context
\ No newline at end of file
+    def get_cached_statistics(self):
+        return cached(f'main:dashboard:{self.get_cache_versions()}', self.get_statistics)
+
+    def get_statistics(self):
+        # All global and per-charter counters come from the precomputed CharterStats rollup
+        charters = list(Charter.objects.select_related('entity_info', 'stats'))
+        totals, per_charter = read_charter_statistics(charters)
+        statistics = global_context(totals)
+        statistics['charters'] = annotate_charters(charters, per_charter)
+        return statistics
+
+
+class AsyncDashboardView(AsyncLoginRequiredMixin, DashboardView):
+    """DashboardView for ASGI: a single query since the CharterStats rollup, run off the event loop"""
+
+    async def get(self, request, *args, **kwargs):
+        self.statistics, = await run_concurrently(super().get_cached_statistics)
+        return self.render_to_response(self.get_context_data(**kwargs))
+
+    def get_cached_statistics(self):
+        return self.statistics
+
+
+class PerformanceReportView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """Staff-only table of the request timings recorded by InstrumentationMiddleware"""
+    template_name = 'main/performance.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['enabled'] = getattr(settings, 'PERFORMANCE_INSTRUMENTATION', False)
+        context['views'] = report.snapshot()
+        return context
+
+    def post(self, request, *args, **kwargs):
+        report.reset()
+        return redirect('main:performance')
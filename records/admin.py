@@ -1,13 +1,14 @@
 from django.contrib import admin
-from .models import Dog, Contact, Charter, EntityInfo, DogPhotoRecord, DogDocumentRecord, DogWeightRecord
+from .models import Dog, Contact, Charter, EntityInfo, DogPhotoRecord, DogDocumentRecord, DogWeightRecord, PhotoJob
 from django.utils.html import format_html
+from .search import search_dogs, search_entities
 # Register your models here.
 
 
 @admin.register(Dog)
 class DogAdmin(admin.ModelAdmin):
     list_display = ['name', 'get_charter_name', 'get_owner_name', 'arrival_date', 'display_photo_preview']
-    search_fields = ['name', 'charter__entity_info__name', 'owner__entity_info__name']
+    search_fields = ['name', 'microchip_id', 'charter__entity_info__name', 'owner__entity_info__name', 'owner__entity_info__phone']
     readonly_fields = ['modified', 'display_photo_preview']
     fieldsets = (
         ('Basic Information', {
@@ -31,6 +32,20 @@ class DogAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'charter__entity_info', 'owner__entity_info'
+        )
+
+    def get_readonly_fields(self, request, obj=None):
+        # An existing dog's weight is its latest weigh-in
+        readonly_fields = super().get_readonly_fields(request, obj)
+        return [*readonly_fields, 'current_weight_kg'] if obj else readonly_fields
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index instead of icontains scans over search_fields
+        return search_dogs(queryset, search_term), False
+
     def get_charter_name(self, obj):
         return obj.charter.entity_info.name if obj.charter and obj.charter.entity_info else '-'
     get_charter_name.short_description = 'Charter'
@@ -40,19 +55,18 @@ class DogAdmin(admin.ModelAdmin):
     get_owner_name.short_description = 'Owner'
     
     def display_photo_preview(self, obj):
-        if obj.display_photo:
-            if hasattr(obj.display_photo, 'url'):
-                return format_html('<img src="{}" width="100" height="100" style="object-fit: cover; border-radius: 5px;" />', obj.display_photo.url)
-            else:
-                return format_html('<img src="{}" width="100" height="100" style="object-fit: cover; border-radius: 5px;" />', obj.display_photo)
-        return "No photo"
+        return format_html('<img src="{}" width="100" height="100" style="object-fit: cover; border-radius: 5px;" />', obj.admin_photo_url)
     display_photo_preview.short_description = 'Photo Preview'
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ['get_name', 'get_created']
+    list_select_related = ['entity_info']
     search_fields = ['entity_info__name', 'entity_info__phone', 'entity_info__email']
     
+    def get_search_results(self, request, queryset, search_term):
+        return search_entities(queryset, search_term), False
+
     def get_name(self, obj):
         return obj.entity_info.name if obj.entity_info else '-'
     get_name.short_description = 'Name'
@@ -64,8 +78,12 @@ class ContactAdmin(admin.ModelAdmin):
 @admin.register(Charter)
 class CharterAdmin(admin.ModelAdmin):
     list_display = ['get_name']
+    list_select_related = ['entity_info']
     search_fields = ['entity_info__name', 'entity_info__phone', 'entity_info__email']
     
+    def get_search_results(self, request, queryset, search_term):
+        return search_entities(queryset, search_term), False
+
     def get_name(self, obj):
         return obj.entity_info.name if obj.entity_info else '-'
     get_name.short_description = 'Name'
@@ -75,6 +93,9 @@ class EntityInfoAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'phone']
     search_fields = ['name', 'email', 'phone']
 
+    def get_search_results(self, request, queryset, search_term):
+        return search_entities(queryset, search_term, lookup='pk'), False
+
 @admin.register(DogPhotoRecord)
 class DogPhotoRecordAdmin(admin.ModelAdmin):
     list_display = ['dog', 'name', 'is_profile_photo', 'uploaded']
@@ -93,5 +114,9 @@ class DogWeightRecordAdmin(admin.ModelAdmin):
     search_fields = ['dog__name']
     readonly_fields = ['record_date']
 
-
-
+@admin.register(PhotoJob)
+class PhotoJobAdmin(admin.ModelAdmin):
+    list_display = ['photo', 'status', 'attempts', 'created', 'finished']
+    list_filter = ['status']
+    search_fields = ['photo']
+    readonly_fields = ['created', 'started', 'finished', 'attempts', 'error']
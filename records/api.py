@@ -0,0 +1,198 @@
+import hashlib
+from django.db.models import F, Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from records.models import Charter, Contact, Dog
+from records.pagination import NEXT, decode_cursor, encode_cursor
+
+# Read-only JSON over dogs, charters and contacts for the mobile apps. Rows are read with
+# values() in one query per page - no model instances - and only the fields asked for with
+# ?fields=name,breed are selected. Pages are keyset pages, newest first, linked by an opaque
+# ?cursor=. Choice fields are returned as their stored codes.
+#
+# Every page carries an ETag built from the modified timestamps of the rows it shows (and of
+# the related rows its fields come from), so a client revalidating with If-None-Match gets
+# a 304 without the page being serialized or sent again.
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+
+class ApiError(ValueError):
+    """A request the API answers with 400 and the message"""
+
+
+class Resource:
+    """A model served by the API: its fields as (name, values() lookup) pairs."""
+
+    def __init__(self, model, fields, default_fields, created='created', modified='modified', filters=None):
+        self.model = model
+        self.lookups = dict(fields)
+        self.default_fields = default_fields
+        self.created = created
+        self.modified = modified
+        # Query parameter -> integer lookup, e.g. ?charter=3 -> charter_id=3
+        self.filters = filters or {}
+        self.stamps = {name: self.stamp(lookup) for name, lookup in fields}
+        # Fields whose changes show in the row's own modified column (records.sync). Columns
+        # of a model without one, like Contact.notes, are stamped on its EntityInfo by
+        # records.signals
+        self.sync_fields = [name for name, stamp in self.stamps.items() if stamp in (modified, None)]
+
+    def stamp(self, lookup):
+        """The modified column of the row the value at lookup comes from, None if it has none"""
+        model = self.model
+        *relations, name = lookup.split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        if any(field.name == 'modified' for field in model._meta.concrete_fields):
+            return '__'.join(relations + ['modified'])
+        return None
+
+    def parse_fields(self, value, available=None, default=None):
+        """Field names of a ?fields= value, out of available (all fields by default)"""
+        available = list(self.lookups) if available is None else available
+        if not value:
+            return list(self.default_fields if default is None else default)
+        names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ApiError(f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(available)}')
+        return names
+
+    def filter(self, queryset, params):
+        for param, lookup in self.filters.items():
+            value = params.get(param)
+            if value is None:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: int(value)})
+            except ValueError:
+                raise ApiError(f'{param} must be an id')
+        return queryset
+
+    def page(self, queryset, names, cursor, size):
+        """(rows, next cursor, ETag) of the page after cursor"""
+        if cursor:
+            try:
+                direction, (created, pk) = decode_cursor(cursor)
+            except ValueError:
+                raise ApiError('Invalid cursor')
+            if direction != NEXT:
+                raise ApiError('Invalid cursor')
+            queryset = queryset.filter(
+                Q(**{f'{self.created}__lt': created}) | Q(**{self.created: created, 'id__lt': pk})
+            )
+
+        stamps = [self.stamps[name] for name in names if self.stamps[name]]
+        rows = list(
+            self.values(queryset.order_by(f'-{self.created}', '-id'), names, self.created, 'id', *stamps)[:size + 1]
+        )
+
+        next_cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_cursor = encode_cursor(NEXT, [rows[-1][self.created], rows[-1]['id']])
+        etag = self.etag(names, rows, next_cursor)
+        return self.output(rows, names), next_cursor, etag
+
+    def values(self, queryset, names, *lookups):
+        """
+        queryset.values() of the fields in names, plus lookups (cursor columns, timestamps)
+        under their own names. Fields under another name are selected as expressions.
+        """
+        renamed = {name: F(self.lookups[name]) for name in names if name != self.lookups[name]}
+        columns = {name for name in names if name not in renamed}
+        columns.update(lookups)
+        return queryset.values(*columns, **renamed)
+
+    def output(self, rows, names):
+        """Rows read with values() as the API returns them: the fields in names, in order"""
+        return [{name: row[name] for name in names} for row in rows]
+
+    def etag(self, names, rows, next_cursor):
+        # Values of models without a modified column stand in for their timestamp
+        stamps = sorted({self.stamps[name] or name for name in names})
+        digest = hashlib.md5(repr((names, next_cursor)).encode())
+        for row in rows:
+            digest.update(repr([row['id']] + [row[stamp] for stamp in stamps]).encode())
+        return quote_etag(digest.hexdigest())
+
+
+RESOURCES = {
+    'dogs': Resource(Dog, [
+        ('id', 'id'),
+        ('name', 'name'),
+        ('charter_id', 'charter_id'),
+        ('charter_name', 'charter__entity_info__name'),
+        ('owner_id', 'owner_id'),
+        ('owner_name', 'owner__entity_info__name'),
+        ('breed', 'breed'),
+        ('color', 'color'),
+        ('gender', 'gender'),
+        ('age_months', 'age_months'),
+        ('current_weight_kg', 'current_weight_kg'),
+        ('height_cm', 'height_cm'),
+        ('microchip_status', 'microchip_status'),
+        ('microchip_id', 'microchip_id'),
+        ('castration_status', 'castration_status'),
+        ('intake_status', 'intake_status'),
+        ('arrival_date', 'arrival_date'),
+        ('health_status', 'health_status'),
+        ('vaccination_status', 'vaccination_status'),
+        ('special_needs', 'special_needs'),
+        ('created', 'created'),
+        ('modified', 'modified'),
+    ], ['id', 'name', 'charter_id', 'breed', 'gender', 'age_months', 'health_status', 'modified'], filters={
+        'charter': 'charter_id',
+        'owner': 'owner_id',
+    }),
+    'charters': Resource(Charter, [
+        ('id', 'id'),
+        ('name', 'entity_info__name'),
+        ('email', 'entity_info__email'),
+        ('phone', 'entity_info__phone'),
+        ('address', 'entity_info__address'),
+        ('created', 'entity_info__created'),
+        ('modified', 'entity_info__modified'),
+    ], ['id', 'name', 'email', 'phone', 'modified'], created='entity_info__created', modified='entity_info__modified'),
+    'contacts': Resource(Contact, [
+        ('id', 'id'),
+        ('name', 'entity_info__name'),
+        ('email', 'entity_info__email'),
+        ('phone', 'entity_info__phone'),
+        ('address', 'entity_info__address'),
+        ('notes', 'notes'),
+        ('created', 'entity_info__created'),
+        ('modified', 'entity_info__modified'),
+    ], ['id', 'name', 'email', 'phone', 'modified'], created='entity_info__created', modified='entity_info__modified'),
+}
+
+
+def page_size(params):
+    try:
+        return min(max(int(params.get('limit', API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError('limit must be a number')
+
+
+def api_response(request, resource, queryset=None):
+    """A page of resource as JSON, or 304 when the client's If-None-Match still matches it."""
+    queryset = resource.model.objects.all() if queryset is None else queryset
+    try:
+        size = page_size(request.GET)
+        names = resource.parse_fields(request.GET.get('fields'))
+        rows, next_cursor, etag = resource.page(
+            resource.filter(queryset, request.GET), names, request.GET.get('cursor'), size
+        )
+    except ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'results': rows, 'next_cursor': next_cursor})
+    response['ETag'] = etag
+    # Clients keep the page and revalidate it every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
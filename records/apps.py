@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecordKeepingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'records'
+
+    def ready(self):
+        from records import signals  # noqa: F401
@@ -0,0 +1,51 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# Async variants of the busiest read-only pages, served instead of the regular views when
+# ASYNC_VIEWS is on (meant for ASGI servers, see dog_rescue.asgi). While a page waits for
+# the database the event loop goes on serving other connections, and the independent
+# queries of a page run at the same time. Django's async ORM methods (aget, acount, async
+# for) all run on the one thread of the request, one after another, so gathering them does
+# not overlap anything: run_concurrently gives each callable a pool thread and a database
+# connection of its own instead. The request's context (e.g. replica routing) is copied to
+# those threads.
+
+
+def async_views_enabled():
+    return getattr(settings, 'ASYNC_VIEWS', False)
+
+
+def select_view(view_class, async_view_class, **initkwargs):
+    """as_view() of the async variant when ASYNC_VIEWS is on, of the regular view otherwise"""
+    return (async_view_class if async_views_enabled() else view_class).as_view(**initkwargs)
+
+
+def in_own_connection(function):
+    # Pool threads outlive requests, so their connections are expired like a request's are
+    close_old_connections()
+    try:
+        return function()
+    finally:
+        close_old_connections()
+
+
+async def run_concurrently(*functions):
+    """Results of the blocking callables, each run on its own thread at the same time."""
+    return await asyncio.gather(*(
+        sync_to_async(in_own_connection, thread_sensitive=False)(function) for function in functions
+    ))
+
+
+class AsyncLoginRequiredMixin:
+    """
+    For async views built on a LoginRequiredMixin view: resolves the user without blocking
+    the event loop, and leaves it on request.user for the mixin and the templates.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
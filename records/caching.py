@@ -0,0 +1,91 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+# Cached context and template fragments are keyed on version counters of the models they
+# were built from. records.signals bumps a model's counter whenever one of its rows is saved
+# or deleted (after the transaction commits), which retires every entry built from the old
+# data at once. Entries use the default cache, which has to be shared by every process that
+# writes (web workers, process_photo_jobs, imports, the generate and benchmark commands) for
+# them to see each other's bumps. Entries still expire after RECORDS_CACHE_TIMEOUT seconds,
+# so a bump that is missed - a process on its own cache, two increments racing in a backend
+# without an atomic incr - serves stale data for that long at most.
+
+VERSION_KEY_PREFIX = 'records:version:'
+CACHE_TIMEOUT = 60 * 60
+MISSING = object()
+
+
+def cache_timeout():
+    """Seconds cached context and fragments are kept for"""
+    return getattr(settings, 'RECORDS_CACHE_TIMEOUT', CACHE_TIMEOUT)
+
+
+def version_key(model):
+    return f'{VERSION_KEY_PREFIX}{model._meta.label_lower}'
+
+
+def initial_version():
+    # Counters start from the clock rather than 1, so a counter lost to cache eviction
+    # never comes back with a value old entries were keyed on
+    return int(time.time() * 1000)
+
+
+def model_versions(*models):
+    """'1718000000000.1718000000042' - the current counters of models, for use in cache keys"""
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, initial_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_version(*models):
+    for model in models:
+        key = version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, initial_version(), None)
+
+
+def cached(key, compute):
+    """Value stored under key, computed and stored for cache_timeout() seconds on a miss."""
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        value = compute()
+        cache.set(key, value, cache_timeout())
+    return value
+
+
+class VersionedCacheMixin:
+    """
+    Adds cache_versions, the counters of cache_models, and cache_timeout to the context.
+    Templates pass them to {% cache cache_timeout <fragment> ... cache_versions %} so a
+    fragment is re-rendered as soon as one of the models it shows changes.
+    """
+    cache_models = ()
+    _cache_versions = None
+
+    def get_cache_versions(self):
+        if self._cache_versions is None:
+            self._cache_versions = model_versions(*self.cache_models)
+        return self._cache_versions
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cache_versions'] = self.get_cache_versions()
+        context['cache_timeout'] = cache_timeout()
+        return context
+
+
+class CachedObjectMixin(VersionedCacheMixin):
+    """DetailView mixin serving the object from the cache while cache_models are unchanged."""
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        key = f'records:object:{self.model._meta.label_lower}:{self.kwargs.get(self.pk_url_kwarg)}:{self.get_cache_versions()}'
+        return cached(key, super().get_object)
@@ -0,0 +1,122 @@
+import mimetypes
+import posixpath
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+from records.storage import is_sharded_name
+
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(fieldfile, size, modified):
+    """Content addressed files are named after their hash, which makes a strong ETag."""
+    if is_sharded_name(fieldfile.name):
+        return quote_etag(posixpath.splitext(posixpath.basename(fieldfile.name))[0])
+    return quote_etag(f'{size:x}-{int(modified.timestamp()):x}')
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) inclusive for a single 'bytes=' range, None for a header we ignore
+    (multiple ranges, other units, a last byte before the first) and raises ValueError for
+    an unsatisfiable range. Nothing in an empty file is satisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError('Range not satisfiable')
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        # Invalid rather than unsatisfiable: the header is ignored (RFC 7233, 2.1)
+        return None
+    if start >= size:
+        raise ValueError('Range not satisfiable')
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+def iter_range(file, start, length):
+    """Reads length bytes from start in fixed chunks, closing the file at the end."""
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def sendfile_response(fieldfile, header, filename, as_attachment):
+    """Lets the front proxy send the file (X-Accel-Redirect for nginx, X-Sendfile for Apache/lighttpd)."""
+    response = HttpResponse()
+    if header.lower() == 'x-accel-redirect':
+        response[header] = getattr(settings, 'RECORDS_SENDFILE_URL', '/protected/') + quote(fieldfile.name)
+    else:
+        response[header] = fieldfile.path
+    # The proxy fills in the real type from the file it serves, but keeps our headers
+    del response['Content-Type']
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def serve_file(request, fieldfile, filename, as_attachment=False):
+    """
+    Streams a stored file without loading it into memory, honouring conditional requests
+    (ETag / Last-Modified) and single byte ranges, or hands it off to the front proxy when
+    RECORDS_SENDFILE_HEADER is set.
+    """
+    storage = fieldfile.storage
+    size = storage.size(fieldfile.name)
+    modified = storage.get_modified_time(fieldfile.name)
+    etag = file_etag(fieldfile, size, modified)
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(modified.timestamp()))
+    if response is not None:
+        return response
+
+    sendfile_header = getattr(settings, 'RECORDS_SENDFILE_HEADER', None)
+    if sendfile_header:
+        response = sendfile_response(fieldfile, sendfile_header, filename, as_attachment)
+    else:
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if range_header and (if_range is None or if_range == etag):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        file = storage.open(fieldfile.name, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, as_attachment=as_attachment, filename=filename)
+            response.block_size = STREAM_CHUNK_SIZE
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(iter_range(file, start, end - start + 1), status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified.timestamp())
+    # Documents are private: browsers may keep them, shared caches must not
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,246 @@
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.db import models
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from records.models import Contact, Dog
+
+# Exports stream: rows are read with values_list().iterator() and every chunk of output is
+# handed to the response (or file) as soon as it is written, so memory use does not grow
+# with the number of rows.
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Export:
+    """Columns of an export as (header, values_list lookup) pairs."""
+
+    def __init__(self, model, columns, filename):
+        self.model = model
+        self.columns = columns
+        self.filename = filename
+        self.headers = [header for header, lookup in columns]
+        self.lookups = [lookup for header, lookup in columns]
+        self.fields = [self.resolve_field(lookup) for lookup in self.lookups]
+
+    def resolve_field(self, lookup):
+        model = self.model
+        *relations, name = lookup.split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(name)
+
+    def rows(self, queryset):
+        # Converters are picked once per column rather than per value
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        converters = [converter(field, tz) for field in self.fields]
+        rows = queryset.values_list(*self.lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for row in rows:
+            yield [convert(value) if value is not None else '' for convert, value in zip(converters, row)]
+
+
+DOG_EXPORT = Export(Dog, [
+    ('ID', 'id'),
+    ('Name', 'name'),
+    ('Charter', 'charter__entity_info__name'),
+    ('Owner', 'owner__entity_info__name'),
+    ('Owner phone', 'owner__entity_info__phone'),
+    ('Breed', 'breed'),
+    ('Color', 'color'),
+    ('Gender', 'gender'),
+    ('Age (months)', 'age_months'),
+    # Kept equal to the latest weigh-in by records.signals
+    ('Latest weight (kg)', 'current_weight_kg'),
+    ('Height (cm)', 'height_cm'),
+    ('Microchip', 'microchip_status'),
+    ('Microchip ID', 'microchip_id'),
+    ('Castrated', 'castration_status'),
+    ('Intake', 'intake_status'),
+    ('Arrival date', 'arrival_date'),
+    ('Health', 'health_status'),
+    ('Vaccination', 'vaccination_status'),
+    ('Vaccination record', 'vaccination_record'),
+    ('Special needs', 'special_needs'),
+    ('Created', 'created'),
+], 'dogs')
+
+CONTACT_EXPORT = Export(Contact, [
+    ('ID', 'id'),
+    ('Name', 'entity_info__name'),
+    ('Email', 'entity_info__email'),
+    ('Phone', 'entity_info__phone'),
+    ('Address', 'entity_info__address'),
+    ('Notes', 'notes'),
+    ('Created', 'entity_info__created'),
+], 'contacts')
+
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def converter(field, tz):
+    """Function turning a column's database value into what is written to the file"""
+    if field.choices:
+        # Choice fields are exported with their labels
+        labels = dict(field.choices)
+        return lambda value: labels.get(value, value)
+    if isinstance(field, models.DateTimeField):
+        if tz is None:
+            return lambda value: value.strftime(DATETIME_FORMAT)
+        return lambda value: value.astimezone(tz).strftime(DATETIME_FORMAT)
+    if isinstance(field, models.DateField):
+        return lambda value: value.isoformat()
+    return lambda value: value
+
+
+# =============================================================================
+# CSV
+# =============================================================================
+
+class Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(export, queryset):
+    # The byte order mark makes Excel read the file as UTF-8
+    writer = csv.writer(Echo())
+    lines = ['\ufeff' + writer.writerow(export.headers)]
+    for row in export.rows(queryset):
+        lines.append(writer.writerow(row))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+# =============================================================================
+# XLSX
+# =============================================================================
+# A workbook is a zip of XML parts. zipfile can write to a stream that cannot seek (each
+# member is followed by a data descriptor), so the sheet is compressed and sent while
+# rows are still being read. Cells are inline strings and numbers, which needs no shared
+# strings table or styles.
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+# Characters XML 1.0 does not allow, even escaped
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class StreamBuffer:
+    """Write-only, unseekable file for zipfile; drain() returns what was written since the last call."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def xlsx_cell(value):
+    if isinstance(value, bool):
+        value = str(value)
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(INVALID_XML_RE.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(values):
+    return '<row>' + ''.join(xlsx_cell(value) for value in values) + '</row>'
+
+
+def xlsx_chunks(export, queryset):
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr('[Content_Types].xml', CONTENT_TYPES)
+        workbook.writestr('_rels/.rels', ROOT_RELS)
+        workbook.writestr('xl/workbook.xml', WORKBOOK.format(name=escape(export.filename.title())))
+        workbook.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        yield buffer.drain()
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            rows = []
+            sheet.write((SHEET_START + xlsx_row(export.headers)).encode())
+            for row in export.rows(queryset):
+                rows.append(xlsx_row(row))
+                if len(rows) == EXPORT_CHUNK_SIZE:
+                    sheet.write(''.join(rows).encode())
+                    rows = []
+                    yield buffer.drain()
+            sheet.write((''.join(rows) + SHEET_END).encode())
+    yield buffer.drain()
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', csv_chunks),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', xlsx_chunks),
+}
+
+
+def export_chunks(export, queryset, file_format):
+    """Yields the export as str (csv) or bytes (xlsx) chunks."""
+    content_type, chunks = EXPORT_FORMATS[file_format]
+    return chunks(export, queryset)
+
+
+def export_response(export, queryset, file_format):
+    content_type, chunks = EXPORT_FORMATS[file_format]
+    filename = f'{export.filename}-{timezone.localdate():%Y-%m-%d}.{file_format}'
+    # Rows are read after the view has returned: keep the connection it chose (records.replicas)
+    queryset = queryset.using(queryset.db)
+    response = StreamingHttpResponse(chunks(export, queryset), content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
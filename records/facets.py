@@ -0,0 +1,113 @@
+import hashlib
+from collections import Counter
+from django.db.models import Count
+from records.caching import cached, model_versions
+from records.models import Dog, Contact, EntityInfo, DogBreed, DogColor, DogGender, DogIntakeStatus, DogHealthStatus, DogVaccinationStatus
+
+# Dog fields the list can be narrowed by, in display order. Counts are disjunctive: the
+# counts of a facet apply every filter except that facet's own selection, so picking
+# 'Beagle' still shows how many dogs each other breed would give.
+FACETS = {
+    'breed': ('Breed', DogBreed),
+    'color': ('Color', DogColor),
+    'gender': ('Gender', DogGender),
+    'intake_status': ('Intake', DogIntakeStatus),
+    'health_status': ('Health', DogHealthStatus),
+    'vaccination_status': ('Vaccination', DogVaccinationStatus),
+}
+# Query parameter -> (field, lookup, type)
+RANGES = {
+    'age_min': ('age_months', 'gte', int),
+    'age_max': ('age_months', 'lte', int),
+    'weight_min': ('current_weight_kg', 'gte', float),
+    'weight_max': ('current_weight_kg', 'lte', float),
+}
+# Query parameters that change the page shown but not the dogs being counted
+PAGING_PARAMS = {'page', 'cursor', 'paginate'}
+
+
+def selected_facets(params):
+    """{'breed': {'BEAGLE'}, ...} for the valid values in the request's query parameters"""
+    selected = {}
+    for field, (label, choices) in FACETS.items():
+        values = {value for value in params.getlist(field) if value in choices.values}
+        if values:
+            selected[field] = values
+    return selected
+
+
+def range_filters(params):
+    """{'age_months__gte': 12, ...}; unparsable bounds are ignored"""
+    filters = {}
+    for param, (field, lookup, cast) in RANGES.items():
+        try:
+            filters[f'{field}__{lookup}'] = cast(params[param])
+        except (KeyError, ValueError):
+            continue
+    return filters
+
+
+def apply_facets(queryset, selected):
+    for field, values in selected.items():
+        queryset = queryset.filter(**{f'{field}__in': values})
+    return queryset
+
+
+def filter_signature(params):
+    """Cache key part for the non-facet filters of a request (charter, search, ranges)"""
+    items = sorted(
+        (key, value) for key in params if key not in FACETS and key not in PAGING_PARAMS
+        for value in params.getlist(key)
+    )
+    return hashlib.sha256(repr(items).encode()).hexdigest()
+
+
+def facet_groups(queryset, params):
+    """
+    Dog counts grouped by every facet field at once, for queryset with the request's other
+    filters applied but no facet selection. One query per filter signature until a dog,
+    or an owner or charter the search matches on, changes.
+    """
+    fields = list(FACETS)
+    key = f'records:facets:{filter_signature(params)}:{model_versions(Dog, Contact, EntityInfo)}'
+    return cached(key, lambda: [
+        (tuple(row[field] for field in fields), row['dogs'])
+        for row in queryset.order_by().values(*fields).annotate(dogs=Count('id'))
+    ])
+
+
+def facet_counts(groups, selected):
+    """{field: Counter(value -> dogs)}, each facet ignoring its own selection"""
+    fields = list(FACETS)
+    counts = {field: Counter() for field in fields}
+    for values, dogs in groups:
+        misses = [field for field, value in zip(fields, values) if field in selected and value not in selected[field]]
+        if len(misses) > 1:
+            continue
+        for field, value in zip(fields, values):
+            # A group counts for a facet if every other facet's selection accepts it
+            if not misses or misses == [field]:
+                counts[field][value] += dogs
+    return counts
+
+
+def build_facets(queryset, params):
+    """Facet groups for the template: label, field name and options with counts."""
+    selected = selected_facets(params)
+    counts = facet_counts(facet_groups(queryset, params), selected)
+    return [
+        {
+            'name': field,
+            'label': label,
+            'options': [
+                {
+                    'value': value,
+                    'label': choice_label,
+                    'count': counts[field][value],
+                    'selected': value in selected.get(field, ()),
+                }
+                for value, choice_label in choices.choices
+            ],
+        }
+        for field, (label, choices) in FACETS.items()
+    ]
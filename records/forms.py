@@ -70,9 +70,37 @@ class DogForm(forms.ModelForm):
         # Add helpful help text
         self.fields['age_months'].help_text = "Age in months (e.g., 6 for 6 months old)"
         self.fields['current_weight_kg'].help_text = "Current weight in kilograms"
+        if self.instance.pk:
+            # The latest weigh-in: changed by recording a new one, not by editing the dog
+            self.fields['current_weight_kg'].disabled = True
+            self.fields['current_weight_kg'].help_text = "Latest weigh-in; record a new weigh-in to change it"
         self.fields['height_cm'].help_text = "Height in centimeters"
 
 
+def validate_entity_info(form, entity_info=None):
+    """Runs EntityInfo.clean() on the form's entity fields as they would be saved over entity_info.
+
+    Every name, email or phone conflict is added to its field, found with one query.
+    """
+    data = form.cleaned_data
+    if 'name' not in data:
+        return
+    entity = EntityInfo(
+        pk=entity_info.pk if entity_info else None,
+        name=data['name'],
+        email=data.get('email') or None,
+        phone=data.get('phone') or None,
+        address=data.get('address') or None,
+    )
+    if entity.pk is None:
+        # As EntityInfo.save() does for new records
+        entity.name = entity.name.title()
+    try:
+        entity.clean()
+    except ValidationError as error:
+        form.add_error(None, error)
+
+
 class ContactForm(forms.ModelForm):
     # EntityInfo fields
     name = forms.CharField(max_length=100, widget=forms.TextInput(attrs={'class': 'form-input', 'placeholder': 'Full name'}))
@@ -92,6 +120,11 @@ class ContactForm(forms.ModelForm):
             self.fields['phone'].initial = self.instance.entity_info.phone
             self.fields['address'].initial = self.instance.entity_info.address
 
+    def clean(self):
+        cleaned_data = super().clean()
+        validate_entity_info(self, self.instance.entity_info if self.instance.entity_info_id else None)
+        return cleaned_data
+
     def save(self, commit=True):
         contact = super().save(commit=False)
         
@@ -138,34 +171,12 @@ class CharterForm(forms.ModelForm):
             self.fields['address'].initial = self.instance.entity_info.address
 
     def clean_name(self):
-        name = self.cleaned_data['name']
-        # Check for duplicate charter names (case-insensitive)
-        existing_charters = Charter.objects.filter(entity_info__name__iexact=name)
-        if self.instance and self.instance.pk:
-            existing_charters = existing_charters.exclude(pk=self.instance.pk)
-        if existing_charters.exists():
-            raise forms.ValidationError("A charter with this name already exists.")
-        return name.strip().title()  # Clean and format the name
+        # Names are title-cased, so duplicates differing only in case are caught by clean()
+        return self.cleaned_data['name'].strip().title()
 
     def clean(self):
         cleaned_data = super().clean()
-        
-        # Create a temporary EntityInfo instance to validate
-        temp_entity = EntityInfo()
-        temp_entity.name = cleaned_data.get('name', '')
-        temp_entity.email = cleaned_data.get('email', '')
-        temp_entity.phone = cleaned_data.get('phone', '')
-        temp_entity.address = cleaned_data.get('address', '')
-        
-        # Call EntityInfo's clean method to validate
-        try:
-            temp_entity.clean()
-        except ValidationError as e:
-            # Add the validation error to the form's non_field_errors
-            # Extract the first error message cleanly
-            error_message = e.messages[0] if e.messages else str(e)
-            self.add_error(None, error_message)
-        
+        validate_entity_info(self, self.instance.entity_info if self.instance.entity_info_id else None)
         return cleaned_data
 
     def save(self, commit=True):
@@ -189,3 +200,62 @@ class CharterForm(forms.ModelForm):
         
         return charter
 
+
+
+class ImportForm(forms.Form):
+    records = forms.ChoiceField(
+        choices=[('dogs', 'Dogs'), ('contacts', 'Contacts')],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    file = forms.FileField(
+        help_text='UTF-8 CSV with a header row; the columns of an export are accepted',
+        widget=forms.FileInput(attrs={'class': 'form-input', 'accept': '.csv,text/csv'})
+    )
+    charter = forms.ModelChoiceField(
+        queryset=Charter.objects.select_related('entity_info'),
+        required=False,
+        empty_label='From the Charter column',
+        help_text='Charter the dogs are added to',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    dry_run = forms.BooleanField(required=False, label='Only validate, import nothing')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['charter'].label_from_instance = lambda charter: charter.entity_info.name
+
+
+class WeighInForm(forms.Form):
+    """One weight field per dog of a kennel; dogs left empty are not weighed."""
+    record_date = forms.DateTimeField(
+        required=False,
+        help_text='When the dogs were weighed; leave empty for now',
+        widget=forms.DateTimeInput(attrs={'class': 'form-input', 'type': 'datetime-local'})
+    )
+
+    def __init__(self, *args, dogs, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dogs = dogs
+        for dog in dogs:
+            self.fields[f'weight_{dog.pk}'] = forms.FloatField(
+                required=False,
+                min_value=0.1,
+                label=dog.name,
+                widget=forms.NumberInput(attrs={
+                    'class': 'form-input', 'step': '0.1', 'min': '0',
+                    'placeholder': f'{dog.current_weight_kg} kg' if dog.current_weight_kg else 'Weight in kg',
+                })
+            )
+
+    def weight_fields(self):
+        return [self[f'weight_{dog.pk}'] for dog in self.dogs]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self.weights = {
+            dog.pk: cleaned_data[f'weight_{dog.pk}']
+            for dog in self.dogs if cleaned_data.get(f'weight_{dog.pk}') is not None
+        }
+        if not self.weights and not self.errors:
+            raise ValidationError('Enter at least one weight.')
+        return cleaned_data
@@ -0,0 +1,394 @@
+import csv
+from functools import partial, reduce
+from operator import or_
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from records.caching import bump_version
+from records.exports import CONTACT_EXPORT, DOG_EXPORT
+from records.models import Charter, Contact, Dog, DogWeightRecord, EntityInfo
+from records.search import DOG_INDEX, ENTITY_INDEX, write_index
+from records.statistics import rebuild_charter_stats
+from records.validation import DOG_UNIQUE_FIELDS, ENTITY_UNIQUE_FIELDS, unique_conflicts
+
+# CSV imports read the file row by row and work in batches of IMPORT_BATCH_SIZE rows.
+# Each row is parsed and checked on its own without queries (field values, choices,
+# clean_rules()); what needs the database - duplicate microchips, names, emails and
+# phones, charter and owner lookups - is checked with one query per batch. Valid rows
+# are inserted with bulk_create, invalid ones are collected into the error report.
+# Every batch is saved in a transaction of its own, which also brings CharterStats up to
+# date and bumps the cache versions when it commits, so a batch that fails leaves the
+# rows, statistics and caches of the batches before it consistent.
+IMPORT_BATCH_SIZE = 500
+
+
+class ImportResult:
+    def __init__(self, headers):
+        self.headers = headers
+        self.created = 0
+        # (line number, row, messages) for every rejected row
+        self.errors = []
+
+    @property
+    def rows(self):
+        return self.created + len(self.errors)
+
+    def write_report(self, file):
+        """Rejected rows as CSV, with their line number and errors, ready to be fixed and imported again."""
+        writer = csv.writer(file)
+        writer.writerow(['Line', *self.headers, 'Errors'])
+        for line, row, messages in self.errors:
+            writer.writerow([line, *[row.get(header, '') for header in self.headers], '; '.join(messages)])
+
+
+def normalize_header(header):
+    return ' '.join((header or '').split()).lower()
+
+
+def choice_map(field):
+    """Accepts both the code and the label of a choice, in any case."""
+    mapping = {}
+    for code, label in field.choices:
+        mapping[str(code).lower()] = code
+        mapping[str(label).lower()] = code
+    return mapping
+
+
+class Importer:
+    """Reads CSV rows into unsaved model instances and saves the valid ones in batches."""
+    model = None
+    # Export whose headers are accepted as column names, so an export can be imported back
+    export = None
+    # Fields set from the file; columns may be named by field name, verbose name or export header
+    fields = []
+    # Fields that must have a value in every row
+    required = []
+    # Extra column headers that are not model fields
+    extra_columns = {}
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.columns = self.build_columns()
+        self.choices = {
+            name: choice_map(self.model._meta.get_field(name))
+            for name in self.fields if self.model._meta.get_field(name).choices
+        }
+        self.tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def build_columns(self):
+        columns = {}
+        for name in self.fields:
+            field = self.model._meta.get_field(name)
+            columns[normalize_header(name)] = name
+            columns[normalize_header(name.replace('_', ' '))] = name
+            columns[normalize_header(str(field.verbose_name))] = name
+        for header, lookup in self.export.columns:
+            if lookup in self.fields:
+                columns[normalize_header(header)] = lookup
+        for header, key in self.extra_columns.items():
+            columns[normalize_header(header)] = key
+        return columns
+
+    def run(self, file):
+        """Imports every row of a text file object; returns an ImportResult."""
+        reader = csv.DictReader(file)
+        result = ImportResult(reader.fieldnames or [])
+        mapping = {header: self.columns.get(normalize_header(header)) for header in result.headers}
+        missing = [name for name in self.required if name not in mapping.values()]
+        if missing:
+            raise ValidationError(f"Missing columns: {', '.join(missing)}")
+
+        batch = []
+        # Line 1 is the header
+        for line, row in enumerate(reader, 2):
+            values = {key: (row[header] or '').strip() for header, key in mapping.items() if key}
+            batch.append((line, row, values))
+            if len(batch) == IMPORT_BATCH_SIZE:
+                self.import_batch(batch, result)
+                batch = []
+        if batch:
+            self.import_batch(batch, result)
+        return result
+
+    def import_batch(self, batch, result):
+        parsed, errors = [], []
+        for line, row, values in batch:
+            try:
+                parsed.append((line, row, values, self.build(values)))
+            except ValidationError as error:
+                errors.append((line, row, error.messages))
+        conflicts = self.check_batch([(values, instance) for line, row, values, instance in parsed])
+
+        valid = []
+        for line, row, values, instance in parsed:
+            messages = conflicts.get(id(instance))
+            if not messages:
+                try:
+                    self.clean_rules(instance)
+                except ValidationError as error:
+                    messages = error.messages
+            if messages:
+                errors.append((line, row, messages))
+                self.reject(instance)
+            else:
+                valid.append(instance)
+        result.errors.extend(sorted(errors, key=lambda error: error[0]))
+        if valid and not self.dry_run:
+            with transaction.atomic():
+                self.save(valid)
+        result.created += len(valid)
+
+    def parse(self, name, value):
+        """File text to a field value; raises ValidationError."""
+        field = self.model._meta.get_field(name)
+        if value == '':
+            if name in self.required:
+                raise ValidationError(f'{field.verbose_name} is required')
+            return None if field.null else field.get_default()
+        if name in self.choices:
+            try:
+                return self.choices[name][value.lower()]
+            except KeyError:
+                raise ValidationError(f'{value!r} is not a valid {field.verbose_name}')
+        try:
+            value = field.to_python(value)
+        except ValidationError as error:
+            raise ValidationError(f'{field.verbose_name}: {error.messages[0]}')
+        if isinstance(field, models.DateTimeField) and self.tz and timezone.is_naive(value):
+            value = timezone.make_aware(value, self.tz)
+        return value
+
+    def parse_fields(self, values):
+        """{field: value} for the model fields present in the row, all errors at once."""
+        parsed, messages = {}, []
+        for name in self.fields:
+            if name not in values and name not in self.required:
+                continue
+            try:
+                parsed[name] = self.parse(name, values.get(name, ''))
+            except ValidationError as error:
+                messages.extend(error.messages)
+        if messages:
+            raise ValidationError(messages)
+        return parsed
+
+    def validate_instance(self, instance, exclude):
+        try:
+            instance.clean_fields(exclude=exclude)
+        except ValidationError as error:
+            raise ValidationError([
+                f'{field}: {message}' for field, messages in error.message_dict.items() for message in messages
+            ])
+
+    def build(self, values):
+        raise NotImplementedError
+
+    def clean_rules(self, instance):
+        """The model's query-free clean() checks, once check_batch() has set the relations."""
+        instance.clean_rules()
+
+    def check_batch(self, rows):
+        """{id(instance): messages} of conflicts found with one query per batch"""
+        raise NotImplementedError
+
+    def reject(self, instance):
+        """Called for a row that passed check_batch() on some counts but is not imported."""
+
+    def save(self, instances):
+        """Saves a batch of valid instances, inside the batch's transaction."""
+        raise NotImplementedError
+
+
+class SeenValues:
+    """Values of unique-ish fields taken by earlier rows of the file, so later rows can't repeat them."""
+
+    def __init__(self, fields):
+        self.values = {field: set() for field in fields}
+        self.claims = {}
+
+    def taken(self, field, value):
+        return value in self.values[field]
+
+    def claim(self, instance, field_values):
+        for field, value in field_values:
+            self.values[field].add(value)
+        self.claims[id(instance)] = field_values
+
+    def release(self, instance):
+        for field, value in self.claims.pop(id(instance), ()):
+            self.values[field].discard(value)
+
+    def clear_claims(self):
+        self.claims = {}
+
+
+class EntityConflicts:
+    """Name/email/phone duplicates against the database and the rows seen earlier in the file."""
+
+    def __init__(self):
+        self.seen = SeenValues(ENTITY_UNIQUE_FIELDS)
+
+    def check(self, entities):
+        self.seen.clear_claims()
+        existing = unique_conflicts(entities, ENTITY_UNIQUE_FIELDS)
+        conflicts = {}
+        for entity in entities:
+            messages = existing.get(id(entity), {})
+            values = [(field, getattr(entity, field)) for field in ENTITY_UNIQUE_FIELDS if getattr(entity, field)]
+            for field, value in values:
+                if field not in messages and self.seen.taken(field, value):
+                    messages[field] = f'{ENTITY_UNIQUE_FIELDS[field]} {value} appears earlier in the file'
+            if messages:
+                conflicts[id(entity)] = list(messages.values())
+            else:
+                self.seen.claim(entity, values)
+        return conflicts
+
+    def release(self, entity):
+        self.seen.release(entity)
+
+
+class ContactImporter(Importer):
+    model = Contact
+    export = CONTACT_EXPORT
+    fields = ['notes']
+    extra_columns = {
+        'Name': 'name', 'Email': 'email', 'Phone': 'phone', 'Address': 'address',
+    }
+
+    def __init__(self, dry_run=False):
+        super().__init__(dry_run)
+        self.entity_conflicts = EntityConflicts()
+        self.entity_fields = ['name', 'email', 'phone', 'address']
+
+    def build(self, values):
+        now = timezone.now()
+        entity_info = EntityInfo(created=now, modified=now, **{
+            field: values.get(field) or None for field in self.entity_fields
+        })
+        if not entity_info.name:
+            raise ValidationError('Name is required')
+        # As EntityInfo.save() does for new records
+        entity_info.name = entity_info.name.title()
+        self.validate_instance(entity_info, exclude=[])
+        contact = Contact(entity_info=entity_info, **self.parse_fields(values))
+        return contact
+
+    def clean_rules(self, contact):
+        contact.entity_info.clean_rules()
+
+    def check_batch(self, rows):
+        contacts = [contact for values, contact in rows]
+        conflicts = self.entity_conflicts.check([contact.entity_info for contact in contacts])
+        return {id(contact): conflicts[id(contact.entity_info)] for contact in contacts if id(contact.entity_info) in conflicts}
+
+    def reject(self, contact):
+        self.entity_conflicts.release(contact.entity_info)
+
+    def save(self, contacts):
+        entities = EntityInfo.objects.bulk_create([contact.entity_info for contact in contacts])
+        Contact.objects.bulk_create(contacts)
+        write_index(ENTITY_INDEX, EntityInfo.objects.filter(pk__in=[entity.pk for entity in entities]), router.db_for_write(EntityInfo))
+        # bulk_create bypasses the signals that maintain the cache versions
+        transaction.on_commit(partial(bump_version, Contact, EntityInfo))
+
+
+class DogImporter(Importer):
+    model = Dog
+    export = DOG_EXPORT
+    fields = [
+        'name', 'age_months', 'gender', 'breed', 'color',
+        'microchip_status', 'microchip_id', 'intake_status', 'arrival_date',
+        'current_weight_kg', 'height_cm',
+        'health_status', 'vaccination_status', 'castration_status',
+        'detailed_description', 'health_record', 'vaccination_record', 'treatment_record',
+        'special_needs', 'behavioral_notes', 'other_notes',
+        'passing_date', 'passing_reason', 'burial_place',
+    ]
+    required = ['name', 'age_months', 'height_cm', 'color']
+    extra_columns = {'Charter': 'charter', 'Owner phone': 'owner_phone'}
+
+    def __init__(self, charter=None, dry_run=False):
+        """Dogs go to charter, or to the charter named in each row's Charter column."""
+        super().__init__(dry_run)
+        self.charter = charter
+        self.seen = SeenValues(['microchip_id'])
+
+    def build(self, values):
+        now = timezone.now()
+        dog = Dog(created=now, modified=now, **self.parse_fields(values))
+        dog.name = dog.name.title()
+        if self.charter is None and not values.get('charter'):
+            raise ValidationError('Charter is required')
+        self.validate_instance(dog, exclude=['charter', 'owner', 'default_photo'])
+        return dog
+
+    def check_batch(self, rows):
+        conflicts = {}
+        if not rows:
+            return conflicts
+
+        def add(dog, message):
+            conflicts.setdefault(id(dog), []).append(message)
+
+        existing = unique_conflicts([dog for values, dog in rows], DOG_UNIQUE_FIELDS)
+        self.seen.clear_claims()
+        for values, dog in rows:
+            if not dog.microchip_id:
+                continue
+            if id(dog) in existing:
+                add(dog, existing[id(dog)]['microchip_id'])
+            elif self.seen.taken('microchip_id', dog.microchip_id):
+                add(dog, f'Microchip ID {dog.microchip_id} appears earlier in the file')
+            else:
+                self.seen.claim(dog, [('microchip_id', dog.microchip_id)])
+
+        if self.charter is not None:
+            for values, dog in rows:
+                dog.charter = self.charter
+        else:
+            names = {values['charter'] for values, dog in rows}
+            matches = reduce(or_, (Q(entity_info__name__iexact=name) for name in names))
+            charters = {
+                name.lower(): charter_id
+                for charter_id, name in Charter.objects.filter(matches).values_list('pk', 'entity_info__name')
+            }
+            for values, dog in rows:
+                dog.charter_id = charters.get(values['charter'].lower())
+                if dog.charter_id is None:
+                    add(dog, f"Charter {values['charter']} does not exist")
+
+        phones = {values['owner_phone'] for values, dog in rows if values.get('owner_phone')}
+        owners = dict(
+            Contact.objects.filter(entity_info__phone__in=phones).values_list('entity_info__phone', 'pk')
+        ) if phones else {}
+        for values, dog in rows:
+            phone = values.get('owner_phone')
+            if phone:
+                dog.owner_id = owners.get(phone)
+                if dog.owner_id is None:
+                    add(dog, f'No contact with phone {phone}')
+        return conflicts
+
+    def reject(self, dog):
+        self.seen.release(dog)
+
+    def save(self, dogs):
+        Dog.objects.bulk_create(dogs)
+        # The first weigh-in Dog.save() records for new dogs
+        DogWeightRecord.objects.bulk_create([
+            DogWeightRecord(dog=dog, weight_kg=dog.current_weight_kg, record_date=dog.created)
+            for dog in dogs if dog.current_weight_kg
+        ])
+        write_index(DOG_INDEX, Dog.objects.filter(pk__in=[dog.pk for dog in dogs]), router.db_for_write(Dog))
+        # bulk_create bypasses the signals that maintain CharterStats and the cache versions
+        rebuild_charter_stats(sorted({dog.charter_id for dog in dogs}))
+        transaction.on_commit(partial(bump_version, Dog, DogWeightRecord))
+
+
+IMPORTERS = {
+    'dogs': DogImporter,
+    'contacts': ContactImporter,
+}
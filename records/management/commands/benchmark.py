@@ -0,0 +1,285 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+from django.urls import reverse
+from records.management.helpers.command_helpers import create_charters, create_contacts, create_dogs
+from records.models import Charter, Dog
+from records.pagination import NEXT, encode_cursor
+
+PAGE_SIZE = 20
+DOGS_PER_CHARTER = 2500
+CONTACTS_PER_DOG = 0.2
+# A cache of the benchmark's own: the shared one must neither be cleared by the cold runs
+# nor be left holding pages of the throwaway databases
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+
+def parse_scale(value):
+    """'10k' -> 10000, '1m' -> 1000000"""
+    multipliers = {'k': 1_000, 'm': 1_000_000}
+    value = value.strip().lower()
+    try:
+        if value[-1] in multipliers:
+            return int(float(value[:-1]) * multipliers[value[-1]])
+        return int(value)
+    except (IndexError, ValueError):
+        raise CommandError(f'Invalid scale: {value!r}')
+
+
+def scale_label(scale):
+    if scale % 1_000_000 == 0:
+        return f'{scale // 1_000_000}m'
+    if scale % 1_000 == 0:
+        return f'{scale // 1_000}k'
+    return str(scale)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds throwaway databases with generated data at each scale and times the hot pages '
+        'through the test client. Writes the results as JSON and compares them with a baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            nargs='+',
+            default=['1k', '10k'],
+            help='Dataset sizes in dogs, e.g. 1k 10k 100k 1m (default: 1k 10k)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per page; medians are reported (default: 5)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the generated data (default: 0)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes generating the seed data (default: 1)'
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark-results.json',
+            help='File the results are written to (default: benchmark-results.json)'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results file of an earlier run to compare against'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=10.0,
+            help='Slowdown in percent reported as a regression (default: 10)'
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Exit with an error if any page regressed against the baseline'
+        )
+
+    def handle(self, *args, **options):
+        scales = [parse_scale(value) for value in options['scales']]
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {error}")
+
+        results = {
+            'meta': {
+                'created': datetime.now(dt_timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'repeat': options['repeat'],
+                'seed': options['seed'],
+            },
+            'scales': {},
+        }
+        setup_test_environment()
+        try:
+            for scale in scales:
+                label = scale_label(scale)
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{label} dogs'))
+                results['scales'][label] = self.run_scale(scale, options)
+        finally:
+            teardown_test_environment()
+
+        Path(options['output']).write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+        if baseline is not None:
+            regressions = self.compare(baseline, results, options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{regressions} regressions against {options["baseline"]}.')
+
+    def run_scale(self, scale, options):
+        """Creates a fresh database, seeds it and times every page on a private cache; the database is then dropped."""
+        settings_dict = connection.settings_dict
+        test_settings = settings_dict.setdefault('TEST', {})
+        previous_test_name = test_settings.get('NAME')
+        if connection.vendor == 'sqlite':
+            # A file rather than the default in-memory test database, like production
+            test_settings['NAME'] = str(Path(tempfile.gettempdir()) / f'dog_rescue_benchmark_{scale}.sqlite3')
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with self.mirrored_replicas():
+                    started = time.perf_counter()
+                    self.seed(scale, options['seed'], options['workers'])
+                    self.stdout.write(f"  Seeded in {time.perf_counter() - started:.1f}s")
+                    return self.time_pages(options['repeat'])
+            finally:
+                cache.clear()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings['NAME'] = previous_test_name
+
+    @contextmanager
+    def mirrored_replicas(self):
+        """
+        Points the connections mirroring the default one (TEST MIRROR, e.g. the production
+        profile's replica) at the benchmark database, so replica views read the seeded data
+        rather than the live database.
+        """
+        mirrors = {
+            alias: connections[alias].settings_dict['NAME'] for alias in connections
+            if connections[alias].settings_dict.get('TEST', {}).get('MIRROR') == DEFAULT_DB_ALIAS
+        }
+        for alias in mirrors:
+            connections[alias].close()
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        try:
+            yield
+        finally:
+            for alias, name in mirrors.items():
+                connections[alias].close()
+                connections[alias].settings_dict['NAME'] = name
+
+    def seed(self, scale, seed, workers):
+        charters_count = max(4, scale // DOGS_PER_CHARTER)
+        charters = create_charters(charters_count, seed=seed)
+        contacts = int(scale * CONTACTS_PER_DOG)
+        create_contacts(contacts, contacts, seed=seed, workers=workers)
+        per_charter = scale // charters_count
+        create_dogs(per_charter, per_charter, charters, seed=seed, workers=workers)
+        get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+
+    def pages(self):
+        charter = Charter.objects.order_by('-stats__dog_count').first()
+        dog = Dog.objects.order_by('-created', '-id').first()
+        dog_list = reverse('records:dog_list')
+        last_page = max(1, -(-Dog.objects.count() // PAGE_SIZE))
+        pages = [
+            ('dashboard', reverse('main:dashboard')),
+            ('charter_detail', reverse('records:charter_detail', kwargs={'pk': charter.pk})),
+            ('dog_detail', reverse('records:dog_detail', kwargs={'pk': dog.pk})),
+            ('contact_list', reverse('records:contact_list')),
+            ('admin_dog_changelist', reverse('admin:records_dog_changelist')),
+            ('admin_contact_changelist', reverse('admin:records_contact_changelist')),
+            ('admin_charter_changelist', reverse('admin:records_charter_changelist')),
+        ]
+        for depth in sorted({1, 10, 100, last_page}):
+            if depth > last_page:
+                continue
+            pages.append((f'dog_list_page_{depth}', f'{dog_list}?page={depth}'))
+            # The cursor page showing the same dogs
+            if depth == 1:
+                pages.append(('dog_list_cursor_1', f'{dog_list}?paginate=cursor'))
+                continue
+            boundary = Dog.objects.order_by('-created', '-id')[(depth - 1) * PAGE_SIZE - 1]
+            cursor = encode_cursor(NEXT, [boundary.created, boundary.pk])
+            pages.append((f'dog_list_cursor_{depth}', f'{dog_list}?paginate=cursor&cursor={cursor}'))
+        return pages
+
+    def time_pages(self, repeat):
+        client = Client()
+        client.force_login(get_user_model().objects.get(username='benchmark'))
+        timings = {}
+        for name, url in self.pages():
+            cold, warm, queries = [], [], 0
+            for _ in range(repeat):
+                # Cold: nothing cached, every query and fragment is computed
+                cache.clear()
+                # On every connection, so replica reads count too
+                with ExitStack() as stack:
+                    captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                    cold.append(self.time_request(client, url))
+                queries = sum(len(context.captured_queries) for context in captured)
+                # Warm: the same request again, served from the versioned caches
+                warm.append(self.time_request(client, url))
+            timings[name] = {
+                'url': url,
+                'cold_ms': round(statistics.median(cold), 2),
+                'warm_ms': round(statistics.median(warm), 2),
+                'queries': queries,
+            }
+            self.stdout.write(
+                f"  {name:<28} cold {timings[name]['cold_ms']:9.2f} ms  "
+                f"warm {timings[name]['warm_ms']:9.2f} ms  {queries:3d} queries"
+            )
+        return timings
+
+    def time_request(self, client, url):
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} returned {response.status_code}')
+        return elapsed
+
+    def compare(self, baseline, results, tolerance):
+        """Prints the change of every page present in both runs; returns the number of regressions."""
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Compared with baseline from {baseline["meta"]["created"]}'))
+        regressions = 0
+        for label, pages in results['scales'].items():
+            previous_pages = baseline['scales'].get(label)
+            if previous_pages is None:
+                self.stdout.write(f"  {label}: not in baseline")
+                continue
+            for name, current in pages.items():
+                previous = previous_pages.get(name)
+                if previous is None:
+                    continue
+                change = (current['cold_ms'] - previous['cold_ms']) / previous['cold_ms'] * 100 if previous['cold_ms'] else 0
+                more_queries = current['queries'] > previous['queries']
+                line = (
+                    f"  {label} {name:<28} {previous['cold_ms']:9.2f} -> {current['cold_ms']:9.2f} ms "
+                    f"({change:+.1f}%)  queries {previous['queries']} -> {current['queries']}"
+                )
+                if change > tolerance or more_queries:
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(line))
+                elif change < -tolerance:
+                    self.stdout.write(self.style.SUCCESS(line))
+                else:
+                    self.stdout.write(line)
+        return regressions
@@ -0,0 +1,210 @@
+import json
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from dog_rescue.databases import PROFILES, sqlite_database
+from records.management.helpers.command_helpers import create_charters, create_dogs
+from records.models import Charter, Dog, DogWeightRecord
+
+DOGS_PER_CHARTER = 500
+PAGE_SIZE = 20
+
+
+def read(rng, dog_ids):
+    """What a dog list page and the dashboard read"""
+    list(Dog.objects.select_related('charter__entity_info', 'owner__entity_info').order_by('-created', '-id')[:PAGE_SIZE])
+    list(Charter.objects.select_related('entity_info', 'stats'))
+
+
+def write(rng, dog_ids):
+    """A weigh-in: the dog is read, then written, in one transaction"""
+    with transaction.atomic():
+        dog = Dog.objects.only('pk').get(pk=rng.choice(dog_ids))
+        DogWeightRecord.objects.create(dog=dog, weight_kg=round(rng.uniform(2, 40), 1))
+
+
+OPERATIONS = {'reader': read, 'writer': write}
+
+
+def run_worker(role, database, start_at, duration, seed):
+    """Runs one role's operation in a loop from start_at for duration seconds (in a worker process)."""
+    connection.close()
+    # Only what the profile sets, whichever profile this process was started with
+    connection.settings_dict.update({'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, **database})
+    rng = random.Random(seed)
+    dog_ids = list(Dog.objects.values_list('pk', flat=True))
+    operation = OPERATIONS[role]
+
+    latencies, errors = [], Counter()
+    time.sleep(max(0, start_at - time.time()))
+    while time.time() < start_at + duration:
+        started = time.perf_counter()
+        try:
+            operation(rng, dog_ids)
+        except OperationalError as error:
+            errors[str(error)] += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+    connections.close_all()
+    return role, latencies, dict(errors)
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs parallel reader and writer processes against a copy of a seeded SQLite database '
+        'with each database profile, and reports throughput, latency and lock errors.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dogs',
+            type=int,
+            default=2000,
+            help='Dogs in the seeded database (default: 2000)'
+        )
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=4,
+            help='Reader processes (default: 4)'
+        )
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=2,
+            help='Writer processes (default: 2)'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10.0,
+            help='Seconds each profile is run for (default: 10)'
+        )
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            choices=PROFILES,
+            default=list(PROFILES),
+            help='Database profiles to compare (default: all)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the generated data and the workers (default: 0)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Also write the results to this JSON file'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark compares SQLite profiles.')
+        if options['readers'] + options['writers'] < 1:
+            raise CommandError('Run at least one reader or writer.')
+
+        with tempfile.TemporaryDirectory(prefix='dog_rescue_concurrency_') as directory:
+            seeded = Path(directory) / 'seeded.sqlite3'
+            started = time.perf_counter()
+            self.seed(seeded, options['dogs'], options['seed'])
+            self.stdout.write(f"Seeded {options['dogs']} dogs in {time.perf_counter() - started:.1f}s")
+
+            results = {}
+            for profile in options['profiles']:
+                # Every profile starts from the same data
+                path = Path(directory) / f'{profile}.sqlite3'
+                shutil.copyfile(seeded, path)
+                self.set_journal_mode(path, profile)
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{profile} profile'))
+                results[profile] = self.run_profile(sqlite_database(str(path), profile), options)
+                self.report(results[profile])
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+    def seed(self, path, dogs, seed):
+        """Creates and fills the database at path through the default connection."""
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        previous_test_name = test_settings.get('NAME')
+        test_settings['NAME'] = str(path)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            charters = create_charters(max(1, dogs // DOGS_PER_CHARTER), seed=seed)
+            per_charter = max(1, dogs // len(charters))
+            create_dogs(per_charter, per_charter, charters, create_owners=False, seed=seed)
+        finally:
+            # Closes the connection and points it back at the real database, keeping the file
+            connection.close()
+            connection.settings_dict['NAME'] = old_name
+            settings.DATABASES[connection.alias]['NAME'] = old_name
+            test_settings['NAME'] = previous_test_name
+
+    def set_journal_mode(self, path, profile):
+        # The journal mode is stored in the file; the development profile never changes it
+        mode = 'WAL' if profile == 'production' else 'DELETE'
+        with sqlite3.connect(path) as database:
+            database.execute(f'PRAGMA journal_mode={mode}')
+        database.close()
+
+    def run_profile(self, database, options):
+        roles = ['reader'] * options['readers'] + ['writer'] * options['writers']
+        # Workers are started first and begin together, once all of them are up
+        start_at = time.time() + 2 + 0.2 * len(roles)
+        with ProcessPoolExecutor(
+            max_workers=len(roles), mp_context=get_context('spawn'), initializer=django.setup
+        ) as executor:
+            futures = [
+                executor.submit(run_worker, role, database, start_at, options['duration'], options['seed'] + number)
+                for number, role in enumerate(roles)
+            ]
+            outcomes = [future.result() for future in futures]
+
+        result = {}
+        for role in ('reader', 'writer'):
+            latencies = [latency for name, values, errors in outcomes if name == role for latency in values]
+            errors = Counter()
+            for name, values, role_errors in outcomes:
+                if name == role:
+                    errors.update(role_errors)
+            result[role] = {
+                'processes': roles.count(role),
+                'operations': len(latencies),
+                'per_second': round(len(latencies) / options['duration'], 1),
+                'median_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+                'max_ms': round(max(latencies) * 1000, 2) if latencies else None,
+                'errors': dict(errors),
+            }
+        return result
+
+    def report(self, result):
+        for role, numbers in result.items():
+            if not numbers['processes']:
+                continue
+            line = (
+                f"  {role}s: {numbers['operations']} ops ({numbers['per_second']}/s), "
+                f"median {numbers['median_ms']} ms, p95 {numbers['p95_ms']} ms, max {numbers['max_ms']} ms"
+            )
+            self.stdout.write(line)
+            for error, count in numbers['errors'].items():
+                self.stdout.write(self.style.ERROR(f'    {count} x {error}'))
@@ -0,0 +1,112 @@
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from records.models import Charter, Dog, EntityInfo, DogHealthStatus
+from records.pagination import NEXT, encode_cursor
+
+
+# The indexes added for the access paths below (migrations 0006, 0008 and 0009)
+ACCESS_PATH_INDEXES = (
+    'dog_charter_health_idx', 'dog_charter_intake_idx', 'dog_charter_vaccination_idx',
+    'dog_charter_created_idx', 'dog_created_id_idx', 'dog_microchip_idx',
+    'dog_unowned_charter_idx', 'entityinfo_name_idx', 'entityinfo_email_idx',
+    'entityinfo_phone_idx', 'entityinfo_created_id_idx', 'weight_dog_date_idx',
+    'weight_date_idx',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the main pages and the indexed access paths on the current database and '
+        'prints their query plans. To compare with and without the indexes, copy the '
+        'database, run it on the copy (DOG_RESCUE_DB_PATH=copy.sqlite3), drop these '
+        f'indexes from the copy with DROP INDEX: {", ".join(ACCESS_PATH_INDEXES)}; and run '
+        'it again. Do not migrate records backwards for this: that also unapplies the '
+        'later migrations on the live database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per measurement; the median is reported (default: 5)'
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print the query plan of every access path'
+        )
+
+    def handle(self, *args, **options):
+        charter = Charter.objects.order_by('-stats__dog_count').first()
+        if charter is None:
+            raise CommandError('The database has no charters; run generate_test_database first.')
+        self.repeat = options['repeat']
+        self.stdout.write(f"{Dog.objects.count()} dogs, {Charter.objects.count()} charters, {self.repeat} runs each\n")
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Pages'))
+        for label, url in self.pages(charter):
+            self.report(label, lambda: self.render(url))
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Access paths'))
+        for label, queryset in self.access_paths(charter):
+            self.report(label, lambda: list(queryset.all()))
+            if options['explain']:
+                self.stdout.write(queryset.explain())
+                self.stdout.write('')
+
+    def pages(self, charter):
+        dog_list = reverse('records:dog_list')
+        pages = [
+            ('Dashboard', reverse('main:dashboard')),
+            ('Charter detail', reverse('records:charter_detail', kwargs={'pk': charter.pk})),
+            ('Dog list', dog_list),
+            ('Dog list for charter', f"{dog_list}?charter={charter.pk}"),
+            ('Dog list, last page', f"{dog_list}?page=last"),
+            ('Contact list', reverse('records:contact_list')),
+        ]
+        # The cursor page holding the same dogs as the last numbered page
+        boundary = Dog.objects.order_by('created', 'id')[20:21].first()
+        if boundary is not None:
+            cursor = encode_cursor(NEXT, [boundary.created, boundary.pk])
+            pages.append(('Dog list, last cursor page', f"{dog_list}?paginate=cursor&cursor={cursor}"))
+        return pages
+
+    def access_paths(self, charter):
+        sample = EntityInfo.objects.order_by('-id').first()
+        return [
+            ('Sick dogs of a charter', Dog.objects.filter(charter=charter, health_status=DogHealthStatus.SICK).only('id')),
+            ('Newest dogs of a charter', Dog.objects.filter(charter=charter).order_by('-created', '-id').only('id')[:20]),
+            ('Newest dogs', Dog.objects.order_by('-created', '-id').only('id')[:20]),
+            ('Unowned dogs of a charter', Dog.objects.filter(charter=charter, owner__isnull=True).only('id')),
+            ('Dog by microchip', Dog.objects.filter(microchip_id='BENCHMARK').only('id')),
+            ('Entity by name', EntityInfo.objects.filter(name=sample.name).only('id')),
+            ('Entity by email', EntityInfo.objects.filter(email=sample.email).only('id')),
+            ('Entity by phone', EntityInfo.objects.filter(phone=sample.phone).only('id')),
+        ]
+
+    def render(self, url):
+        """Runs a page through its view (no middleware) as an authenticated user."""
+        request = RequestFactory().get(url)
+        request.user = get_user_model()(is_active=True, is_staff=True)
+        match = resolve(request.path_info)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def report(self, label, run):
+        timings = []
+        for _ in range(self.repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+        median = statistics.median(timings) * 1000
+        self.stdout.write(f"  {label:<28} {median:9.2f} ms  {len(queries.captured_queries):4d} queries")
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from records.models import Dog, DogPhotoRecord, DogDocumentRecord, PhotoJob, PHOTOS, DOCUMENTS
+from records.storage import content_addressed_storage, is_sharded_name
+from records.thumbnails import RENDITIONS, thumbnail_name
+
+# Every column that stores a name in the content addressed storage
+REFERENCES = [
+    (Dog, 'default_photo'),
+    (Dog, 'profile_photo'),
+    (DogPhotoRecord, 'photo'),
+    (DogDocumentRecord, 'document'),
+    (PhotoJob, 'photo'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Deletes content addressed photo and document blobs that no record references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help='Keep blobs younger than this, whose records may not be committed yet (default: 24)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted'
+        )
+
+    def handle(self, *args, **options):
+        storage = content_addressed_storage
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+        referenced = self.referenced_names()
+
+        deleted = kept = 0
+        for name in self.stored_blobs(storage):
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                kept += 1
+                continue
+            deleted += 1
+            if options['dry_run']:
+                self.stdout.write(f"Would delete {name}")
+                continue
+            storage.delete(name)
+            for rendition in RENDITIONS:
+                storage.delete(thumbnail_name(name, rendition))
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} unreferenced blobs, kept {kept}."))
+
+    def referenced_names(self):
+        referenced = set()
+        for model, field in REFERENCES:
+            referenced.update(
+                model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True).iterator(chunk_size=5000)
+            )
+        return referenced
+
+    def stored_blobs(self, storage):
+        """Names of the sharded blobs; files stored before content addressing are left alone."""
+        for prefix in (PHOTOS, DOCUMENTS):
+            if not storage.exists(prefix):
+                continue
+            for first in storage.listdir(prefix)[0]:
+                for second in storage.listdir(f'{prefix}{first}')[0]:
+                    directory = f'{prefix}{first}/{second}'
+                    for filename in storage.listdir(directory)[1]:
+                        name = f'{directory}/{filename}'
+                        if is_sharded_name(name):
+                            yield name
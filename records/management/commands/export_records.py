@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from records.exports import CONTACT_EXPORT, DOG_EXPORT, EXPORT_FORMATS, export_chunks
+from records.models import Charter, Contact, Dog
+from records.search import search_dogs, search_entities
+
+
+class Command(BaseCommand):
+    help = 'Exports dogs or contacts as CSV or XLSX, streamed to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'records',
+            choices=['dogs', 'contacts'],
+            help='What to export'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(EXPORT_FORMATS),
+            default='csv',
+            help='File format (default: csv)'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write; CSV goes to stdout when omitted'
+        )
+        parser.add_argument(
+            '--charter',
+            type=int,
+            help='Only dogs of this charter ID'
+        )
+        parser.add_argument(
+            '--search',
+            help='Only records matching this search, as in the list pages'
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format']
+        if file_format == 'xlsx' and not options['output']:
+            raise CommandError('XLSX exports need --output.')
+
+        if options['records'] == 'dogs':
+            export = DOG_EXPORT
+            queryset = Dog.objects.all()
+            if options['charter']:
+                if not Charter.objects.filter(pk=options['charter']).exists():
+                    raise CommandError(f"Charter {options['charter']} does not exist.")
+                queryset = queryset.filter(charter_id=options['charter'])
+            queryset = search_dogs(queryset, options['search']).order_by('-created', '-id')
+        else:
+            export = CONTACT_EXPORT
+            queryset = search_entities(Contact.objects.all(), options['search'])
+            queryset = queryset.order_by('-entity_info__created', '-id')
+
+        if not options['output']:
+            for chunk in export_chunks(export, queryset, file_format):
+                self.stdout.write(chunk, ending='')
+            return
+
+        mode, encoding = ('w', 'utf-8') if file_format == 'csv' else ('wb', None)
+        with open(options['output'], mode, encoding=encoding, newline='' if encoding else None) as output:
+            for chunk in export_chunks(export, queryset, file_format):
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported {options['records']} to {options['output']}."))
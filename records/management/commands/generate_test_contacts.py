@@ -26,7 +26,7 @@ class Command(BaseCommand):
 
         self.stdout.write(f"Generating {count_min_contact}-{count_max_contact} test contacts.")
         
-        created_contacts = create_contacts(count_min_contact, count_max_contact)
+        created_count = create_contacts(count_min_contact, count_max_contact)
 
-        self.stdout.write(self.style.SUCCESS(f"Successfully created {len(created_contacts)} test contacts!"))
+        self.stdout.write(self.style.SUCCESS(f"Successfully created {created_count} test contacts!"))
         self.stdout.write(self.style.SUCCESS("Test contact generation complete."))
\ No newline at end of file
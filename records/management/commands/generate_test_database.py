@@ -1,8 +1,9 @@
 import random
 from django.core.management.base import BaseCommand
-from records.models import Charter, EntityInfo, Contact, Dog, DogIntakeStatus, DogHealthStatus, DogVaccinationStatus
+from records.models import Charter, EntityInfo, Contact, Dog
 from django.db import transaction
-from records.management.helpers.command_helpers import create_contacts, create_dogs, create_charters
+from records.management.helpers.command_helpers import BATCH_SIZE, create_contacts, create_dogs, create_charters, resolve_seed
+from records.statistics import read_charter_statistics
 
 
 class Command(BaseCommand):
@@ -39,6 +40,24 @@ class Command(BaseCommand):
             default=150,
             help='Maximum number of dogs per charter (default: 150)'
         )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed; the same seed generates the same data (default: random)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes generating rows in parallel with the inserts (default: 1)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Rows generated and inserted per transaction (default: {BATCH_SIZE})'
+        )
         parser.add_argument(
             '--clear-database',
             default=True,
@@ -53,6 +72,9 @@ class Command(BaseCommand):
         dogs_min = options['dogs_min']
         dogs_max = options['dogs_max']
         clear_database = options['clear_database']
+        seed = resolve_seed(options['seed'])
+        workers = options['workers']
+        batch_size = options['batch_size']
 
         self.stdout.write(self.style.SUCCESS("🐕 Starting test database generation..."))
         self.stdout.write(f"📊 Configuration:")
@@ -60,18 +82,20 @@ class Command(BaseCommand):
         self.stdout.write(f"   - Contacts: {contacts_min}-{contacts_max}")
         self.stdout.write(f"   - Dogs per charter: {dogs_min}-{dogs_max}")
         self.stdout.write(f"   - Clear existing data: {clear_database}")
+        self.stdout.write(f"   - Seed: {seed}")
+        self.stdout.write(f"   - Workers: {workers}, batch size: {batch_size}")
 
         if clear_database:
             self.clear_existing_data()
 
         self.stdout.write(self.style.WARNING("\n🏢 Step 1: Creating charters..."))
-        charters = create_charters(charters_count)
+        charters = create_charters(charters_count, seed=seed)
 
         self.stdout.write(self.style.WARNING("\n🏢 Step 2: Creating contacts..."))
-        contacts = create_contacts(contacts_min, contacts_max)
+        create_contacts(contacts_min, contacts_max, seed=seed, workers=workers, batch_size=batch_size)
 
         self.stdout.write(self.style.WARNING("\n🐕 Step 3: Creating dogs..."))
-        dogs = create_dogs(dogs_min, dogs_max, charters)
+        create_dogs(dogs_min, dogs_max, charters, seed=seed, workers=workers, batch_size=batch_size)
 
         self.stdout.write(self.style.WARNING("\n📈 Step 4: Generating summary statistics..."))
         self.display_summary_statistics()
@@ -94,43 +118,28 @@ class Command(BaseCommand):
         """Display comprehensive statistics about the generated data."""
         total_charters = Charter.objects.count()
         total_contacts = Contact.objects.count()
-        total_dogs = Dog.objects.count()
 
-        owned_dogs = Dog.objects.filter(owner__isnull=False).count()
-        
-        intake_training_dogs = Dog.objects.filter(intake_status=DogIntakeStatus.TRAINING).count()
-        intake_hotel_dogs = Dog.objects.filter(intake_status=DogIntakeStatus.HOTEL).count()
-        intake_rescue_dogs = Dog.objects.filter(intake_status=DogIntakeStatus.RESCUE).count()
-
-        vaccination_not_vaccinated_dogs = Dog.objects.filter(vaccination_status=DogVaccinationStatus.NOT_VACCINATED).count()
-        vaccination_incomplete_dogs = Dog.objects.filter(vaccination_status=DogVaccinationStatus.INCOMPLETE).count()
-        vaccination_complete_dogs = Dog.objects.filter(vaccination_status=DogVaccinationStatus.COMPLETE).count()
-        vaccination_unspecified_dogs = Dog.objects.filter(vaccination_status=DogVaccinationStatus.UNSPECIFIED).count()        
-        
-        healthy_dogs = Dog.objects.filter(health_status=DogHealthStatus.HEALTHY).count()
-        sick_dogs = Dog.objects.filter(health_status=DogHealthStatus.SICK).count()
-        passed_away_dogs = Dog.objects.filter(health_status=DogHealthStatus.PASSED_AWAY).count()
-        unspecified_dogs = Dog.objects.filter(health_status=DogHealthStatus.UNSPECIFIED).count()
+        stats, _ = read_charter_statistics(Charter.objects.select_related('stats'))
 
         self.stdout.write("\n📊 Summary Statistics:")
         self.stdout.write(f"  - Charters: {total_charters}")
         self.stdout.write(f"  - Contacts: {total_contacts}")
-        self.stdout.write(f"  - Dogs: {total_dogs}")
-        self.stdout.write(f"  - Owned Dogs: {owned_dogs}")
+        self.stdout.write(f"  - Dogs: {stats['total']}")
+        self.stdout.write(f"  - Owned Dogs: {stats['owned']}")
         self.stdout.write(f"  - Intake Reasons:")
-        self.stdout.write(f"      - Rescue: {intake_rescue_dogs}")
-        self.stdout.write(f"      - Training: {intake_training_dogs}")
-        self.stdout.write(f"      - Hotel: {intake_hotel_dogs}")
+        self.stdout.write(f"      - Rescue: {stats['rescue']}")
+        self.stdout.write(f"      - Training: {stats['training']}")
+        self.stdout.write(f"      - Hotel: {stats['hotel']}")
         self.stdout.write(f"  - Vaccination Status:")
-        self.stdout.write(f"      - Not Vaccinated: {vaccination_not_vaccinated_dogs}")
-        self.stdout.write(f"      - Incomplete: {vaccination_incomplete_dogs}")
-        self.stdout.write(f"      - Complete: {vaccination_complete_dogs}")
-        self.stdout.write(f"      - Unspecified: {vaccination_unspecified_dogs}")
+        self.stdout.write(f"      - Not Vaccinated: {stats['not_vaccinated']}")
+        self.stdout.write(f"      - Incomplete: {stats['incomplete_vaccination']}")
+        self.stdout.write(f"      - Complete: {stats['complete_vaccination']}")
+        self.stdout.write(f"      - Unspecified: {stats['unspecified_vaccination']}")
         self.stdout.write(f"  - Health Status:")
-        self.stdout.write(f"      - Healthy: {healthy_dogs}")
-        self.stdout.write(f"      - Sick: {sick_dogs}")
-        self.stdout.write(f"      - Passed Away: {passed_away_dogs}")
-        self.stdout.write(f"      - Unspecified: {unspecified_dogs}")
+        self.stdout.write(f"      - Healthy: {stats['healthy']}")
+        self.stdout.write(f"      - Sick: {stats['sick']}")
+        self.stdout.write(f"      - Passed Away: {stats['passed_away']}")
+        self.stdout.write(f"      - Unspecified: {stats['unspecified_health']}")
         
         
 
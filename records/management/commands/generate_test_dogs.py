@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from records.models import Charter
-from records.models import DogHealthStatus, DogIntakeStatus, DogVaccinationStatus
 from records.management.helpers.command_helpers import create_dogs
+from records.statistics import read_charter_statistics
 
 
 class Command(BaseCommand):
@@ -59,53 +59,31 @@ class Command(BaseCommand):
 
         for charter in charters:
             self.stdout.write(f'Generating {count_min}-{count_max} test dogs for {charter.entity_info.name}...')
-            dogs = create_dogs(count_min, count_max, [charter], create_owners=create_owners)
-            stats = {
-                'health': {
-                    'healthy': sum(1 for dog in dogs if dog.health_status == DogHealthStatus.HEALTHY),
-                    'sick': sum(1 for dog in dogs if dog.health_status == DogHealthStatus.SICK),
-                    'passed': sum(1 for dog in dogs if dog.health_status == DogHealthStatus.PASSED_AWAY),
-                    'unspecified': sum(1 for dog in dogs if dog.health_status == DogHealthStatus.UNSPECIFIED),
-                },
-                'intake': {
-                    'rescue': sum(1 for dog in dogs if dog.intake_status == DogIntakeStatus.RESCUE),
-                    'training': sum(1 for dog in dogs if dog.intake_status == DogIntakeStatus.TRAINING),
-                    'hotel': sum(1 for dog in dogs if dog.intake_status == DogIntakeStatus.HOTEL),
-                },
-                'vaccination': {
-                    'not_vaccinated': sum(1 for dog in dogs if dog.vaccination_status == DogVaccinationStatus.NOT_VACCINATED),
-                    'incomplete': sum(1 for dog in dogs if dog.vaccination_status == DogVaccinationStatus.INCOMPLETE),
-                    'complete': sum(1 for dog in dogs if dog.vaccination_status == DogVaccinationStatus.COMPLETE),
-                    'unspecified': sum(1 for dog in dogs if dog.vaccination_status == DogVaccinationStatus.UNSPECIFIED),
-                },
-                'owners': {
-                    'owner': sum(1 for dog in dogs if dog.owner is not None),
-                    'no_owner': sum(1 for dog in dogs if dog.owner is None),
-                }
-            }
+            created_count = create_dogs(count_min, count_max, [charter], create_owners=create_owners)
+            # Generated dogs are streamed into the database, so the breakdown is read back
+            # from the charter's counters and covers all of its dogs
+            stats, _ = read_charter_statistics(Charter.objects.filter(pk=charter.pk).select_related('stats'))
 
-
-            total_created = sum(stats['health'].values())
-            self.stdout.write(f'Successfully created {total_created} test dogs!')
+            self.stdout.write(f'Successfully created {created_count} test dogs!')
             self.stdout.write('Statistics:')
             self.stdout.write(f'  - Charter: {charter.entity_info.name}')
             self.stdout.write(f'  - Health:')
-            self.stdout.write(f'      - Healthy: {stats["health"]["healthy"]}')
-            self.stdout.write(f'      - Sick: {stats["health"]["sick"]}')
-            self.stdout.write(f'      - Passed Away: {stats["health"]["passed"]}')
-            self.stdout.write(f'      - Unspecified: {stats["health"]["unspecified"]}')
+            self.stdout.write(f'      - Healthy: {stats["healthy"]}')
+            self.stdout.write(f'      - Sick: {stats["sick"]}')
+            self.stdout.write(f'      - Passed Away: {stats["passed_away"]}')
+            self.stdout.write(f'      - Unspecified: {stats["unspecified_health"]}')
             self.stdout.write(f'  - Intake:')
-            self.stdout.write(f'      - Rescue: {stats["intake"]["rescue"]}')
-            self.stdout.write(f'      - Training: {stats["intake"]["training"]}')
-            self.stdout.write(f'      - Hotel: {stats["intake"]["hotel"]}')
+            self.stdout.write(f'      - Rescue: {stats["rescue"]}')
+            self.stdout.write(f'      - Training: {stats["training"]}')
+            self.stdout.write(f'      - Hotel: {stats["hotel"]}')
             self.stdout.write(f'  - Vaccination:')
-            self.stdout.write(f'      - Not Vaccinated: {stats["vaccination"]["not_vaccinated"]}')
-            self.stdout.write(f'      - Incomplete: {stats["vaccination"]["incomplete"]}')
-            self.stdout.write(f'      - Complete: {stats["vaccination"]["complete"]}')
-            self.stdout.write(f'      - Unspecified: {stats["vaccination"]["unspecified"]}')
+            self.stdout.write(f'      - Not Vaccinated: {stats["not_vaccinated"]}')
+            self.stdout.write(f'      - Incomplete: {stats["incomplete_vaccination"]}')
+            self.stdout.write(f'      - Complete: {stats["complete_vaccination"]}')
+            self.stdout.write(f'      - Unspecified: {stats["unspecified_vaccination"]}')
             self.stdout.write(f'  - Owners:')
-            self.stdout.write(f'      - With Owner: {stats["owners"]["owner"]}')
-            self.stdout.write(f'      - No Owner: {stats["owners"]["no_owner"]}')
+            self.stdout.write(f'      - With Owner: {stats["owned"]}')
+            self.stdout.write(f'      - No Owner: {stats["total"] - stats["owned"]}')
 
         self.stdout.write(
             self.style.SUCCESS(
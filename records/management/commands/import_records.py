@@ -0,0 +1,66 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from records.imports import ContactImporter, DogImporter
+from records.models import Charter
+
+
+class Command(BaseCommand):
+    help = 'Imports dogs or contacts from a CSV file; valid rows are saved, rejected rows reported'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'records',
+            choices=['dogs', 'contacts'],
+            help='What the file contains'
+        )
+        parser.add_argument(
+            'path',
+            help='UTF-8 CSV file with a header row'
+        )
+        parser.add_argument(
+            '--charter',
+            type=int,
+            help="Charter ID the dogs are added to (default: each row's Charter column)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only validate the file'
+        )
+        parser.add_argument(
+            '--errors',
+            help='Write the rejected rows with their errors to this CSV file'
+        )
+
+    def handle(self, *args, **options):
+        if options['records'] == 'dogs':
+            charter = None
+            if options['charter']:
+                try:
+                    charter = Charter.objects.get(pk=options['charter'])
+                except Charter.DoesNotExist:
+                    raise CommandError(f"Charter {options['charter']} does not exist.")
+            importer = DogImporter(charter=charter, dry_run=options['dry_run'])
+        else:
+            importer = ContactImporter(dry_run=options['dry_run'])
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as file:
+                result = importer.run(file)
+        except (OSError, UnicodeDecodeError) as error:
+            raise CommandError(f"Cannot read {options['path']}: {error}")
+        except ValidationError as error:
+            raise CommandError('; '.join(error.messages))
+
+        if options['errors'] and result.errors:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as report:
+                result.write_report(report)
+        for line, row, messages in result.errors[:20]:
+            self.stdout.write(self.style.ERROR(f"  Line {line}: {'; '.join(messages)}"))
+        if len(result.errors) > 20:
+            self.stdout.write(f'  ... and {len(result.errors) - 20} more')
+
+        action = 'valid' if options['dry_run'] else 'imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.rows} rows read: {result.created} {action}, {len(result.errors)} rejected."
+        ))
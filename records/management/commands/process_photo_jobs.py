@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from records.caching import bump_version
+from records.models import Dog, DogPhotoRecord, PhotoJob, PhotoJobStatus
+from records.thumbnails import process_photo
+
+
+# Columns holding the name of a photo blob
+PHOTO_REFERENCES = [
+    (Dog, 'default_photo'),
+    (Dog, 'profile_photo'),
+    (DogPhotoRecord, 'photo'),
+]
+
+
+def repoint_photo(old_name, new_name):
+    """Points every record showing the blob old_name to new_name, e.g. its EXIF stripped copy."""
+    with transaction.atomic():
+        for model, field in PHOTO_REFERENCES:
+            model.objects.filter(**{field: old_name}).update(**{field: new_name})
+        # The old blob is left to collect_media_garbage once no job refers to it either
+        PhotoJob.objects.filter(photo=old_name).update(photo=new_name)
+
+
+def init_worker():
+    """Worker processes are spawned fresh and only need settings for the storage backend."""
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Processes queued photo uploads (EXIF stripping, thumbnails) in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of jobs claimed at a time (default: 50)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait when the queue is empty (default: 2)'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=600,
+            help='Seconds after which a running job is considered abandoned and requeued (default: 600)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty instead of polling for new jobs'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Requeue failed jobs before starting'
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Queue every existing dog photo; renditions that already exist are not redone'
+        )
+
+    def handle(self, *args, **options):
+        self.requeue(options['stale_after'], options['retry_failed'])
+        if options['backfill']:
+            self.backfill()
+
+        processed = failed = 0
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=context, initializer=init_worker) as pool:
+            while True:
+                jobs = self.claim_jobs(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                futures = {pool.submit(process_photo, job.photo): job for job in jobs}
+                for future in as_completed(futures):
+                    job = futures[future]
+                    error = future.exception()
+                    if not error:
+                        photo, _ = future.result()
+                        if photo != job.photo:
+                            repoint_photo(job.photo, photo)
+                    PhotoJob.objects.filter(pk=job.pk).update(
+                        status=PhotoJobStatus.FAILED if error else PhotoJobStatus.DONE,
+                        error=repr(error) if error else '',
+                        finished=timezone.now(),
+                    )
+                    if error:
+                        failed += 1
+                        self.stdout.write(self.style.ERROR(f"Failed {job.photo}: {error!r}"))
+                    else:
+                        processed += 1
+                # Cached dog cards and pages can now point at the new renditions and copies
+                bump_version(Dog, DogPhotoRecord)
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} photos, {failed} failed."))
+
+    def claim_jobs(self, count):
+        """Marks up to count pending jobs as running; a job another worker claimed first is skipped."""
+        claimed = []
+        for job in PhotoJob.objects.filter(status=PhotoJobStatus.PENDING)[:count]:
+            if PhotoJob.objects.filter(pk=job.pk, status=PhotoJobStatus.PENDING).update(
+                status=PhotoJobStatus.RUNNING,
+                started=timezone.now(),
+                attempts=F('attempts') + 1,
+            ):
+                claimed.append(job)
+        return claimed
+
+    def requeue(self, stale_after, retry_failed):
+        stale = PhotoJob.objects.filter(
+            status=PhotoJobStatus.RUNNING,
+            started__lt=timezone.now() - timedelta(seconds=stale_after),
+        )
+        requeued = stale.update(status=PhotoJobStatus.PENDING)
+        if retry_failed:
+            requeued += PhotoJob.objects.filter(status=PhotoJobStatus.FAILED).update(status=PhotoJobStatus.PENDING, error='')
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} jobs.")
+
+    def backfill(self):
+        names = set(Dog.objects.exclude(default_photo='').exclude(default_photo__isnull=True).values_list('default_photo', flat=True))
+        names.update(DogPhotoRecord.objects.exclude(photo='').exclude(photo__isnull=True).values_list('photo', flat=True))
+        queued = sum(1 for name in names if PhotoJob.objects.enqueue(name))
+        self.stdout.write(f"Queued {queued} existing photos.")
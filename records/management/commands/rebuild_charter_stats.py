@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from records.statistics import rebuild_charter_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-charter dog counters (CharterStats) from the dogs table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--charter_ids',
+            type=int,
+            nargs='*',
+            default=None,
+            help='One or more charter IDs to rebuild (default: all charters)'
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_charter_stats(options['charter_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} charter{'s' if rebuilt != 1 else ''}."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from records.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of dogs, charters and contacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias to rebuild the index in (default: default)'
+        )
+
+    def handle(self, *args, **options):
+        dogs, entities = rebuild_search_index(options['database'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {dogs} dogs and {entities} charters and contacts."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from records.models import Dog
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the cached profile photo of every dog from its photo records'
+
+    def handle(self, *args, **options):
+        updated = Dog.objects.refresh_profile_photos()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed profile photos for {updated} dogs."))
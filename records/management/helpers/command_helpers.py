@@ -1,12 +1,71 @@
 import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.db import router, transaction
 from django.utils import timezone
-from records.models import EntityInfo, Contact, Dog, Charter
+from records.models import EntityInfo, Contact, Dog, Charter, DogWeightRecord
+from records.statistics import rebuild_charter_stats
+from records.search import DOG_INDEX, ENTITY_INDEX, write_index
+from records.caching import bump_version
 from records.models import (
     DogGender, DogBreed, DogIntakeStatus, DogColor, 
     DogHealthStatus, DogVaccinationStatus, TripleChoice
 )
 
 
+# Rows are built in memory and written with bulk_create, BATCH_SIZE rows per transaction,
+# so generation runs at a bounded memory footprint whatever the dataset size. bulk_create
+# skips save() and the signals, so timestamps, the search index, CharterStats and the
+# cache versions are filled in here instead. Every chunk draws from its own Random seeded
+# from (seed, chunk), so a given seed produces the same data with any number of workers.
+BATCH_SIZE = 2000
+
+
+def resolve_seed(seed):
+    return random.randrange(2 ** 32) if seed is None else seed
+
+
+def chunk_seed(seed, *parts):
+    return ':'.join(str(part) for part in (seed, *parts))
+
+
+def chunk_sizes(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield min(batch_size, count - start)
+
+
+def run_chunks(generate, tasks, workers=1):
+    """
+    Yields generate(*task) for every task, in order. With several workers the chunks are
+    built in a process pool, at most two per worker ahead of the caller's inserts.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield generate(*task)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(generate, *task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_entity_info(**fields):
+    """Unsaved EntityInfo with what EntityInfo.save() would set on creation"""
+    now = timezone.now()
+    entity_info = EntityInfo(created=now, modified=now, **fields)
+    entity_info.name = entity_info.name.title()
+    return entity_info
+
+
+def index_entities(entities):
+    write_index(ENTITY_INDEX, EntityInfo.objects.filter(pk__in=[entity.pk for entity in entities]), router.db_for_write(EntityInfo))
+
+
 
 FIRST_NAMES = [
         "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda",
@@ -62,21 +121,22 @@ STREET_NAMES = ["Main St", "Oak Ave", "Pine Rd", "Elm St", "Cedar Ln", "Maple Dr
 CITIES = ["Istanbul", "Ankara", "Antalya", "Izmir", "Adana", "Bandirma", "Maras", "Malatya"]
 
 
-def get_random_contact():
-    first_name = random.choice(FIRST_NAMES)
-    last_name = random.choice(LAST_NAMES)
+def get_random_contact(rng=random):
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = rng.choice(LAST_NAMES)
     name = f"{first_name} {last_name}"
     
     email = f"{first_name.lower()}.{last_name.lower()}@example.com"
-    phone = f"555-{random.randint(100, 999)}-{random.randint(1000, 9999)}"
-    street_number = random.randint(1, 9999)
-    street_name = random.choice(STREET_NAMES)
-    city = random.choice(CITIES)
-    zip_code = f"{random.randint(10000, 99999)}"
+    phone = f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}"
+    street_number = rng.randint(1, 9999)
+    street_name = rng.choice(STREET_NAMES)
+    city = rng.choice(CITIES)
+    zip_code = f"{rng.randint(10000, 99999)}"
     address = f"{street_number} {street_name}, {city}, {zip_code}"
-    notes = random.choice(CONTACT_AND_ADOPTEE_NOTES) if random.random() < 0.7 else ""
+    notes = rng.choice(CONTACT_AND_ADOPTEE_NOTES) if rng.random() < 0.7 else ""
 
-    entity_info = EntityInfo.objects.create(
+    # Unsaved; save_contacts() bulk-inserts the entity before the contact
+    entity_info = get_entity_info(
             name=name,
             email=email,
             phone=phone,
@@ -89,11 +149,32 @@ def get_random_contact():
     )
 
 
-def create_contacts(count_min, count_max):
-    """Create random contacts of a given count"""
-    contacts = [get_random_contact()for i in range(random.randint(count_min, count_max)) ]
-    Contact.objects.bulk_create(contacts)
-    return contacts
+def generate_contacts(seed, count):
+    """Builds one chunk of unsaved contacts; runs in pool workers, so it must not touch the database."""
+    rng = random.Random(seed)
+    return [get_random_contact(rng) for i in range(count)]
+
+
+def save_contacts(contacts):
+    """Inserts a chunk of contacts from generate_contacts() together with their entities."""
+    with transaction.atomic():
+        entities = EntityInfo.objects.bulk_create([contact.entity_info for contact in contacts])
+        Contact.objects.bulk_create(contacts)
+        index_entities(entities)
+
+
+def create_contacts(count_min, count_max, seed=None, workers=1, batch_size=BATCH_SIZE):
+    """Create random contacts of a given count; returns the number created"""
+    seed = resolve_seed(seed)
+    count = random.Random(chunk_seed(seed, 'contacts')).randint(count_min, count_max)
+    tasks = (
+        (chunk_seed(seed, 'contacts', number), size)
+        for number, size in enumerate(chunk_sizes(count, batch_size))
+    )
+    for contacts in run_chunks(generate_contacts, tasks, workers):
+        save_contacts(contacts)
+    bump_version(Contact, EntityInfo)
+    return count
 
 
 DOG_HEALTHY_RATE_MIN = 0.75
@@ -105,11 +186,11 @@ DOG_PASSED_AWAY_RATE_MAX = 0.08
 DOG_UNSPECIFIED_RATE_MIN = 0.03
 DOG_UNSPECIFIED_RATE_MAX = 0.05
 
-def get_health_values_for_charter():
-    healthy_rate = random.uniform(DOG_HEALTHY_RATE_MIN, DOG_HEALTHY_RATE_MAX)
-    unspecified_rate = random.uniform(DOG_UNSPECIFIED_RATE_MIN, DOG_UNSPECIFIED_RATE_MAX)
-    sick_rate = random.uniform(DOG_SICK_RATE_MIN, DOG_SICK_RATE_MAX)
-    passed_away_rate = random.uniform(DOG_PASSED_AWAY_RATE_MIN, DOG_PASSED_AWAY_RATE_MAX)
+def get_health_values_for_charter(rng=random):
+    healthy_rate = rng.uniform(DOG_HEALTHY_RATE_MIN, DOG_HEALTHY_RATE_MAX)
+    unspecified_rate = rng.uniform(DOG_UNSPECIFIED_RATE_MIN, DOG_UNSPECIFIED_RATE_MAX)
+    sick_rate = rng.uniform(DOG_SICK_RATE_MIN, DOG_SICK_RATE_MAX)
+    passed_away_rate = rng.uniform(DOG_PASSED_AWAY_RATE_MIN, DOG_PASSED_AWAY_RATE_MAX)
     total = healthy_rate + unspecified_rate + sick_rate + passed_away_rate
     scale = 1.0 / total
     healthy_rate *= scale
@@ -132,11 +213,11 @@ DOG_VACCINATION_NOT_VACCINATED_RATE_MAX = 0.08
 DOG_VACCINATION_UNSPECIFIED_RATE_MIN = 0.03
 DOG_VACCINATION_UNSPECIFIED_RATE_MAX = 0.05
 
-def get_vaccination_values_for_charter():
-    complete_rate = random.uniform(DOG_VACCINATION_COMPLETE_RATE_MIN, DOG_VACCINATION_COMPLETE_RATE_MAX)
-    incomplete_rate = random.uniform(DOG_VACCINATION_INCOMPLETE_RATE_MIN, DOG_VACCINATION_INCOMPLETE_RATE_MAX)
-    not_vaccinated_rate = random.uniform(DOG_VACCINATION_NOT_VACCINATED_RATE_MIN, DOG_VACCINATION_NOT_VACCINATED_RATE_MAX)
-    unspecified_rate = random.uniform(DOG_VACCINATION_UNSPECIFIED_RATE_MIN, DOG_VACCINATION_UNSPECIFIED_RATE_MAX)
+def get_vaccination_values_for_charter(rng=random):
+    complete_rate = rng.uniform(DOG_VACCINATION_COMPLETE_RATE_MIN, DOG_VACCINATION_COMPLETE_RATE_MAX)
+    incomplete_rate = rng.uniform(DOG_VACCINATION_INCOMPLETE_RATE_MIN, DOG_VACCINATION_INCOMPLETE_RATE_MAX)
+    not_vaccinated_rate = rng.uniform(DOG_VACCINATION_NOT_VACCINATED_RATE_MIN, DOG_VACCINATION_NOT_VACCINATED_RATE_MAX)
+    unspecified_rate = rng.uniform(DOG_VACCINATION_UNSPECIFIED_RATE_MIN, DOG_VACCINATION_UNSPECIFIED_RATE_MAX)
     total = complete_rate + incomplete_rate + not_vaccinated_rate + unspecified_rate
     scale = 1.0 / total
     complete_rate *= scale
@@ -157,10 +238,10 @@ DOG_INTAKE_TRAINING_RATE_MAX = 0.15
 DOG_INTAKE_HOTEL_RATE_MIN = 0.05
 DOG_INTAKE_HOTEL_RATE_MAX = 0.08
 
-def get_intake_values_for_charter():
-    intake_rate = random.uniform(DOG_INTAKE_RESCUE_RATE_MIN, DOG_INTAKE_RESCUE_RATE_MAX)
-    training_rate = random.uniform(DOG_INTAKE_TRAINING_RATE_MIN, DOG_INTAKE_TRAINING_RATE_MAX)
-    hotel_rate = random.uniform(DOG_INTAKE_HOTEL_RATE_MIN, DOG_INTAKE_HOTEL_RATE_MAX)
+def get_intake_values_for_charter(rng=random):
+    intake_rate = rng.uniform(DOG_INTAKE_RESCUE_RATE_MIN, DOG_INTAKE_RESCUE_RATE_MAX)
+    training_rate = rng.uniform(DOG_INTAKE_TRAINING_RATE_MIN, DOG_INTAKE_TRAINING_RATE_MAX)
+    hotel_rate = rng.uniform(DOG_INTAKE_HOTEL_RATE_MIN, DOG_INTAKE_HOTEL_RATE_MAX)
     total = intake_rate + training_rate + hotel_rate
     scale = 1.0 / total
     intake_rate *= scale
@@ -172,17 +253,57 @@ def get_intake_values_for_charter():
         "hotel_rate": hotel_rate
     }
 
-def create_dogs(count_min, count_max, charters, create_owners=True):
-    """Create random dogs in given range for given charters."""
-    dogs = []
-    for charter in charters:
-        health_values = get_health_values_for_charter()
-        vaccination_values = get_vaccination_values_for_charter()
-        intake_values = get_intake_values_for_charter()
-        dogs_created = [get_random_dog(health_values, vaccination_values, intake_values, charter, create_owners) for i in range(random.randint(count_min, count_max))]
-        dogs.extend(dogs_created)
-    Dog.objects.bulk_create(dogs)
-    return dogs
+def generate_dogs(seed, charter, rates, count, create_owners):
+    """
+    Builds one chunk of unsaved dogs as (dog, weight records) pairs, owners attached
+    unsaved. Runs in pool workers, so it must not touch the database.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        dog = get_random_dog(*rates, charter, create_owners, rng)
+        rows.append((dog, get_random_weight_history(dog, rng)))
+    return rows
+
+
+def save_dogs(rows):
+    """Inserts a chunk from generate_dogs(): owner entities, owners, dogs, then weight records."""
+    dogs = [dog for dog, weights in rows]
+    owners = [dog.owner for dog in dogs if dog.owner is not None]
+    with transaction.atomic():
+        entities = EntityInfo.objects.bulk_create([owner.entity_info for owner in owners])
+        Contact.objects.bulk_create(owners)
+        Dog.objects.bulk_create(dogs)
+        DogWeightRecord.objects.bulk_create([weight for dog, weights in rows for weight in weights])
+        index_entities(entities)
+        write_index(DOG_INDEX, Dog.objects.filter(pk__in=[dog.pk for dog in dogs]), router.db_for_write(Dog))
+
+
+def create_dogs(count_min, count_max, charters, create_owners=True, seed=None, workers=1, batch_size=BATCH_SIZE):
+    """Create random dogs in given range for given charters; returns the number created."""
+    seed = resolve_seed(seed)
+    tasks = []
+    count = 0
+    # Charters are told apart by position, not pk, so a seed gives the same dogs in any database
+    for position, charter in enumerate(charters):
+        rng = random.Random(chunk_seed(seed, 'charter', position))
+        rates = (
+            get_health_values_for_charter(rng),
+            get_vaccination_values_for_charter(rng),
+            get_intake_values_for_charter(rng),
+        )
+        charter_count = rng.randint(count_min, count_max)
+        count += charter_count
+        tasks.extend(
+            (chunk_seed(seed, 'dogs', position, number), charter, rates, size, create_owners)
+            for number, size in enumerate(chunk_sizes(charter_count, batch_size))
+        )
+    for rows in run_chunks(generate_dogs, tasks, workers):
+        save_dogs(rows)
+    # bulk_create bypasses the signals that maintain CharterStats and the cache versions
+    rebuild_charter_stats([charter.pk for charter in charters])
+    bump_version(Dog, DogWeightRecord, Contact, EntityInfo)
+    return count
 
 DOG_DESCRIPTIONS = [
         "Friendly and energetic dog who loves to play fetch and go on walks.",
@@ -284,56 +405,63 @@ DOG_SPECIAL_NEEDS = [
     ]
 
 
-def get_random_dog(health_values, vaccination_values, intake_values, charter, create_owners=True):
-    name = random.choice(DOG_NAMES)
-    age_months = random.randint(2, 120)
-    gender = random.choice([DogGender.MALE, DogGender.FEMALE, DogGender.UNSPECIFIED])
-    breed = random.choice([choice[0] for choice in DogBreed.choices])
-    color = random.choice([choice[0] for choice in DogColor.choices])
+# Choice values, built once rather than for every generated dog
+DOG_GENDERS = [DogGender.MALE, DogGender.FEMALE, DogGender.UNSPECIFIED]
+DOG_BREEDS = [choice[0] for choice in DogBreed.choices]
+DOG_COLORS = [choice[0] for choice in DogColor.choices]
+DOG_VACCINATION_STATUSES = [choice[0] for choice in DogVaccinationStatus.choices]
+TRIPLE_CHOICES = [choice[0] for choice in TripleChoice.choices]
+
+def get_random_dog(health_values, vaccination_values, intake_values, charter, create_owners=True, rng=random):
+    name = rng.choice(DOG_NAMES)
+    age_months = rng.randint(2, 120)
+    gender = rng.choice(DOG_GENDERS)
+    breed = rng.choice(DOG_BREEDS)
+    color = rng.choice(DOG_COLORS)
     
-    vaccination_status = random.choice([choice[0] for choice in DogVaccinationStatus.choices])
-    castration_status = random.choice([choice[0] for choice in TripleChoice.choices])
-    microchip_status = random.choice([choice[0] for choice in TripleChoice.choices])
+    vaccination_status = rng.choice(DOG_VACCINATION_STATUSES)
+    castration_status = rng.choice(TRIPLE_CHOICES)
+    microchip_status = rng.choice(TRIPLE_CHOICES)
 
     if breed == DogBreed.GOLDEN_RETRIEVER:
-        weight = random.uniform(25, 35)
-        height = random.uniform(55, 61)
+        weight = rng.uniform(25, 35)
+        height = rng.uniform(55, 61)
     elif breed == DogBreed.GERMAN_SHEPHERD:
-        weight = random.uniform(30, 40)
-        height = random.uniform(55, 65)
+        weight = rng.uniform(30, 40)
+        height = rng.uniform(55, 65)
     elif breed == DogBreed.LABRADOR:
-        weight = random.uniform(25, 35)
-        height = random.uniform(55, 62)
+        weight = rng.uniform(25, 35)
+        height = rng.uniform(55, 62)
     elif breed == DogBreed.BEAGLE:
-        weight = random.uniform(9, 11)
-        height = random.uniform(33, 41)
+        weight = rng.uniform(9, 11)
+        height = rng.uniform(33, 41)
     elif breed == DogBreed.BULLDOG:
-        weight = random.uniform(20, 25)
-        height = random.uniform(30, 40)
+        weight = rng.uniform(20, 25)
+        height = rng.uniform(30, 40)
     elif breed == DogBreed.PITBULL:
-        weight = random.uniform(15, 30)
-        height = random.uniform(43, 53)
+        weight = rng.uniform(15, 30)
+        height = rng.uniform(43, 53)
     elif breed == DogBreed.HUSKY:
-        weight = random.uniform(20, 27)
-        height = random.uniform(51, 60)
+        weight = rng.uniform(20, 27)
+        height = rng.uniform(51, 60)
     elif breed == DogBreed.CHIHUAHUA:
-        weight = random.uniform(1, 3)
-        height = random.uniform(15, 23)
+        weight = rng.uniform(1, 3)
+        height = rng.uniform(15, 23)
     elif breed == DogBreed.POMERANIAN:
-        weight = random.uniform(1.5, 3.5)
-        height = random.uniform(18, 30)
+        weight = rng.uniform(1.5, 3.5)
+        height = rng.uniform(18, 30)
     else: 
-        weight = random.uniform(10, 25)
-        height = random.uniform(30, 50)
+        weight = rng.uniform(10, 25)
+        height = rng.uniform(30, 50)
     
     start_time = timezone.now()
-    arrival_date = start_time - timezone.timedelta(days=random.randint(1, 365))
+    arrival_date = start_time - timezone.timedelta(days=rng.randint(1, 365))
 
     microchip_id = None
     if microchip_status == TripleChoice.YES:
-        microchip_id = f"CHIP{random.randint(100000, 999999)}"
+        microchip_id = f"CHIP{rng.randint(100000, 999999)}"
 
-    health_roll = random.random()
+    health_roll = rng.random()
     if health_roll <= health_values["healthy_rate"]:
         health_status = DogHealthStatus.HEALTHY
     elif health_roll <= health_values['healthy_rate'] + health_values["unspecified_rate"]:
@@ -343,7 +471,7 @@ def get_random_dog(health_values, vaccination_values, intake_values, charter, cr
     else:
         health_status = DogHealthStatus.PASSED_AWAY
 
-    vaccination_roll = random.random()
+    vaccination_roll = rng.random()
     if vaccination_roll <= vaccination_values["complete_rate"]:
         vaccination_status = DogVaccinationStatus.COMPLETE
     elif vaccination_roll <= vaccination_values["complete_rate"] + vaccination_values["incomplete_rate"]:
@@ -353,7 +481,7 @@ def get_random_dog(health_values, vaccination_values, intake_values, charter, cr
     else:
         vaccination_status = DogVaccinationStatus.UNSPECIFIED
 
-    intake_roll = random.random()
+    intake_roll = rng.random()
     if intake_roll <= intake_values["intake_rate"]:
         intake_reason = DogIntakeStatus.RESCUE
     elif intake_roll <= intake_values["intake_rate"] + intake_values["training_rate"]:
@@ -363,8 +491,7 @@ def get_random_dog(health_values, vaccination_values, intake_values, charter, cr
     
     owner = None
     if intake_reason != DogIntakeStatus.RESCUE and create_owners: 
-        owner = get_random_contact()
-        owner.save()
+        owner = get_random_contact(rng)
 
     dog = Dog(
             name=name,
@@ -380,15 +507,15 @@ def get_random_dog(health_values, vaccination_values, intake_values, charter, cr
             current_weight_kg=round(weight, 1),
             height_cm=round(height, 1),
             color=color,
-            detailed_description=random.choice(DOG_DESCRIPTIONS),
+            detailed_description=rng.choice(DOG_DESCRIPTIONS),
             health_status=health_status,
             vaccination_status=vaccination_status,
             castration_status=castration_status,
-            health_record=random.choice(DOG_HEALTH_RECORDS),
+            health_record=rng.choice(DOG_HEALTH_RECORDS),
             vaccination_record="DHPP, Rabies, Bordetella - all current",
             treatment_record="***test health record***",
-            special_needs=random.choice(DOG_SPECIAL_NEEDS),
-            behavioral_notes=random.choice(DOG_BEHAVIORAL_NOTES),
+            special_needs=rng.choice(DOG_SPECIAL_NEEDS),
+            behavioral_notes=rng.choice(DOG_BEHAVIORAL_NOTES),
             other_notes=f"***test dog***",
             created=timezone.now(),
             modified=timezone.now()
@@ -396,6 +523,23 @@ def get_random_dog(health_values, vaccination_values, intake_values, charter, cr
     return dog
 
 
+WEIGHT_RECORDS_MAX = 4
+
+def get_random_weight_history(dog, rng=random):
+    """Weigh-ins between arrival and now, the last one at the dog's current weight."""
+    count = rng.randint(1, WEIGHT_RECORDS_MAX)
+    span = dog.created - dog.arrival_date
+    records = []
+    for number in range(count):
+        last = number == count - 1
+        records.append(DogWeightRecord(
+            dog=dog,
+            record_date=dog.created if last else dog.arrival_date + span * (number / count),
+            weight_kg=dog.current_weight_kg if last else round(dog.current_weight_kg * rng.uniform(0.85, 1.05), 1),
+        ))
+    return records
+
+
     
 CHARTER_NAMES = [
     'TEST KRES_ISTANBUL',
@@ -413,21 +557,22 @@ CHARTER_NAMES = [
     'TEST KRES_TEKIRDAG',
 ]
     
-def create_charters(count):
+def create_charters(count, seed=None):
     """Create charters with realistic data."""
-    
-    charters = []
+    rng = random.Random(chunk_seed(resolve_seed(seed), 'charters'))
+    entities = []
     for i in range(count):
         name = CHARTER_NAMES[i] if i < len(CHARTER_NAMES) else f"TEST Charter {i+1}"
         
-        entity_info = EntityInfo.objects.create(
+        entities.append(get_entity_info(
             name=name,
             email=f"info@{name.lower().replace(' ', '')}.org",
-            phone=f"555-{random.randint(100, 999)}-{random.randint(1000, 9999)}",
-            address=f"{random.randint(100, 9999)} {random.choice(['Main St', 'Oak Ave', 'Pine Rd', 'Elm St'])} {random.choice(['Anytown', 'Springfield', 'Riverside', 'Oakville'])} {random.choice(['CA', 'NY', 'TX', 'FL'])} {random.randint(10000, 99999)}"
-        )
-        charter =Charter.objects.create(
-            entity_info=entity_info
-        )
-        charters.append(charter)
-    return charters
\ No newline at end of file
+            phone=f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            address=f"{rng.randint(100, 9999)} {rng.choice(['Main St', 'Oak Ave', 'Pine Rd', 'Elm St'])} {rng.choice(['Anytown', 'Springfield', 'Riverside', 'Oakville'])} {rng.choice(['CA', 'NY', 'TX', 'FL'])} {rng.randint(10000, 99999)}"
+        ))
+    with transaction.atomic():
+        EntityInfo.objects.bulk_create(entities)
+        charters = Charter.objects.bulk_create([Charter(entity_info=entity_info) for entity_info in entities])
+        index_entities(entities)
+    bump_version(Charter, EntityInfo)
+    return charters
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_charter_stats(apps, schema_editor):
+    Charter = apps.get_model('records', 'Charter')
+    CharterStats = apps.get_model('records', 'CharterStats')
+    statuses = {
+        'intake_status': {'R': 'rescue', 'T': 'training', 'H': 'hotel'},
+        'health_status': {'H': 'healthy', 'S': 'sick', 'P': 'passed_away', 'U': 'unspecified_health'},
+        'vaccination_status': {'C': 'complete_vaccination', 'I': 'incomplete_vaccination', 'N': 'not_vaccinated', 'U': 'unspecified_vaccination'},
+    }
+    annotations = {
+        'dog_count': Count('housed_dogs'),
+        'owned_count': Count('housed_dogs', filter=Q(housed_dogs__owner__isnull=False)),
+        'unowned_count': Count('housed_dogs', filter=Q(housed_dogs__owner__isnull=True)),
+    }
+    for field, names in statuses.items():
+        for value, name in names.items():
+            annotations[f'{name}_count'] = Count('housed_dogs', filter=Q(**{f'housed_dogs__{field}': value}))
+    CharterStats.objects.bulk_create([
+        CharterStats(charter_id=row.pop('pk'), **row)
+        for row in Charter.objects.annotate(**annotations).values('pk', *annotations)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CharterStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dog_count', models.IntegerField(default=0)),
+                ('owned_count', models.IntegerField(default=0)),
+                ('unowned_count', models.IntegerField(default=0)),
+                ('rescue_count', models.IntegerField(default=0)),
+                ('training_count', models.IntegerField(default=0)),
+                ('hotel_count', models.IntegerField(default=0)),
+                ('healthy_count', models.IntegerField(default=0)),
+                ('sick_count', models.IntegerField(default=0)),
+                ('passed_away_count', models.IntegerField(default=0)),
+                ('unspecified_health_count', models.IntegerField(default=0)),
+                ('complete_vaccination_count', models.IntegerField(default=0)),
+                ('incomplete_vaccination_count', models.IntegerField(default=0)),
+                ('not_vaccinated_count', models.IntegerField(default=0)),
+                ('unspecified_vaccination_count', models.IntegerField(default=0)),
+                ('charter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='records.charter')),
+            ],
+            options={
+                'verbose_name_plural': 'charter stats',
+            },
+        ),
+        migrations.RunPython(populate_charter_stats, migrations.RunPython.noop),
+    ]
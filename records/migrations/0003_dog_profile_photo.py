@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:56
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_profile_photos(apps, schema_editor):
+    Dog = apps.get_model('records', 'Dog')
+    DogPhotoRecord = apps.get_model('records', 'DogPhotoRecord')
+    photos = DogPhotoRecord.objects.filter(
+        dog=OuterRef('pk')
+    ).exclude(photo__isnull=True).exclude(photo='').order_by('-is_profile_photo', 'uploaded')
+    Dog.objects.update(profile_photo=Subquery(photos.values('photo')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0002_charterstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dog',
+            name='profile_photo',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='photos/'),
+        ),
+        migrations.RunPython(populate_profile_photos, migrations.RunPython.noop),
+    ]
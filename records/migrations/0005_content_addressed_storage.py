@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:59
+
+import records.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0004_photojob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dog',
+            name='default_photo',
+            field=models.ImageField(blank=True, help_text='Default photo for this dog', null=True, storage=records.storage.ContentAddressedStorage(), upload_to='photos/'),
+        ),
+        migrations.AlterField(
+            model_name='dog',
+            name='profile_photo',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=records.storage.ContentAddressedStorage(), upload_to='photos/'),
+        ),
+        migrations.AlterField(
+            model_name='dogdocumentrecord',
+            name='document',
+            field=models.FileField(storage=records.storage.ContentAddressedStorage(), upload_to='documents/'),
+        ),
+        migrations.AlterField(
+            model_name='dogphotorecord',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=records.storage.ContentAddressedStorage(), upload_to='photos/'),
+        ),
+    ]
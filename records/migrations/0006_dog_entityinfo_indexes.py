@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0005_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['charter', 'health_status'], name='dog_charter_health_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['charter', 'intake_status'], name='dog_charter_intake_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['charter', 'vaccination_status'], name='dog_charter_vaccination_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['charter', 'created', 'id'], name='dog_charter_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['created', 'id'], name='dog_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(condition=models.Q(('microchip_id__isnull', False)), fields=['microchip_id'], name='dog_microchip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(condition=models.Q(('owner__isnull', True)), fields=['charter'], name='dog_unowned_charter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityinfo',
+            index=models.Index(fields=['name'], name='entityinfo_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityinfo',
+            index=models.Index(fields=['email'], name='entityinfo_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityinfo',
+            index=models.Index(fields=['phone'], name='entityinfo_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityinfo',
+            index=models.Index(fields=['created', 'id'], name='entityinfo_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from records.search import DOG_INDEX, ENTITY_INDEX, create_search_tables, drop_search_tables, write_index
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    create_search_tables(connection)
+    write_index(DOG_INDEX, apps.get_model('records', 'Dog').objects.all(), connection.alias)
+    write_index(ENTITY_INDEX, apps.get_model('records', 'EntityInfo').objects.all(), connection.alias)
+
+
+def drop_search_index(apps, schema_editor):
+    drop_search_tables(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0006_dog_entityinfo_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='entityinfo',
+            name='entityinfo_email_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='entityinfo',
+            name='entityinfo_phone_idx',
+        ),
+        migrations.AddIndex(
+            model_name='entityinfo',
+            index=models.Index(condition=models.Q(('email__isnull', False)), fields=['email'], name='entityinfo_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityinfo',
+            index=models.Index(condition=models.Q(('phone__isnull', False)), fields=['phone'], name='entityinfo_phone_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0008_entityinfo_partial_contact_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dogweightrecord',
+            index=models.Index(fields=['dog', 'record_date'], name='weight_dog_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dogweightrecord',
+            index=models.Index(fields=['record_date'], name='weight_date_idx'),
+        ),
+    ]
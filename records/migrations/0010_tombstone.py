@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0009_dogweightrecord_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deleted', models.DateTimeField(default=django.utils.timezone.now)),
+                ('resource', models.CharField(help_text="API resource of the row, e.g. 'dogs'", max_length=32)),
+                ('object_id', models.IntegerField()),
+                ('charter_id', models.IntegerField(blank=True, help_text='Charter a dog was in', null=True)),
+                ('moved', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['charter', 'modified', 'id'], name='dog_charter_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dog',
+            index=models.Index(fields=['modified', 'id'], name='dog_modified_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entityinfo',
+            index=models.Index(fields=['modified', 'id'], name='entityinfo_modified_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['resource', 'deleted', 'id'], name='tombstone_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['resource', 'charter_id', 'deleted', 'id'], name='tombstone_charter_deleted_idx'),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.core.checks import Info
 from django.utils import timezone
 from django.db import models
+from django.db.models import OuterRef, Q, Subquery
+from records.storage import content_addressed_storage
+from records.thumbnails import existing_thumbnail_url
+from records.validation import DOG_UNIQUE_FIELDS, ENTITY_UNIQUE_FIELDS, validate_unique_fields
 from django.core.exceptions import ValidationError
 # Create your models here.
 
@@ -67,6 +71,19 @@ class EntityInfo(models.Model):
     phone = models.CharField(max_length=100, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # Duplicate lookups in records.validation; not unique because existing records may repeat.
+        # Only entities with an email or phone are looked up by it.
+        indexes = [
+            models.Index(fields=['name'], name='entityinfo_name_idx'),
+            models.Index(fields=['email'], name='entityinfo_email_idx', condition=Q(email__isnull=False)),
+            models.Index(fields=['phone'], name='entityinfo_phone_idx', condition=Q(phone__isnull=False)),
+            # Contact list ordering
+            models.Index(fields=['created', 'id'], name='entityinfo_created_id_idx'),
+            # Charter and contact changes feeds (records.sync)
+            models.Index(fields=['modified', 'id'], name='entityinfo_modified_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.id:
             self.name = self.name.title()
@@ -75,14 +92,14 @@ class EntityInfo(models.Model):
         super().save(*args, **kwargs)
     
     def clean(self):
+        self.clean_rules()
+        validate_unique_fields(self, ENTITY_UNIQUE_FIELDS)
+
+    def clean_rules(self):
+        """Checks between the entity's own fields; runs no queries."""
         if not self.email and not self.phone:
             raise ValidationError('Email or phone is required')
-        if EntityInfo.objects.filter(name=self.name).exists():
-            raise ValidationError(f'Name {self.name} already exists')
-        if self.email and EntityInfo.objects.filter(email=self.email).exists():
-            raise ValidationError(f'Email {self.email} already exists')
-        if self.phone and EntityInfo.objects.filter(phone=self.phone).exists():
-            raise ValidationError(f'Phone {self.phone} already exists')
+
     def __str__(self):
         return self.name
 
@@ -91,6 +108,35 @@ class Charter(models.Model):
     entity_info = models.OneToOneField(EntityInfo, on_delete=models.PROTECT)
 
 
+class CharterStats(models.Model):
+    """Precomputed dog counters for a charter, maintained incrementally by records.signals"""
+    charter = models.OneToOneField(Charter, on_delete=models.CASCADE, related_name='stats')
+
+    dog_count = models.IntegerField(default=0)
+    owned_count = models.IntegerField(default=0)
+    unowned_count = models.IntegerField(default=0)
+
+    rescue_count = models.IntegerField(default=0)
+    training_count = models.IntegerField(default=0)
+    hotel_count = models.IntegerField(default=0)
+
+    healthy_count = models.IntegerField(default=0)
+    sick_count = models.IntegerField(default=0)
+    passed_away_count = models.IntegerField(default=0)
+    unspecified_health_count = models.IntegerField(default=0)
+
+    complete_vaccination_count = models.IntegerField(default=0)
+    incomplete_vaccination_count = models.IntegerField(default=0)
+    not_vaccinated_count = models.IntegerField(default=0)
+    unspecified_vaccination_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'charter stats'
+
+    def __str__(self):
+        return f"{self.charter.entity_info.name} - {self.dog_count} dogs"
+
+
 
 class Contact(models.Model):
     entity_info = models.OneToOneField(EntityInfo, on_delete=models.PROTECT)
@@ -101,6 +147,41 @@ class Contact(models.Model):
 
 
 
+def profile_photo_subquery():
+    """Photo a dog is displayed with: its profile photo record, otherwise its first photo record."""
+    photos = DogPhotoRecord.objects.filter(
+        dog=OuterRef('pk')
+    ).exclude(
+        photo__isnull=True
+    ).exclude(
+        photo=''
+    ).order_by('-is_profile_photo', 'uploaded')
+    return Subquery(photos.values('photo')[:1])
+
+
+def latest_weight_subquery():
+    """Weight of a dog's most recent weigh-in."""
+    records = DogWeightRecord.objects.filter(dog=OuterRef('pk')).order_by('-record_date', '-id')
+    return Subquery(records.values('weight_kg')[:1])
+
+
+class DogQuerySet(models.QuerySet):
+    def refresh_profile_photos(self):
+        """Recomputes the denormalized Dog.profile_photo column with a single UPDATE."""
+        return self.update(profile_photo=profile_photo_subquery())
+
+    def refresh_current_weights(self):
+        """Sets current_weight_kg to the latest weigh-in (by record date) with a single UPDATE."""
+        return self.update(current_weight_kg=latest_weight_subquery(), modified=timezone.now())
+
+
+# Dog fields that feed the CharterStats rollup
+DOG_STATS_FIELDS = ('charter_id', 'owner_id', 'intake_status', 'health_status', 'vaccination_status')
+# Dog columns kept up to date with UPDATEs by records.signals. Saving a Dog loaded before
+# one of those UPDATEs would write the old value back, so saves of existing dogs leave them
+# out: an existing dog's weight changes by recording a weigh-in.
+DOG_MAINTAINED_FIELDS = ('profile_photo', 'current_weight_kg')
+
 class Dog(models.Model):
     created = models.DateTimeField(editable=False)
     modified = models.DateTimeField()
@@ -131,7 +212,9 @@ class Dog(models.Model):
     detailed_description = models.TextField(blank=True)
     
     # Default photo for the dog
-    default_photo = models.ImageField(upload_to=PHOTOS, blank=True, null=True, help_text="Default photo for this dog")
+    default_photo = models.ImageField(upload_to=PHOTOS, storage=content_addressed_storage, blank=True, null=True, help_text="Default photo for this dog")
+    # Cached copy of the photo chosen from DogPhotoRecord, maintained by records.signals
+    profile_photo = models.ImageField(upload_to=PHOTOS, storage=content_addressed_storage, blank=True, null=True, editable=False)
 
     # Health Info
     health_status = models.CharField(choices=DogHealthStatus.choices, max_length=32, default=DogHealthStatus.UNSPECIFIED)
@@ -147,28 +230,76 @@ class Dog(models.Model):
     behavioral_notes = models.TextField(blank=True)
     other_notes = models.TextField(blank=True)
 
+    objects = DogQuerySet.as_manager()
+
+    # Values of DOG_STATS_FIELDS as last loaded from or written to the database
+    _stats_state = None
+
+    class Meta:
+        indexes = [
+            # Per-charter status breakdowns and stats rebuilds
+            models.Index(fields=['charter', 'health_status'], name='dog_charter_health_idx'),
+            models.Index(fields=['charter', 'intake_status'], name='dog_charter_intake_idx'),
+            models.Index(fields=['charter', 'vaccination_status'], name='dog_charter_vaccination_idx'),
+            # Dog lists, newest first, with and without a charter filter (including cursor pages)
+            models.Index(fields=['charter', 'created', 'id'], name='dog_charter_created_idx'),
+            models.Index(fields=['created', 'id'], name='dog_created_id_idx'),
+            # Dog changes feed (records.sync), with and without a charter
+            models.Index(fields=['charter', 'modified', 'id'], name='dog_charter_modified_idx'),
+            models.Index(fields=['modified', 'id'], name='dog_modified_id_idx'),
+            # Only chipped dogs are looked up by microchip, and unowned dogs by charter
+            models.Index(fields=['microchip_id'], name='dog_microchip_idx', condition=Q(microchip_id__isnull=False)),
+            models.Index(fields=['charter'], name='dog_unowned_charter_idx', condition=Q(owner__isnull=True)),
+        ]
+
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(field in field_names for field in DOG_STATS_FIELDS):
+            instance._stats_state = {field: getattr(instance, field) for field in DOG_STATS_FIELDS}
+        return instance
     
     @property
     def display_photo(self):
         """
-        Returns the best available photo for this dog.
-        Priority: profile photo from DogPhotoRecord -> first photo -> default photo
+        Returns the best available photo for this dog without querying photo records.
+        Priority: profile photo from DogPhotoRecord -> first photo -> default photo,
+        the first two being cached in profile_photo.
         """
-            
-        profile_photo = self.photos.filter(is_profile_photo=True).first()
-        if profile_photo and profile_photo.photo:
-            return profile_photo.photo
-        
-        first_photo = self.photos.filter(photo__isnull=False).first()
-        if first_photo and first_photo.photo:
-            return first_photo.photo
+        if self.profile_photo:
+            return self.profile_photo
 
         if self.default_photo:
             return self.default_photo
         
         return '/static/images/default-dog.png'
+
+    def display_photo_url(self, rendition):
+        """
+        URL of the display photo resized for a rendition in records.thumbnails.RENDITIONS.
+        Until the worker has produced the rendition the original is served. Rendering runs no
+        queries (pages may read from the replica): photos are queued by the upload signal and
+        by process_photo_jobs --backfill.
+        """
+        photo = self.display_photo
+        if not hasattr(photo, 'url'):
+            return photo
+        return existing_thumbnail_url(photo, rendition) or photo.url
+
+    @property
+    def card_photo_url(self):
+        return self.display_photo_url('card')
+
+    @property
+    def admin_photo_url(self):
+        return self.display_photo_url('admin')
+
+    @property
+    def header_photo_url(self):
+        return self.display_photo_url('header')
     
     def save(self, *args, **kwargs):
         is_new = not self.id
@@ -176,6 +307,11 @@ class Dog(models.Model):
             self.name = self.name.title()
             self.created = timezone.now()
         self.modified = timezone.now()
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in DOG_MAINTAINED_FIELDS
+            ]
 
         super().save(*args, **kwargs)
         
@@ -183,14 +319,25 @@ class Dog(models.Model):
             self.weight_history.create(weight_kg=self.current_weight_kg)
 
     def clean(self):
+        self.clean_rules()
+        validate_unique_fields(self, DOG_UNIQUE_FIELDS)
+        
+        """
+        # Check for duplicate dog names within the same charter.
+        # Only allow duplicate names if the other dog with the same name has passed away.
+        matching_dogs = self.charter.dogs.filter(name=self.name)
+        for match in matching_dogs:
+            if match.id != self.id and match.health_status != DogHealthStatus.PASSED_AWAY:
+                raise ValidationError('Dog with this name already exists')
+        """
+
+    def clean_rules(self):
+        """Checks between the dog's own fields. Runs no queries, so imports apply it row by row."""
         if self.microchip_status == TripleChoice.YES and not self.microchip_id:
             raise ValidationError('Microchip ID is required when microchip state is Yes')
-        if Dog.objects.filter(microchip_id=self.microchip_id).exists():
-            raise ValidationError('Microchip ID already exists')
-        if self.intake_status == DogIntakeStatus.TRAINING or self.intake_status == DogIntakeStatus.HOTEL and not self.owner:
+        if self.intake_status in (DogIntakeStatus.TRAINING, DogIntakeStatus.HOTEL) and not self.owner_id:
             raise ValidationError('Owner is required if the dog is being trained')
 
-
         if self.health_status == DogHealthStatus.PASSED_AWAY:
             if not self.passing_date:
                 raise ValidationError('Passing date is required if the dog is passed away')
@@ -198,32 +345,27 @@ class Dog(models.Model):
                 raise ValidationError('Passing reason is required if the dog is passed away')
             if not self.burial_place:
                 raise ValidationError('Burial place is required if the dog is passed away')
-        
-        """
-        # Check for duplicate dog names within the same charter.
-        # Only allow duplicate names if the other dog with the same name has passed away.
-        matching_dogs = self.charter.dogs.filter(name=self.name)
-        for match in matching_dogs:
-            if match.id != self.id and match.health_status != DogHealthStatus.PASSED_AWAY:
-                raise ValidationError('Dog with this name already exists')
-        """
+
         
 class DogWeightRecord(models.Model):
+    """A weigh-in. Dog.current_weight_kg is kept equal to the latest one by records.signals"""
     record_date = models.DateTimeField(default=timezone.now)
     weight_kg = models.FloatField()
     dog = models.ForeignKey(Dog, on_delete=models.CASCADE, related_name='weight_history')
     
     class Meta:
         ordering = ['-record_date']
+        indexes = [
+            # A dog's history in date order and its latest weigh-in (records.weights)
+            models.Index(fields=['dog', 'record_date'], name='weight_dog_date_idx'),
+            # Charter trends over a date range
+            models.Index(fields=['record_date'], name='weight_date_idx'),
+        ]
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.dog:
-            self.dog.current_weight_kg = self.weight_kg
-            self.dog.save(update_fields=['current_weight_kg'])
     def clean(self):
-        if self.weight_kg <= 0:
+        if self.weight_kg is not None and self.weight_kg <= 0:
             raise ValidationError('Weight must be greater than 0')
+
     def __str__(self):
         return f"{self.dog.name} - {self.weight_kg} kg - {self.record_date:%d-%m-%Y}"
 
@@ -233,7 +375,7 @@ class DogPhotoRecord(models.Model):
 
     name = models.CharField(max_length=64)
     dog = models.ForeignKey(Dog, on_delete=models.CASCADE, related_name='photos')
-    photo = models.ImageField(upload_to=PHOTOS, blank=True, null=True)
+    photo = models.ImageField(upload_to=PHOTOS, storage=content_addressed_storage, blank=True, null=True)
     is_profile_photo = models.BooleanField(default=False)
 
     def __str__(self):
@@ -246,7 +388,7 @@ class DogDocumentRecord(models.Model):
     uploaded = models.DateTimeField(auto_now_add=True)
     
     dog = models.ForeignKey(Dog, on_delete=models.CASCADE, related_name='documents')
-    document = models.FileField(upload_to=DOCUMENTS)
+    document = models.FileField(upload_to=DOCUMENTS, storage=content_addressed_storage)
     
     title = models.CharField(max_length=200)
     document_type = models.CharField(max_length=100, blank=True)
@@ -257,4 +399,67 @@ class DogDocumentRecord(models.Model):
         ordering = ['-uploaded']
     
     def __str__(self):
-        return f"{self.dog.name} - {self.title}"
\ No newline at end of file
+        return f"{self.dog.name} - {self.title}"
+
+
+class PhotoJobStatus(models.TextChoices):
+    PENDING = 'P', 'Pending'
+    RUNNING = 'R', 'Running'
+    DONE = 'D', 'Done'
+    FAILED = 'F', 'Failed'
+
+
+class PhotoJobQuerySet(models.QuerySet):
+    def enqueue(self, name):
+        """Queues a stored photo for the worker unless it is already queued or has failed."""
+        if not name or self.filter(photo=name).exclude(status=PhotoJobStatus.DONE).exists():
+            return None
+        return self.create(photo=name)
+
+
+class PhotoJob(models.Model):
+    """Image processing for an uploaded photo, picked up by the process_photo_jobs command"""
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    photo = models.CharField(max_length=255, help_text="Storage name of the uploaded image")
+    status = models.CharField(choices=PhotoJobStatus.choices, max_length=32, default=PhotoJobStatus.PENDING)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    objects = PhotoJobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['status', 'created'], name='photojob_status_created_idx'),
+            models.Index(fields=['photo'], name='photojob_photo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.photo} - {self.get_status_display()}"
+
+
+class Tombstone(models.Model):
+    """
+    A dog, charter or contact that was deleted - or a dog that moved to another charter - kept
+    so that offline clients syncing through the changes feed (records.sync) remove it too
+    """
+    deleted = models.DateTimeField(default=timezone.now)
+    resource = models.CharField(max_length=32, help_text="API resource of the row, e.g. 'dogs'")
+    object_id = models.IntegerField()
+    # Plain column: the charter may be deleted after its dogs
+    charter_id = models.IntegerField(blank=True, null=True, help_text="Charter a dog was in")
+    # Moved rows still exist, so only feeds of the charter they left report them
+    moved = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Changes feed pages, with and without a charter
+            models.Index(fields=['resource', 'deleted', 'id'], name='tombstone_deleted_idx'),
+            models.Index(fields=['resource', 'charter_id', 'deleted', 'id'], name='tombstone_charter_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} {self.object_id} - {self.deleted:%Y-%m-%d %H:%M}"
@@ -0,0 +1,98 @@
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Read-only views (those with read_from_replica = True) read the records models from the
+# RECORDS_REPLICA_DATABASE connection; everything else - writes, the views that write,
+# sessions, auth - uses the primary. A request that may have written (any unsafe method)
+# sets a short-lived cookie, and while it is present the user's requests all read from the
+# primary, so they see their own changes even when the replica lags behind.
+
+REPLICA_COOKIE = 'records_primary'
+# Seconds a user keeps reading from the primary after a write
+REPLICA_STICKY_SECONDS = 10
+
+reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+
+def replica_database():
+    return getattr(settings, 'RECORDS_REPLICA_DATABASE', None)
+
+
+class ReplicaRouter:
+    """Routes reads of records models to the replica while a replica view is being served."""
+    route_app_labels = {'records'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.route_app_labels:
+            return None
+        # The primary otherwise, even for relations of instances read from the replica
+        return replica_database() if reading_from_replica.get() else 'default'
+
+    def db_for_write(self, model, **hints):
+        # Also for instances that were read from the replica
+        if model._meta.app_label in self.route_app_labels:
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        databases = {'default', replica_database()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_database():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """Marks a view as read-only: ReplicaMiddleware serves it, templates included, from the replica."""
+    read_from_replica = True
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = reading_from_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            reading_from_replica.reset(token)
+        return self.stick_to_primary(request, response)
+
+    async def __acall__(self, request):
+        token = reading_from_replica.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reading_from_replica.reset(token)
+        return self.stick_to_primary(request, response)
+
+    def stick_to_primary(self, request, response):
+        if replica_database() and request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(
+                REPLICA_COOKIE, '1', max_age=REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Under ASGI this runs in a thread, which hands its context changes back to the request
+        view_class = getattr(view_func, 'view_class', None)
+        if (
+            replica_database()
+            and getattr(view_class, 'read_from_replica', False)
+            and REPLICA_COOKIE not in request.COOKIES
+        ):
+            reading_from_replica.set(True)
@@ -0,0 +1,250 @@
+import re
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from records.models import Dog, EntityInfo
+
+# Full-text search over dogs and entity infos (the name and contact details shared by
+# charters and contacts). Each has its own index table, kept in sync by records.signals
+# and rebuilt by the rebuild_search_index command after bulk writes. SQLite uses an FTS5
+# virtual table, PostgreSQL a tsvector column with a GIN index; any other database falls
+# back to icontains lookups.
+
+WORD_RE = re.compile(r'\w+')
+NON_DIGIT_RE = re.compile(r'\D')
+# Queries with at least this many digits are also matched against the digits-only copy of
+# chip numbers and phones, so '0555 123 45' finds '0555-123-4567'
+MIN_DIGITS = 3
+
+
+class SearchIndex:
+    """One indexed model: its index table, the text fields and the field indexed as digits."""
+
+    def __init__(self, table, fields, digits_field):
+        self.table = table
+        self.fields = fields
+        self.digits_field = digits_field
+
+    def rows(self, queryset):
+        """(pk, field values..., digits) for every object in queryset"""
+        for row in queryset.values_list('pk', *self.fields).iterator(chunk_size=2000):
+            values = dict(zip(self.fields, row[1:]))
+            digits = NON_DIGIT_RE.sub('', values[self.digits_field] or '')
+            yield (row[0], *[values[field] or '' for field in self.fields], digits)
+
+
+DOG_INDEX = SearchIndex(
+    'records_dog_search',
+    ('name', 'microchip_id', 'detailed_description', 'behavioral_notes', 'health_record'),
+    'microchip_id',
+)
+ENTITY_INDEX = SearchIndex(
+    'records_entityinfo_search',
+    ('name', 'email', 'phone', 'address'),
+    'phone',
+)
+INDEXES = (DOG_INDEX, ENTITY_INDEX)
+
+
+def query_terms(query):
+    """'Max 0555-123' -> (['max', '0555', '123'], '0555123')"""
+    terms = [term.lower() for term in WORD_RE.findall(query or '')]
+    digits = NON_DIGIT_RE.sub('', query or '')
+    return terms, digits if len(digits) >= MIN_DIGITS else ''
+
+
+class SQLiteBackend:
+    def create(self, cursor, index):
+        columns = ', '.join(index.fields + ('digits',))
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {index.table} USING fts5("
+            f"{columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def drop(self, cursor, index):
+        cursor.execute(f'DROP TABLE IF EXISTS {index.table}')
+
+    def delete(self, cursor, index, pks):
+        cursor.executemany(f'DELETE FROM {index.table} WHERE rowid = %s', [(pk,) for pk in pks])
+
+    def insert(self, cursor, index, rows):
+        columns = ', '.join(('rowid',) + index.fields + ('digits',))
+        placeholders = ', '.join(['%s'] * (len(index.fields) + 2))
+        cursor.executemany(f'INSERT INTO {index.table} ({columns}) VALUES ({placeholders})', rows)
+
+    def clear(self, cursor, index):
+        cursor.execute(f'DELETE FROM {index.table}')
+
+    def match(self, index, terms, digits):
+        # Every word as a prefix, quoted so FTS5 query syntax in user input is inert
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        if digits:
+            expression = f'({expression}) OR digits : "{digits}"*' if expression else f'digits : "{digits}"*'
+        return RawSQL(f'SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s', [expression])
+
+
+class PostgreSQLBackend:
+    def create(self, cursor, index):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {index.table} '
+            f'(object_id bigint PRIMARY KEY, document tsvector NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {index.table}_document_idx ON {index.table} USING GIN (document)')
+
+    def drop(self, cursor, index):
+        cursor.execute(f'DROP TABLE IF EXISTS {index.table}')
+
+    def delete(self, cursor, index, pks):
+        cursor.execute(f'DELETE FROM {index.table} WHERE object_id = ANY(%s)', [list(pks)])
+
+    def insert(self, cursor, index, rows):
+        # The 'simple' configuration does not stem: names, chip numbers and phones stay as typed
+        cursor.executemany(
+            f"INSERT INTO {index.table} (object_id, document) VALUES (%s, to_tsvector('simple', %s)) "
+            f"ON CONFLICT (object_id) DO UPDATE SET document = EXCLUDED.document",
+            [(row[0], ' '.join(row[1:])) for row in rows]
+        )
+
+    def clear(self, cursor, index):
+        cursor.execute(f'TRUNCATE {index.table}')
+
+    def match(self, index, terms, digits):
+        expression = ' & '.join(f'{term}:*' for term in terms)
+        if digits:
+            expression = f'({expression}) | {digits}:*' if expression else f'{digits}:*'
+        return RawSQL(
+            f"SELECT object_id FROM {index.table} WHERE document @@ to_tsquery('simple', %s)",
+            [expression]
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend(),
+    'postgresql': PostgreSQLBackend(),
+}
+
+
+def get_backend(using):
+    """The full-text backend for a database alias, or None to fall back to icontains."""
+    return BACKENDS.get(connections[using].vendor)
+
+
+# =============================================================================
+# INDEX MAINTENANCE
+# =============================================================================
+
+def create_search_tables(connection):
+    backend = BACKENDS.get(connection.vendor)
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for index in INDEXES:
+            backend.create(cursor, index)
+
+
+def drop_search_tables(connection):
+    backend = BACKENDS.get(connection.vendor)
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for index in INDEXES:
+            backend.drop(cursor, index)
+
+
+def write_index(index, queryset, using):
+    """(Re)indexes every object in queryset."""
+    backend = get_backend(using)
+    if backend is None:
+        return 0
+    written = 0
+    rows = []
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for row in index.rows(queryset.using(using)):
+            rows.append(row)
+            if len(rows) == 2000:
+                written += flush_rows(backend, cursor, index, rows)
+        written += flush_rows(backend, cursor, index, rows)
+    return written
+
+
+def flush_rows(backend, cursor, index, rows):
+    count = len(rows)
+    if rows:
+        backend.delete(cursor, index, [row[0] for row in rows])
+        backend.insert(cursor, index, rows)
+        rows.clear()
+    return count
+
+
+def remove_from_index(index, pks, using):
+    backend = get_backend(using)
+    if backend is None:
+        return
+    with connections[using].cursor() as cursor:
+        backend.delete(cursor, index, pks)
+
+
+def rebuild_search_index(using='default'):
+    """Empties and refills both indexes; returns (dogs, entities) indexed."""
+    backend = get_backend(using)
+    if backend is None:
+        return 0, 0
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            for index in INDEXES:
+                backend.clear(cursor, index)
+        return (
+            write_index(DOG_INDEX, Dog.objects.all(), using),
+            write_index(ENTITY_INDEX, EntityInfo.objects.all(), using),
+        )
+
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+
+def search_dogs(queryset, query):
+    """
+    Dogs whose own text, chip number, owner or charter matches every word of query
+    (as a prefix). A blank query returns queryset unchanged.
+    """
+    terms, digits = query_terms(query)
+    if not terms:
+        return queryset
+    backend = get_backend(queryset.db)
+    if backend is None:
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(microchip_id__icontains=term) |
+                Q(detailed_description__icontains=term) | Q(behavioral_notes__icontains=term) |
+                Q(health_record__icontains=term) | Q(owner__entity_info__name__icontains=term) |
+                Q(owner__entity_info__phone__icontains=term) | Q(charter__entity_info__name__icontains=term)
+            )
+        return queryset
+    entities = backend.match(ENTITY_INDEX, terms, digits)
+    return queryset.filter(
+        Q(pk__in=backend.match(DOG_INDEX, terms, digits)) |
+        Q(owner__entity_info__in=entities) |
+        Q(charter__entity_info__in=entities)
+    )
+
+
+def search_entities(queryset, query, lookup='entity_info'):
+    """
+    Filters a queryset of EntityInfo (lookup='pk') or of a model pointing to one, such as
+    Contact and Charter, to the rows whose name, email, phone or address match every word
+    of query. A blank query returns queryset unchanged.
+    """
+    terms, digits = query_terms(query)
+    if not terms:
+        return queryset
+    backend = get_backend(queryset.db)
+    if backend is None:
+        prefix = '' if lookup == 'pk' else f'{lookup}__'
+        for term in terms:
+            queryset = queryset.filter(
+                Q(**{f'{prefix}name__icontains': term}) | Q(**{f'{prefix}email__icontains': term}) |
+                Q(**{f'{prefix}phone__icontains': term}) | Q(**{f'{prefix}address__icontains': term})
+            )
+        return queryset
+    return queryset.filter(**{f'{lookup}__in': backend.match(ENTITY_INDEX, terms, digits)})
@@ -0,0 +1,189 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from functools import partial
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from records.models import (
+    Dog, Charter, CharterStats, Contact, EntityInfo, DogPhotoRecord, DogDocumentRecord, DogWeightRecord,
+    PhotoJob, Tombstone, DOG_STATS_FIELDS
+)
+from records.caching import bump_version
+from records.search import DOG_INDEX, ENTITY_INDEX, remove_from_index, write_index
+from records.statistics import apply_dog_state_change
+
+
+def current_stats_state(dog):
+    return {field: getattr(dog, field) for field in DOG_STATS_FIELDS}
+
+
+def touches_stats_fields(update_fields):
+    if update_fields is None:
+        return True
+    tracked = {field.removesuffix('_id') for field in DOG_STATS_FIELDS}
+    return any(field.removesuffix('_id') in tracked for field in update_fields)
+
+
+# =============================================================================
+# CHARTER STATS MAINTENANCE
+# =============================================================================
+
+@receiver(post_save, sender=Charter)
+def create_charter_stats(sender, instance, created, using, **kwargs):
+    """Every charter starts with its rollup row, so dog saves only ever update it."""
+    if created:
+        CharterStats.objects.using(using).create(charter=instance)
+
+
+@receiver(pre_save, sender=Dog)
+def load_previous_stats_state(sender, instance, update_fields=None, **kwargs):
+    """Dogs not loaded through the ORM (e.g. Dog(pk=...)) have no known previous state."""
+    if instance.pk and instance._stats_state is None and touches_stats_fields(update_fields):
+        instance._stats_state = Dog.objects.filter(pk=instance.pk).values(*DOG_STATS_FIELDS).first()
+
+
+@receiver(post_save, sender=Dog)
+def update_charter_stats_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if not touches_stats_fields(update_fields):
+        return
+    previous = None if created else instance._stats_state
+    current = current_stats_state(instance)
+    if previous != current:
+        apply_dog_state_change(previous, current)
+    instance._stats_state = current
+
+
+@receiver(post_delete, sender=Dog)
+def update_charter_stats_on_delete(sender, instance, **kwargs):
+    apply_dog_state_change(instance._stats_state or current_stats_state(instance), None)
+    instance._stats_state = None
+
+
+# =============================================================================
+# PROFILE PHOTO MAINTENANCE
+# =============================================================================
+
+@receiver(post_save, sender=DogPhotoRecord)
+@receiver(post_delete, sender=DogPhotoRecord)
+def refresh_dog_profile_photo(sender, instance, using, **kwargs):
+    Dog.objects.filter(pk=instance.dog_id).refresh_profile_photos()
+    # The UPDATE above sends no signal of its own
+    transaction.on_commit(partial(bump_version, Dog), using=using)
+
+
+# =============================================================================
+# CURRENT WEIGHT MAINTENANCE
+# =============================================================================
+
+@receiver(post_save, sender=DogWeightRecord)
+@receiver(post_delete, sender=DogWeightRecord)
+def refresh_dog_current_weight(sender, instance, using, **kwargs):
+    # Recomputed rather than copied, so backdated and deleted weigh-ins are handled too
+    Dog.objects.filter(pk=instance.dog_id).refresh_current_weights()
+    transaction.on_commit(partial(bump_version, Dog), using=using)
+
+
+# =============================================================================
+# PHOTO PROCESSING QUEUE
+# =============================================================================
+
+PHOTO_FIELDS = {Dog: 'default_photo', DogPhotoRecord: 'photo'}
+
+
+@receiver(pre_save, sender=Dog)
+@receiver(pre_save, sender=DogPhotoRecord)
+def detect_photo_upload(sender, instance, **kwargs):
+    """Files not committed yet are being uploaded by this save."""
+    photo = getattr(instance, PHOTO_FIELDS[sender])
+    instance._photo_uploaded = bool(photo) and not photo._committed
+
+
+@receiver(post_save, sender=Dog)
+@receiver(post_save, sender=DogPhotoRecord)
+def enqueue_uploaded_photo(sender, instance, **kwargs):
+    """Decoding, resizing and EXIF stripping happen in the worker, not in the request."""
+    if getattr(instance, '_photo_uploaded', False):
+        PhotoJob.objects.enqueue(getattr(instance, PHOTO_FIELDS[sender]).name)
+        instance._photo_uploaded = False
+
+
+# =============================================================================
+# SEARCH INDEX MAINTENANCE
+# =============================================================================
+
+SEARCH_INDEXES = {Dog: DOG_INDEX, EntityInfo: ENTITY_INDEX}
+
+
+@receiver(post_save, sender=Dog)
+@receiver(post_save, sender=EntityInfo)
+def update_search_index(sender, instance, using, update_fields=None, **kwargs):
+    index = SEARCH_INDEXES[sender]
+    if update_fields is not None and not set(update_fields) & set(index.fields):
+        return
+    write_index(index, sender.objects.filter(pk=instance.pk), using)
+
+
+@receiver(post_delete, sender=Dog)
+@receiver(post_delete, sender=EntityInfo)
+def remove_from_search_index(sender, instance, using, **kwargs):
+    remove_from_index(SEARCH_INDEXES[sender], [instance.pk], using)
+
+
+# =============================================================================
+# SYNC TOMBSTONES
+# =============================================================================
+
+# API resource (records.api) of each model served by the changes feed
+SYNC_RESOURCES = {Dog: 'dogs', Charter: 'charters', Contact: 'contacts'}
+
+
+@receiver(post_delete, sender=Dog)
+@receiver(post_delete, sender=Charter)
+@receiver(post_delete, sender=Contact)
+def record_tombstone(sender, instance, using, **kwargs):
+    Tombstone.objects.using(using).create(
+        resource=SYNC_RESOURCES[sender],
+        object_id=instance.pk,
+        charter_id=instance.charter_id if sender is Dog else None,
+    )
+
+
+@receiver(pre_save, sender=Dog)
+def load_previous_charter(sender, instance, **kwargs):
+    # _stats_state is still the saved state here (see load_previous_stats_state)
+    previous = instance._stats_state
+    instance._previous_charter_id = previous['charter_id'] if previous else None
+
+
+@receiver(post_save, sender=Dog)
+def record_charter_move(sender, instance, created, using, **kwargs):
+    """A dog leaving a charter is removed from the offline copies of that charter's dogs."""
+    previous = getattr(instance, '_previous_charter_id', None)
+    if not created and previous is not None and previous != instance.charter_id:
+        Tombstone.objects.using(using).create(resource='dogs', object_id=instance.pk, charter_id=previous, moved=True)
+
+
+@receiver(post_save, sender=Contact)
+def stamp_contact_entity(sender, instance, created, using, **kwargs):
+    """
+    Contact rows have no modified column of their own: an edit of one (e.g. its notes) is
+    stamped on its EntityInfo, which the contacts feed reads changes by.
+    """
+    if not created:
+        EntityInfo.objects.using(using).filter(pk=instance.entity_info_id).update(modified=timezone.now())
+        transaction.on_commit(partial(bump_version, EntityInfo), using=using)
+
+
+# =============================================================================
+# CACHE INVALIDATION
+# =============================================================================
+
+# Models whose rows end up in cached context or template fragments (records.caching)
+VERSIONED_MODELS = (Dog, Charter, CharterStats, Contact, EntityInfo, DogPhotoRecord, DogDocumentRecord, DogWeightRecord)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_version(sender, using, **kwargs):
+    """Bumped once the transaction commits, so no request can cache the data being replaced."""
+    if sender in VERSIONED_MODELS:
+        transaction.on_commit(partial(bump_version, sender), using=using)
@@ -0,0 +1,185 @@
+from collections import Counter
+from functools import partial
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q
+from records.caching import bump_version
+from records.models import Dog, Charter, CharterStats, DogIntakeStatus, DogHealthStatus, DogVaccinationStatus
+
+# Counter name for every status value we report, grouped by the Dog field it comes from.
+# Global statistics are exposed as '<name>_dogs', per-charter statistics as '<name>_count'.
+STATUS_COUNTERS = {
+    'intake_status': {
+        DogIntakeStatus.RESCUE: 'rescue',
+        DogIntakeStatus.TRAINING: 'training',
+        DogIntakeStatus.HOTEL: 'hotel',
+    },
+    'health_status': {
+        DogHealthStatus.HEALTHY: 'healthy',
+        DogHealthStatus.SICK: 'sick',
+        DogHealthStatus.PASSED_AWAY: 'passed_away',
+        DogHealthStatus.UNSPECIFIED: 'unspecified_health',
+    },
+    'vaccination_status': {
+        DogVaccinationStatus.COMPLETE: 'complete_vaccination',
+        DogVaccinationStatus.INCOMPLETE: 'incomplete_vaccination',
+        DogVaccinationStatus.NOT_VACCINATED: 'not_vaccinated',
+        DogVaccinationStatus.UNSPECIFIED: 'unspecified_vaccination',
+    },
+}
+
+COUNTER_NAMES = ['total', 'owned', 'unowned'] + [
+    name for counters in STATUS_COUNTERS.values() for name in counters.values()
+]
+
+# CharterStats column holding each counter
+STATS_FIELDS = {name: 'dog_count' if name == 'total' else f'{name}_count' for name in COUNTER_NAMES}
+
+
+def empty_counters():
+    return Counter({name: 0 for name in COUNTER_NAMES})
+
+
+def counters_for_group(row):
+    """Counters contributed by one rollup row (one combination of statuses)."""
+    dogs = row['dogs']
+    counters = Counter({'total': dogs, 'owned' if row['owned'] else 'unowned': dogs})
+    for field, names in STATUS_COUNTERS.items():
+        name = names.get(row[field])
+        if name:
+            counters[name] += dogs
+    return counters
+
+
+def dog_rollup(queryset=None):
+    """
+    One grouped aggregate over dogs: a row per (charter, statuses, owned) combination.
+    The number of rows is bounded by charters x status combinations, not by dogs.
+    """
+    queryset = Dog.objects.all() if queryset is None else queryset
+    return queryset.annotate(
+        owned=ExpressionWrapper(Q(owner__isnull=False), output_field=BooleanField()),
+    ).values(
+        'charter_id', 'owned', *STATUS_COUNTERS.keys()
+    ).annotate(
+        dogs=Count('id'),
+    ).order_by()
+
+
+def compute_dog_statistics(queryset=None):
+    """
+    Returns (global_counters, {charter_id: counters}) computed from a single query.
+    """
+    totals = empty_counters()
+    per_charter = {}
+    for row in dog_rollup(queryset):
+        counters = counters_for_group(row)
+        totals.update(counters)
+        per_charter.setdefault(row['charter_id'], empty_counters()).update(counters)
+    return totals, per_charter
+
+
+def global_context(totals):
+    """Dashboard style keys: total_dogs, rescue_dogs, ..."""
+    return {f'{name}_dogs': totals[name] for name in COUNTER_NAMES}
+
+
+def charter_attributes(counters):
+    """Per-charter keys: dog_count, rescue_count, ..."""
+    counters = counters or empty_counters()
+    attributes = {f'{name}_count': counters[name] for name in COUNTER_NAMES if name != 'total'}
+    attributes['dog_count'] = counters['total']
+    return attributes
+
+
+def annotate_charters(charters, per_charter):
+    """Attach per-charter counters to charter instances, keeping the template interface."""
+    charters = list(charters)
+    for charter in charters:
+        for key, value in charter_attributes(per_charter.get(charter.pk)).items():
+            setattr(charter, key, value)
+    return charters
+
+
+# =============================================================================
+# CHARTER STATS ROLLUP
+# =============================================================================
+
+def counters_from_stats(stats):
+    """Counters stored in a CharterStats row (zeros for a missing row)."""
+    if stats is None:
+        return empty_counters()
+    return Counter({name: getattr(stats, field) for name, field in STATS_FIELDS.items()})
+
+
+def read_charter_statistics(charters):
+    """
+    Returns (global_counters, {charter_id: counters}) from the CharterStats rows of charters
+    fetched with select_related('stats'). Cost is O(charters) regardless of the number of dogs.
+    """
+    totals = empty_counters()
+    per_charter = {}
+    for charter in charters:
+        counters = counters_from_stats(getattr(charter, 'stats', None))
+        totals.update(counters)
+        per_charter[charter.pk] = counters
+    return totals, per_charter
+
+
+def stats_columns(counters):
+    """CharterStats column values of counters (zeros for None)"""
+    counters = counters or empty_counters()
+    return {STATS_FIELDS[name]: counters[name] for name in COUNTER_NAMES}
+
+
+def rebuild_charter_stats(charter_ids=None):
+    """Recompute CharterStats rows from the dogs table, for all charters or the given ones."""
+    charters = Charter.objects.all()
+    dogs = Dog.objects.all()
+    if charter_ids is not None:
+        charters = charters.filter(pk__in=charter_ids)
+        dogs = dogs.filter(charter_id__in=charter_ids)
+    charter_ids = list(charters.values_list('pk', flat=True))
+    _, per_charter = compute_dog_statistics(dogs)
+
+    # Rows already there are overwritten in place
+    CharterStats.objects.bulk_create([
+        CharterStats(charter_id=charter_id, **stats_columns(per_charter.get(charter_id)))
+        for charter_id in charter_ids
+    ], update_conflicts=True, unique_fields=['charter'], update_fields=list(STATS_FIELDS.values()))
+    # bulk_create does not send the signals records.caching relies on
+    transaction.on_commit(partial(bump_version, CharterStats))
+    return len(charter_ids)
+
+
+def dog_stats_counters(state):
+    """Counters contributed by a single dog, given its DOG_STATS_FIELDS values."""
+    return counters_for_group({**state, 'owned': state['owner_id'] is not None, 'dogs': 1})
+
+
+def apply_dog_state_change(previous, current):
+    """
+    Moves one dog in the rollup from its previous state to its current state.
+    Either side may be None (creation / deletion). Updates use F() expressions so
+    concurrent writers do not lose increments.
+    """
+    deltas = {}
+    if previous is not None:
+        deltas.setdefault(previous['charter_id'], Counter()).subtract(dog_stats_counters(previous))
+    if current is not None:
+        deltas.setdefault(current['charter_id'], Counter()).update(dog_stats_counters(current))
+
+    for charter_id, delta in deltas.items():
+        changes = {STATS_FIELDS[name]: F(STATS_FIELDS[name]) + count for name, count in delta.items() if count}
+        if not changes:
+            continue
+        if not CharterStats.objects.filter(charter_id=charter_id).update(**changes):
+            # No rollup row yet (e.g. a bulk created charter): create it from the dogs table,
+            # which already holds this change. If a concurrent writer creates it first,
+            # get_or_create returns that row, which is then updated like any other.
+            _, per_charter = compute_dog_statistics(Dog.objects.filter(charter_id=charter_id))
+            _, created = CharterStats.objects.get_or_create(
+                charter_id=charter_id, defaults=stats_columns(per_charter.get(charter_id)),
+            )
+            if not created:
+                CharterStats.objects.filter(charter_id=charter_id).update(**changes)
+        transaction.on_commit(partial(bump_version, CharterStats))
@@ -0,0 +1,65 @@
+import hashlib
+import posixpath
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """sha256 hex digest of a File, read in chunks so large uploads are not held in memory."""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def sharded_name(directory, digest, extension):
+    """photos/ + 3fa2... + .jpg -> photos/3f/a2/3fa2....jpg"""
+    return posixpath.join(directory, digest[:2], digest[2:4], f'{digest}{extension}')
+
+
+def is_sharded_name(name):
+    """True for names produced by sharded_name (as opposed to files stored before it existed)."""
+    parts = name.split('/')
+    if len(parts) < 4:
+        return False
+    first, second, filename = parts[-3:]
+    digest = posixpath.splitext(filename)[0]
+    return len(digest) == 64 and digest.startswith(first + second)
+
+
+def upload_directory(name):
+    """photos/3f/a2/3fa2....jpg -> photos: the directory a blob was stored under, without its shards"""
+    directory = posixpath.dirname(name)
+    if is_sharded_name(name):
+        directory = posixpath.dirname(posixpath.dirname(directory))
+    return directory
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under its content hash, below the directory given by the field's
+    upload_to. Saving content that is already stored writes nothing and returns the name
+    of the existing copy, so identical uploads across dogs and records share one file.
+    Blobs are only removed by the collect_media_garbage command, never on record deletion.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = posixpath.splitext(filename)[1].lower()
+        name = sharded_name(directory, content_hash(content), extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+content_addressed_storage = ContentAddressedStorage()
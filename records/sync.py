@@ -0,0 +1,108 @@
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from records.api import ApiError, page_size
+from records.models import Tombstone
+from records.pagination import decode_token, encode_token
+
+# Changes feed for offline clients: every row of an API resource created or modified, and
+# every row deleted (a Tombstone), since the client's cursor. Both are read in the order
+# they happened - rows by (modified, id), tombstones by (deleted, id) - and merged, so a
+# page holds the next changes in time and a client applying its deletes before its
+# changes always ends up with the current rows. The cursor holds the position reached in
+# both. A client without a cursor gets every current row, and then only what changes.
+#
+# Changes younger than RECORDS_SYNC_SETTLE_SECONDS are left for the next request: a
+# transaction that stamped its rows a little earlier may still be waiting to commit, and
+# a cursor past its timestamps would skip them.
+
+SYNC_SETTLE_SECONDS = 10
+
+CHANGED = 'changed'
+DELETED = 'deleted'
+
+
+def settle_horizon():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'RECORDS_SYNC_SETTLE_SECONDS', SYNC_SETTLE_SECONDS))
+
+
+def encode_sync_cursor(rows_position, tombstones_position):
+    return encode_token([*(rows_position or (None, None)), *tombstones_position])
+
+
+def decode_sync_cursor(token):
+    """((modified, id) or None, (deleted, id)) from a cursor made by encode_sync_cursor"""
+    try:
+        modified, pk, deleted, tombstone_pk = decode_token(token)
+        rows_position = None if modified is None else (datetime.fromisoformat(modified), int(pk))
+        return rows_position, (datetime.fromisoformat(deleted), int(tombstone_pk))
+    except (TypeError, ValueError):
+        raise ApiError('Invalid cursor')
+
+
+def after(queryset, lookup, position):
+    """Rows past position in (lookup, id) order"""
+    if position is None:
+        return queryset
+    moment, pk = position
+    return queryset.filter(Q(**{f'{lookup}__gt': moment}) | Q(**{lookup: moment, 'id__gt': pk}))
+
+
+def read_changes(resource, queryset, tombstones, names, cursor, size):
+    horizon = settle_horizon()
+    if cursor:
+        rows_position, tombstones_position = decode_sync_cursor(cursor)
+    else:
+        # A client starting from nothing has nothing to delete
+        rows_position, tombstones_position = None, (horizon, 0)
+
+    modified = resource.modified
+    rows = after(queryset.filter(**{f'{modified}__lt': horizon}), modified, rows_position).order_by(modified, 'id')
+    tombstones = after(tombstones.filter(deleted__lt=horizon), 'deleted', tombstones_position).order_by('deleted', 'id')
+
+    # (time, id, kind, row or deleted id), each list in the order the changes happened
+    changed = [
+        (row[modified], row['id'], CHANGED, row)
+        for row in resource.values(rows, names, modified, 'id')[:size + 1]
+    ]
+    deleted = [
+        (moment, pk, DELETED, object_id)
+        for moment, pk, object_id in tombstones.values_list('deleted', 'id', 'object_id')[:size + 1]
+    ]
+
+    # Each list holds size + 1 candidates, so the first size of the two merged are the next
+    # size changes overall
+    page = list(islice(heapq.merge(changed, deleted, key=lambda change: change[0]), size))
+    page_changed = [change for change in page if change[2] == CHANGED]
+    page_deleted = [change for change in page if change[2] == DELETED]
+    if page_changed:
+        rows_position = page_changed[-1][:2]
+    if page_deleted:
+        tombstones_position = page_deleted[-1][:2]
+    return {
+        'changes': resource.output([change[3] for change in page_changed], names),
+        'deleted': [change[3] for change in page_deleted],
+        'next_cursor': encode_sync_cursor(rows_position, tombstones_position),
+        'has_more': len(changed) + len(deleted) > len(page),
+    }
+
+
+def sync_response(request, name, resource):
+    """A page of the changes feed of the resource called name in RESOURCES, as JSON."""
+    tombstones = Tombstone.objects.filter(resource=name)
+    try:
+        size = page_size(request.GET)
+        names = resource.parse_fields(request.GET.get('fields'), resource.sync_fields, resource.sync_fields)
+        queryset = resource.filter(resource.model.objects.all(), request.GET)
+        if request.GET.get('charter') and 'charter' in resource.filters:
+            tombstones = tombstones.filter(charter_id=request.GET['charter'])
+        else:
+            tombstones = tombstones.filter(moved=False)
+        page = read_changes(resource, queryset, tombstones, names, request.GET.get('since'), size)
+    except ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(page)
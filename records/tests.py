@@ -1,3 +1,874 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+from collections import Counter
+from pathlib import Path
+import posixpath
+import subprocess
+import sys
+import tempfile
+import zipfile
+from unittest import mock
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from main.testing import QueryBudgetMixin
+from records.forms import ContactForm, DogForm
+from records.imports import DogImporter
+from records.management.commands.benchmark import Command as BenchmarkCommand, parse_scale, scale_label
+from records.management.commands.benchmark_queries import ACCESS_PATH_INDEXES
+from records.management.commands.process_photo_jobs import repoint_photo
+from records.models import (
+    Charter, CharterStats, Contact, Dog, DogDocumentRecord, DogPhotoRecord, DogWeightRecord, EntityInfo, PhotoJob,
+    PhotoJobStatus, DogBreed, DogColor, DogHealthStatus, DogIntakeStatus, TripleChoice,
+)
+from records.caching import model_versions
+from records.downloads import parse_range
+from records.search import search_dogs, search_entities
+from records.statistics import compute_dog_statistics, counters_from_stats
+from records.replicas import REPLICA_COOKIE, ReplicaMiddleware, ReplicaRouter
+from records.storage import content_hash
+from records.thumbnails import RENDITIONS, process_photo, thumbnail_name
+from records.views import AsyncCharterDetailView, AsyncDogListView, CharterDetailView, DogListView, DogUpdateView
 
 # Create your tests here.
+
+
+def create_charter(name):
+    return Charter.objects.create(entity_info=EntityInfo.objects.create(name=name, email=f'{name.lower()}@example.com'))
+
+
+def create_contact(name, phone):
+    return Contact.objects.create(entity_info=EntityInfo.objects.create(name=name, phone=phone))
+
+
+def create_dogs(charter, count, owner=None):
+    return [
+        Dog.objects.create(
+            name=f'Dog {number}', charter=charter, owner=owner, age_months=12 + number,
+            height_cm=40, color=DogColor.BLACK, current_weight_kg=10 + number,
+        )
+        for number in range(count)
+    ]
+
+
+def jpeg(camera=None):
+    output = io.BytesIO()
+    exif = Image.Exif()
+    if camera:
+        exif[0x0110] = camera
+    Image.new('RGB', (40, 20), 'red').save(output, 'JPEG', exif=exif)
+    return output.getvalue()
+
+
+class MediaTestMixin:
+    """Stores uploads in a temporary MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+
+class RecordsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Page query counts must not grow with the number of dogs, contacts or charters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.charter = create_charter('Budget Charter')
+        other = create_charter('Other Charter')
+        owner = create_contact('Budget Owner', '555-100-2000')
+        for number in range(25):
+            create_contact(f'Contact {number}', f'555-200-{number:04d}')
+        cls.dogs = create_dogs(cls.charter, 25, owner=owner) + create_dogs(other, 5)
+        for dog in cls.dogs[:5]:
+            DogWeightRecord.objects.create(dog=dog, weight_kg=12)
+
+    def test_dog_list(self):
+        self.assertQueryBudget(5, 'records:dog_list')
+
+    def test_dog_list_filtered(self):
+        self.assertQueryBudget(6, 'records:dog_list', query=f'charter={self.charter.pk}&breed=D&age_min=14&search=dog')
+
+    def test_dog_list_cursor_pages(self):
+        response = self.assertQueryBudget(4, 'records:dog_list', query='paginate=cursor')
+        self.assertQueryBudget(4, 'records:dog_list', query=f'paginate=cursor&cursor={response.context["page_obj"].next_cursor}')
+
+    def test_contact_list(self):
+        self.assertQueryBudget(4, 'records:contact_list')
+
+    def test_charter_detail(self):
+        self.assertQueryBudget(4, 'records:charter_detail', pk=self.charter.pk)
+
+    def test_dog_detail(self):
+        # Session, user, dog, weight history, documents
+        self.assertQueryBudget(5, 'records:dog_detail', pk=self.dogs[0].pk)
+
+    def test_dog_admin_changelist(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertQueryBudget(5, 'admin:records_dog_changelist')
+
+    def test_contact_and_charter_admin_changelists(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertQueryBudget(5, 'admin:records_contact_changelist')
+        self.assertQueryBudget(5, 'admin:records_charter_changelist')
+
+
+class CacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(get_user_model().objects.create_user('cached'))
+        self.dog = create_dogs(create_charter('Cache Charter'), 1)[0]
+
+    @override_settings(RECORDS_CACHE_TIMEOUT=120)
+    def test_pages_show_committed_edits(self):
+        url = reverse('records:dog_detail', args=[self.dog.pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'Dog 0')
+        self.assertEqual(response.context['cache_timeout'], 120)
+        versions = model_versions(Dog)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dog.name = 'Renamed'
+            self.dog.save()
+        self.assertNotEqual(model_versions(Dog), versions)
+        self.assertContains(self.client.get(url), 'Renamed')
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dogs = create_dogs(create_charter('Cursor Charter'), 45)
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('pager'))
+
+    def page(self, cursor=None):
+        query = {'paginate': 'cursor', **({'cursor': cursor} if cursor else {})}
+        return self.client.get(reverse('records:dog_list'), query).context['page_obj']
+
+    def test_pages_cover_every_dog_once_and_lead_back(self):
+        expected = list(Dog.objects.order_by('-created', '-id').values_list('pk', flat=True))
+        pages = [self.page()]
+        while pages[-1].has_next():
+            pages.append(self.page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        self.assertEqual([dog.pk for page in pages for dog in page], expected)
+        self.assertFalse(pages[0].has_previous())
+
+        previous = self.page(pages[-1].previous_cursor)
+        self.assertEqual([dog.pk for dog in previous], [dog.pk for dog in pages[1]])
+        self.assertEqual(self.client.get(reverse('records:dog_list'), {'paginate': 'cursor', 'cursor': 'bogus'}).status_code, 404)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_contact('Martha Quill', '0555-123-4567')
+        cls.charter = create_charter('Harbor Rescue')
+        cls.biscuit, cls.pepper = create_dogs(cls.charter, 2, owner=cls.owner)
+        cls.biscuit.name = 'Biscuit'
+        cls.biscuit.microchip_id = '985112003344'
+        cls.biscuit.save()
+        cls.stray = create_dogs(create_charter('Hill Shelter'), 1)[0]
+
+    def search(self, query):
+        return set(search_dogs(Dog.objects.all(), query).values_list('pk', flat=True))
+
+    def test_dogs_by_name_chip_owner_and_charter(self):
+        self.assertEqual(self.search('bisc'), {self.biscuit.pk})
+        self.assertEqual(self.search('985 112'), {self.biscuit.pk})
+        self.assertEqual(self.search('marth'), {self.biscuit.pk, self.pepper.pk})
+        self.assertEqual(self.search('harbor pepper'), set())
+        self.assertEqual(self.search('hill'), {self.stray.pk})
+        self.assertEqual(self.search(''), set(Dog.objects.values_list('pk', flat=True)))
+
+    def test_index_follows_changes(self):
+        self.biscuit.name = 'Waffle'
+        self.biscuit.save()
+        self.assertEqual(self.search('bisc'), set())
+        self.assertEqual(self.search('waff'), {self.biscuit.pk})
+        contacts = search_entities(Contact.objects.all(), '0555 123 45')
+        self.assertEqual(list(contacts), [self.owner])
+        self.pepper.delete()
+        self.assertEqual(self.search('marth'), {self.biscuit.pk})
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        dogs = create_dogs(create_charter('Facet Charter'), 6)
+        for dog, breed, gender in zip(dogs, ['BEAGLE'] * 3 + ['HUSKY'] * 3, 'MMFMFF'):
+            dog.breed, dog.gender = breed, gender
+            dog.save()
+
+    def setUp(self):
+        # Facet counts are cached on versions that only move when a transaction commits
+        cache.clear()
+        self.client.force_login(get_user_model().objects.create_user('facets'))
+
+    def test_counts_ignore_their_own_selection(self):
+        response = self.client.get(reverse('records:dog_list'), {'breed': 'BEAGLE', 'gender': 'M'})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        facets = {
+            facet['name']: {option['value']: option['count'] for option in facet['options'] if option['count']}
+            for facet in response.context['facets']
+        }
+        # Breeds of the male dogs, and genders of the beagles
+        self.assertEqual(facets['breed'], {'BEAGLE': 2, 'HUSKY': 1})
+        self.assertEqual(facets['gender'], {'M': 2, 'F': 1})
+        self.assertEqual(facets['color'], {DogColor.BLACK: 2})
+
+
+class CharterStatsTests(TestCase):
+    """The incrementally maintained rollup must match the counts computed from the dogs table."""
+
+    def setUp(self):
+        self.charters = [create_charter('First Charter'), create_charter('Second Charter')]
+        self.owner = create_contact('Stats Owner', '555-400-0000')
+
+    def assertStatsMatchDogs(self):
+        _, per_charter = compute_dog_statistics()
+        for charter in Charter.objects.select_related('entity_info', 'stats'):
+            stats = counters_from_stats(getattr(charter, 'stats', None))
+            self.assertEqual(+stats, +per_charter.get(charter.pk, Counter()), charter.entity_info.name)
+
+    def test_counters_follow_dog_changes(self):
+        self.assertEqual(CharterStats.objects.count(), 2)
+        first, second = self.charters
+        dogs = create_dogs(first, 4) + create_dogs(second, 2, owner=self.owner)
+        self.assertStatsMatchDogs()
+
+        moved, sick, adopted, deleted = dogs[:4]
+        moved.charter = second
+        moved.save()
+        sick.health_status = DogHealthStatus.SICK
+        sick.save()
+        adopted.owner = self.owner
+        adopted.intake_status = DogIntakeStatus.TRAINING
+        adopted.save()
+        deleted.delete()
+        # Built without its previous state, which is then read from the database
+        unloaded = Dog(**{field.attname: getattr(dogs[4], field.attname) for field in Dog._meta.concrete_fields})
+        unloaded.health_status = DogHealthStatus.SICK
+        unloaded.save()
+        self.assertStatsMatchDogs()
+
+    def test_missing_row_is_created_from_the_dogs_table(self):
+        dogs = create_dogs(self.charters[0], 3)
+        CharterStats.objects.all().delete()
+        dogs[0].health_status = DogHealthStatus.HEALTHY
+        dogs[0].save()
+        self.assertEqual(CharterStats.objects.get().charter, self.charters[0])
+        self.assertStatsMatchDogs()
+
+
+class PhotoProcessingTests(MediaTestMixin, TestCase):
+    def test_exif_is_stripped_into_a_new_blob(self):
+        original = jpeg(camera='Pocket Camera')
+        dogs = create_dogs(create_charter('Photo Charter'), 2)
+        records = [
+            DogPhotoRecord.objects.create(dog=dog, name='Side', photo=SimpleUploadedFile('side.jpg', original))
+            for dog in dogs
+        ]
+        name = records[0].photo.name
+        self.assertEqual(records[1].photo.name, name)
+
+        photo, written = process_photo(name)
+        self.assertNotEqual(photo, name)
+        self.assertIn(photo, written)
+        # The shared blob is untouched, and the copy is stored under its own hash
+        with default_storage.open(name) as blob:
+            self.assertEqual(blob.read(), original)
+        with default_storage.open(photo) as blob:
+            self.assertEqual(posixpath.splitext(posixpath.basename(photo))[0], content_hash(blob))
+            self.assertFalse(Image.open(blob).getexif())
+        self.assertEqual(process_photo(photo), (photo, []))
+
+        repoint_photo(name, photo)
+        self.assertEqual({record.photo.name for record in DogPhotoRecord.objects.all()}, {photo})
+        self.assertEqual({dog.profile_photo.name for dog in Dog.objects.all()}, {photo})
+        self.assertEqual(list(PhotoJob.objects.values_list('photo', flat=True)), [photo])
+
+    def test_uploads_are_queued_once(self):
+        dog = create_dogs(create_charter('Photo Charter'), 1)[0]
+        record = DogPhotoRecord.objects.create(dog=dog, name='Front', photo=SimpleUploadedFile('front.jpg', jpeg()))
+        job = PhotoJob.objects.get()
+        self.assertEqual((job.photo, job.status), (record.photo.name, PhotoJobStatus.PENDING))
+        self.assertIsNone(PhotoJob.objects.enqueue(record.photo.name))
+        record.name = 'Renamed'
+        record.save()
+        self.assertEqual(PhotoJob.objects.count(), 1)
+        # Processed photos are queued again only when asked to (process_photo_jobs --backfill)
+        PhotoJob.objects.update(status=PhotoJobStatus.DONE)
+        self.assertIsNotNone(PhotoJob.objects.enqueue(record.photo.name))
+
+    def test_original_is_shown_until_the_rendition_exists(self):
+        dog = create_dogs(create_charter('Photo Charter'), 1)[0]
+        DogPhotoRecord.objects.create(dog=dog, name='Front', photo=SimpleUploadedFile('front.jpg', jpeg()))
+        dog.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(dog.card_photo_url, dog.profile_photo.url)
+        process_photo(dog.profile_photo.name)
+        self.assertNotEqual(dog.card_photo_url, dog.profile_photo.url)
+        self.assertTrue(default_storage.exists(dog.card_photo_url.removeprefix(default_storage.base_url)))
+
+    def test_renditions_fill_or_fit_their_box(self):
+        name = default_storage.save('photos/wide.jpg', io.BytesIO(jpeg()))
+        process_photo(name)
+        sizes = {}
+        for rendition in RENDITIONS:
+            with default_storage.open(thumbnail_name(name, rendition)) as thumbnail:
+                sizes[rendition] = Image.open(thumbnail).size
+        # The 40x20 original is cropped to the card and admin boxes, and only fitted in the header
+        self.assertEqual(sizes, {'card': (600, 300), 'admin': (200, 200), 'header': (40, 20)})
+
+
+class ProfilePhotoTests(MediaTestMixin, TestCase):
+    def add_photo(self, dog, name, **kwargs):
+        return DogPhotoRecord.objects.create(
+            dog=dog, name=name, photo=SimpleUploadedFile(f'{name}.jpg', jpeg(camera=name)), **kwargs
+        )
+
+    def profile_photo(self, dog):
+        return Dog.objects.values_list('profile_photo', flat=True).get(pk=dog.pk) or None
+
+    def test_added_deleted_and_reordered_photos(self):
+        dog = create_dogs(create_charter('Photo Charter'), 1)[0]
+        stale = Dog.objects.get(pk=dog.pk)
+        first = self.add_photo(dog, 'first')
+        self.assertEqual(self.profile_photo(dog), first.photo.name)
+        second = self.add_photo(dog, 'second', is_profile_photo=True)
+        self.assertEqual(self.profile_photo(dog), second.photo.name)
+
+        # A dog loaded before the photos were added does not write its old profile photo back
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertEqual(self.profile_photo(dog), second.photo.name)
+        self.assertEqual(Dog.objects.get(pk=dog.pk).name, 'Renamed')
+
+        second.is_profile_photo = False
+        second.save()
+        self.assertEqual(self.profile_photo(dog), first.photo.name)
+        first.delete()
+        self.assertEqual(self.profile_photo(dog), second.photo.name)
+        second.delete()
+        self.assertIsNone(self.profile_photo(dog))
+
+
+class DocumentDownloadTests(MediaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(get_user_model().objects.create_user('reader'))
+        dog = create_dogs(create_charter('Document Charter'), 1)[0]
+        self.document = DogDocumentRecord.objects.create(
+            dog=dog, title='Vet Report', document=SimpleUploadedFile('report.pdf', b'0123456789'),
+        )
+        self.url = reverse('records:document_download', args=[self.document.pk])
+
+    def get(self, query=None, **headers):
+        response = self.client.get(self.url, query, headers=headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_full_and_conditional(self):
+        response, content = self.get()
+        self.assertEqual((response.status_code, content), (200, b'0123456789'))
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="Vet Report.pdf"')
+        etag = response['ETag']
+        self.assertEqual(etag, f'"{content_hash(self.document.document)}"')
+        self.assertEqual(self.get(**{'If-None-Match': etag})[0].status_code, 304)
+        response, _ = self.get({'download': 1})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Vet Report.pdf"')
+
+    def test_ranges(self):
+        response, content = self.get(Range='bytes=2-5')
+        self.assertEqual((response.status_code, content, response['Content-Range']), (206, b'2345', 'bytes 2-5/10'))
+        self.assertEqual(self.get(Range='bytes=-3')[1], b'789')
+        response, _ = self.get(Range='bytes=20-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        # An invalid range is ignored, and so is one for another version of the file
+        self.assertEqual(self.get(Range='bytes=5-2')[0].status_code, 200)
+        response, content = self.get(Range='bytes=2-5', **{'If-Range': '"stale"'})
+        self.assertEqual((response.status_code, content), (200, b'0123456789'))
+        response, content = self.get(Range='bytes=2-5', **{'If-Range': self.get()[0]['ETag']})
+        self.assertEqual((response.status_code, content), (206, b'2345'))
+
+    def test_empty_file_satisfies_no_range(self):
+        for header in ('bytes=0-', 'bytes=-5'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 0)
+        self.assertEqual(parse_range('bytes=3-1', 10), None)
+
+    @override_settings(RECORDS_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_sendfile(self):
+        response, content = self.get({'download': 1})
+        self.assertEqual(content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.document.document.name}')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="Vet Report.pdf"')
+        self.assertIn('ETag', response)
+
+
+class GenerateTestDatabaseTests(TestCase):
+    def generate(self):
+        call_command(
+            'generate_test_database', charters=2, contacts_min=5, contacts_max=5, dogs_min=3, dogs_max=4,
+            seed=7, batch_size=2, stdout=io.StringIO(),
+        )
+        return list(Dog.objects.order_by('charter__entity_info__name', 'name', 'id').values_list(
+            'charter__entity_info__name', 'name', 'breed', 'health_status', 'owner__entity_info__name',
+        ))
+
+    def test_a_seed_generates_the_same_records(self):
+        first = self.generate()
+        self.assertTrue(6 <= len(first) <= 8)
+        self.assertEqual(self.generate(), first)
+        # Bulk created, with the rollup and search index filled in afterwards
+        _, per_charter = compute_dog_statistics()
+        for charter in Charter.objects.select_related('stats'):
+            self.assertEqual(+counters_from_stats(charter.stats), +per_charter[charter.pk])
+        dog = Dog.objects.first()
+        self.assertIn(dog.pk, search_dogs(Dog.objects.all(), dog.name).values_list('pk', flat=True))
+
+
+class IndexUsageTests(TestCase):
+    """The hot lookups must be answered from their indexes, not by scanning a table."""
+
+    def assertUsesIndex(self, queryset, index):
+        self.assertIn(index, queryset.explain())
+
+    def test_plans(self):
+        charter = create_charter('Index Charter')
+        self.assertUsesIndex(Dog.objects.filter(charter=charter).order_by('-created', '-id')[:21], 'dog_charter_created_idx')
+        self.assertUsesIndex(Dog.objects.order_by('-created', '-id')[:21], 'dog_created_id_idx')
+        self.assertUsesIndex(Dog.objects.filter(microchip_id='985112003344'), 'dog_microchip_idx')
+        self.assertUsesIndex(EntityInfo.objects.filter(email='info@example.com'), 'entityinfo_email_idx')
+        self.assertUsesIndex(EntityInfo.objects.filter(phone='555-100-2000'), 'entityinfo_phone_idx')
+
+    def test_benchmark_lists_the_access_path_indexes(self):
+        with connection.cursor() as cursor:
+            indexes = {
+                name for table in ('records_dog', 'records_entityinfo', 'records_dogweightrecord')
+                for name in connection.introspection.get_constraints(cursor, table)
+            }
+        self.assertLessEqual(set(ACCESS_PATH_INDEXES), indexes)
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_scales(self):
+        self.assertEqual([parse_scale(value) for value in ('500', '10k', '1.5K', '1m')], [500, 10_000, 1_500, 1_000_000])
+        self.assertEqual([scale_label(scale) for scale in (500, 10_000, 1_000_000)], ['500', '10k', '1m'])
+        with self.assertRaises(CommandError):
+            parse_scale('lots')
+
+    def test_regressions_against_a_baseline(self):
+        def run(dashboard_ms, list_queries):
+            return {'meta': {'created': 'then'}, 'scales': {'1k': {
+                'dashboard': {'cold_ms': dashboard_ms, 'queries': 3},
+                'dog_list_page_1': {'cold_ms': 10.0, 'queries': list_queries},
+            }}}
+        command = BenchmarkCommand(stdout=io.StringIO())
+        self.assertEqual(command.compare(run(10.0, 5), run(10.5, 5), tolerance=10), 0)
+        # Slower beyond the tolerance, or more queries at any speed
+        self.assertEqual(command.compare(run(10.0, 5), run(12.0, 6), tolerance=10), 2)
+
+    def run_benchmark(self, **environment):
+        """Runs the command in a process of its own, as it replaces the default database."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        environment = {
+            **os.environ,
+            'DOG_RESCUE_DB_PATH': str(self.directory / 'db.sqlite3'),
+            'DOG_RESCUE_CACHE_DIR': str(self.directory / 'cache'),
+            **environment,
+        }
+        completed = subprocess.run(
+            [sys.executable, 'manage.py', 'benchmark', '--scales', '20', '--repeat', '1',
+             '--output', str(self.directory / 'results.json')],
+            cwd=settings.BASE_DIR, env=environment, capture_output=True, text=True,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+
+    def test_runs_on_a_cache_of_its_own(self):
+        self.run_benchmark()
+        cache_directory = self.directory / 'cache'
+        self.assertEqual(list(cache_directory.iterdir()) if cache_directory.exists() else [], [])
+
+    def test_replica_reads_the_benchmark_database(self):
+        self.run_benchmark(DOG_RESCUE_DB_PROFILE='production')
+        # The replica views were served without ever opening the live database
+        self.assertFalse((self.directory / 'db.sqlite3').exists())
+        results = json.loads((self.directory / 'results.json').read_text())
+        self.assertGreater(results['scales']['20']['dog_list_page_1']['queries'], 0)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.charter = create_charter('Export Charter')
+        cls.owner = create_contact('Export Owner', '555-300-4000')
+        cls.dogs = create_dogs(cls.charter, 3, owner=cls.owner)
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('exporter', password='exporter'))
+
+    def test_dog_csv_streams_labels_and_related_names(self):
+        response = self.client.get(reverse('records:dog_export', args=['csv']), {'charter': self.charter.pk})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(len(rows), 4)
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual(row['Charter'], 'Export Charter')
+        self.assertEqual(row['Owner'], 'Export Owner')
+        self.assertEqual(row['Color'], DogColor.BLACK.label)
+
+    def test_contact_xlsx_is_a_workbook(self):
+        response = self.client.get(reverse('records:contact_export', args=['xlsx']))
+        workbook = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(workbook.testzip())
+        self.assertIn(b'Export Owner', workbook.read('xl/worksheets/sheet1.xml'))
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('records:dog_export', args=['pdf'])).status_code, 404)
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.charter = create_charter('Import Charter')
+        cls.owner = create_contact('Import Owner', '555-300-5000')
+        Dog.objects.create(
+            name='Chipped', charter=cls.charter, age_months=12, height_cm=40,
+            color=DogColor.BLACK, microchip_status=TripleChoice.YES, microchip_id='CHIP1',
+        )
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('importer', is_staff=True))
+
+    def post(self, text, **data):
+        upload = io.BytesIO(text.encode())
+        upload.name = 'dogs.csv'
+        return self.client.post(reverse('records:import'), {'records': 'dogs', 'file': upload, **data})
+
+    def test_valid_rows_are_imported_and_the_rest_reported(self):
+        response = self.post(
+            'Name,Age (months),Height (cm),Color,Microchip,Microchip ID,Charter,Owner phone\n'
+            'rex,24,50,Black,Yes,CHIP2,import charter,555-300-5000\n'
+            'fido,24,50,black,yes,CHIP1,Import Charter,\n'
+            'max,24,50,Black,No,,Import Charter,555-000-0000\n'
+            'bo,24,50,Black,No,,No Such Charter,\n'
+        )
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertEqual([line for line, row, messages in response.context['errors']], [3, 4, 5])
+        rex = Dog.objects.get(microchip_id='CHIP2')
+        self.assertEqual((rex.name, rex.owner, rex.charter), ('Rex', self.owner, self.charter))
+        self.assertEqual(rex.weight_history.count(), 0)
+        self.charter.stats.refresh_from_db()
+        self.assertEqual(self.charter.stats.dog_count, 2)
+
+    def test_dry_run_saves_nothing(self):
+        response = self.post('Name,Age (months),Height (cm),Color\nRex,24,50,Black\n', charter=self.charter.pk, dry_run='on')
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertFalse(Dog.objects.filter(name='Rex').exists())
+
+    def test_staff_only(self):
+        self.client.force_login(get_user_model().objects.create_user('volunteer'))
+        self.assertEqual(self.client.get(reverse('records:import')).status_code, 403)
+
+    def test_batches_before_a_failing_one_keep_their_stats(self):
+        cache.clear()
+        versions = model_versions(Dog)
+        importer = DogImporter(charter=self.charter)
+        save = importer.save
+
+        def save_until_bo(dogs):
+            if dogs[0].name == 'Bo':
+                raise RuntimeError('disk full')
+            save(dogs)
+
+        rows = 'Name,Age (months),Height (cm),Color\nRex,24,50,Black\nBo,24,50,Black\n'
+        with mock.patch('records.imports.IMPORT_BATCH_SIZE', 1), mock.patch.object(importer, 'save', save_until_bo):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+                importer.run(io.StringIO(rows))
+        self.charter.stats.refresh_from_db()
+        self.assertEqual(self.charter.stats.dog_count, 2)
+        self.assertNotEqual(model_versions(Dog), versions)
+
+
+class ValidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.contact = create_contact('Taken Name', '555-300-6000')
+        cls.other = Contact.objects.create(entity_info=EntityInfo.objects.create(name='Other', email='other@example.com'))
+
+    def test_all_conflicts_in_one_query(self):
+        entity = EntityInfo(name='Taken Name', email='other@example.com', phone='555-300-6000')
+        with self.assertNumQueries(1), self.assertRaises(ValidationError) as raised:
+            entity.clean()
+        self.assertEqual(sorted(raised.exception.message_dict), ['email', 'name', 'phone'])
+
+    def test_record_does_not_conflict_with_itself(self):
+        self.contact.entity_info.clean()
+        form = ContactForm(instance=self.contact, data={
+            'entity_info': self.contact.entity_info_id, 'name': 'Taken Name', 'phone': '555-300-6000',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_dog_without_microchip_runs_no_query(self):
+        dog = Dog(name='Rex', age_months=12, height_cm=40, color=DogColor.BLACK)
+        with self.assertNumQueries(0):
+            dog.clean()
+
+
+class WeightTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.charter = create_charter('Weight Charter')
+        cls.dogs = create_dogs(cls.charter, 3)
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('weigher'))
+
+    def test_current_weight_follows_latest_weigh_in(self):
+        dog = self.dogs[0]
+        latest = dog.weight_history.get()
+        DogWeightRecord.objects.create(dog=dog, weight_kg=3, record_date=latest.record_date - timedelta(days=30))
+        dog.refresh_from_db()
+        self.assertEqual(dog.current_weight_kg, latest.weight_kg)
+        latest.delete()
+        dog.refresh_from_db()
+        self.assertEqual(dog.current_weight_kg, 3)
+
+    def test_dog_edits_keep_the_latest_weigh_in(self):
+        dog = self.dogs[0]
+        stale = Dog.objects.get(pk=dog.pk)
+        DogWeightRecord.objects.create(dog=dog, weight_kg=30)
+        stale.current_weight_kg = 99
+        stale.save()
+        dog.refresh_from_db()
+        self.assertEqual(dog.current_weight_kg, 30)
+        self.assertTrue(DogForm(instance=dog).fields['current_weight_kg'].disabled)
+        self.assertFalse(DogForm().fields['current_weight_kg'].disabled)
+
+    def test_weigh_in_session(self):
+        data = {f'weight_{dog.pk}': 20 + number for number, dog in enumerate(self.dogs[:2])}
+        with self.assertNumQueries(8):
+            # Session, user, charter, dogs, then the insert and the update in one savepoint
+            response = self.client.post(reverse('records:charter_weigh_in', args=[self.charter.pk]), data)
+        self.assertRedirects(response, reverse('records:charter_detail', args=[self.charter.pk]), fetch_redirect_response=False)
+        weights = dict(Dog.objects.filter(charter=self.charter).values_list('pk', 'current_weight_kg'))
+        self.assertEqual([weights[dog.pk] for dog in self.dogs], [20, 21, self.dogs[2].current_weight_kg])
+
+        trends = self.client.get(reverse('records:charter_weights', args=[self.charter.pk])).json()
+        self.assertEqual((trends['weighed'], trends['gaining'], trends['stable']), (3, 2, 1))
+
+    def test_history_is_downsampled(self):
+        dog = self.dogs[0]
+        start = dog.created - timedelta(days=200)
+        DogWeightRecord.objects.bulk_create([
+            DogWeightRecord(dog=dog, weight_kg=5 + day % 7, record_date=start + timedelta(days=day)) for day in range(200)
+        ])
+        points = self.client.get(reverse('records:dog_weights', args=[dog.pk]), {'points': 20}).json()['points']
+        self.assertEqual(len(points), 20)
+        self.assertEqual(points[-1]['weight_kg'], dog.current_weight_kg)
+
+
+@override_settings(RECORDS_REPLICA_DATABASE='replica')
+class ReplicaRoutingTests(SimpleTestCase):
+    def serve(self, request, view_class):
+        """Runs ReplicaMiddleware around a view; returns the response and where Dog rows were read."""
+        seen = {}
+
+        def view(request):
+            seen['read'] = router.db_for_read(Dog)
+            seen['write'] = router.db_for_write(Dog, instance=Dog())
+            return HttpResponse()
+        view.view_class = view_class
+
+        middleware = ReplicaMiddleware(lambda request: middleware.process_view(request, view, (), {}) or view(request))
+        return middleware(request), seen
+
+    def test_read_views_use_the_replica_until_the_user_writes(self):
+        factory = RequestFactory()
+        response, seen = self.serve(factory.get('/'), DogListView)
+        self.assertEqual(seen, {'read': 'replica', 'write': 'default'})
+        self.assertEqual(router.db_for_read(Dog), 'default')
+
+        response, seen = self.serve(factory.post('/'), DogUpdateView)
+        self.assertEqual(seen['read'], 'default')
+        self.assertIn(REPLICA_COOKIE, response.cookies)
+
+        factory.cookies[REPLICA_COOKIE] = '1'
+        response, seen = self.serve(factory.get('/'), DogListView)
+        self.assertEqual(seen['read'], 'default')
+
+    def test_other_apps_are_not_routed(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(get_user_model()))
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.charter = create_charter('Api Charter')
+        cls.owner = create_contact('Api Owner', '555-300-7000')
+        cls.dogs = create_dogs(cls.charter, 5, owner=cls.owner)
+        create_dogs(create_charter('Other Charter'), 2)
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('api'))
+
+    def get(self, resource, headers=None, **params):
+        return self.client.get(reverse('records:api_list', args=[resource]), params, headers=headers)
+
+    def test_roster_pages_with_sparse_fields(self):
+        with self.assertNumQueries(3):
+            # Session, user, page
+            page = self.get('dogs', charter=self.charter.pk, fields='name,owner_name,breed', limit=3).json()
+        self.assertEqual(page['results'][0], {'name': 'Dog 4', 'owner_name': 'Api Owner', 'breed': DogBreed.STREET_DOG})
+        rest = self.get('dogs', charter=self.charter.pk, fields='id', limit=3, cursor=page['next_cursor']).json()
+        self.assertEqual([row['id'] for row in rest['results']], [dog.pk for dog in reversed(self.dogs[:2])])
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_etag_follows_modified(self):
+        response = self.get('contacts', fields='name,notes')
+        revalidated = self.get('contacts', headers={'If-None-Match': response['ETag']}, fields='name,notes')
+        self.assertEqual(revalidated.status_code, 304)
+        self.owner.notes = 'Moved'
+        self.owner.save()
+        self.assertNotEqual(self.get('contacts', fields='name,notes')['ETag'], response['ETag'])
+        entity = self.charter.entity_info
+        charters = self.get('charters')
+        entity.save()
+        self.assertNotEqual(self.get('charters')['ETag'], charters['ETag'])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get('dogs', fields='name,secret').status_code, 400)
+        self.assertEqual(self.get('dogs', cursor='nope').status_code, 400)
+        self.assertEqual(self.get('dogs', charter='x').status_code, 400)
+        self.assertEqual(self.get('photos').status_code, 404)
+
+
+@override_settings(RECORDS_SYNC_SETTLE_SECONDS=0)
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.charter = create_charter('Sync Charter')
+        cls.other = create_charter('Other Charter')
+        cls.dogs = create_dogs(cls.charter, 5)
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('sync'))
+
+    def sync(self, resource='dogs', **params):
+        return self.client.get(reverse('records:api_changes', args=[resource]), params).json()
+
+    def test_changes_and_tombstones_since_cursor(self):
+        first = self.sync(charter=self.charter.pk, fields='id,name')
+        self.assertEqual([row['id'] for row in first['changes']], [dog.pk for dog in self.dogs])
+        self.assertEqual((first['deleted'], first['has_more']), ([], False))
+
+        edited, deleted, moved = self.dogs[:3]
+        deleted_pk = deleted.pk
+        edited.name = 'Renamed'
+        edited.save()
+        deleted.delete()
+        moved.charter = self.other
+        moved.save()
+
+        changes = self.sync(charter=self.charter.pk, fields='id,name', since=first['next_cursor'])
+        self.assertEqual(changes['changes'], [{'id': edited.pk, 'name': 'Renamed'}])
+        self.assertEqual(changes['deleted'], [deleted_pk, moved.pk])
+        # The moved dog is still there for clients of every charter
+        everywhere = self.sync(since=self.sync()['next_cursor'])
+        self.assertEqual((everywhere['changes'], everywhere['deleted']), ([], []))
+
+    def test_pages_cover_every_change_once(self):
+        Dog.objects.get(pk=self.dogs[4].pk).delete()
+        cursor, seen = '', []
+        while True:
+            page = self.sync(fields='id', limit=2, since=cursor)
+            seen += [row['id'] for row in page['changes']]
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(seen, [dog.pk for dog in self.dogs[:4]])
+
+    def test_contact_notes_edit(self):
+        contact = create_contact('Sync Owner', '555-300-0000')
+        first = self.sync('contacts', fields='id,notes')
+        contact.notes = 'Afraid of cats'
+        contact.save()
+        changes = self.sync('contacts', fields='id,notes', since=first['next_cursor'])
+        self.assertEqual(changes['changes'], [{'id': contact.pk, 'notes': 'Afraid of cats'}])
+
+    def test_gzipped_and_settled(self):
+        response = self.client.get(reverse('records:api_changes', args=['charters']), headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        with self.settings(RECORDS_SYNC_SETTLE_SECONDS=60):
+            self.assertEqual(self.sync()['changes'], [])
+
+
+class AsyncViewTests(TransactionTestCase):
+    """The async views read on their own threads and connections, so the rows are committed."""
+
+    def setUp(self):
+        cache.clear()
+        self.charter = create_charter('Async Charter')
+        create_dogs(self.charter, 25)
+        create_dogs(create_charter('Other Charter'), 2)
+        self.user = get_user_model().objects.create_user('async')
+
+    def sync_context(self, view_class, query, **kwargs):
+        request = RequestFactory().get('/', query)
+        request.user = self.user
+        response = view_class.as_view()(request, **kwargs)
+        response.render()
+        return {**response.context_data, 'dogs': list(response.context_data['dogs'])}
+
+    async def async_context(self, view_class, query, user=None, **kwargs):
+        request = AsyncRequestFactory().get('/', query)
+
+        async def auser():
+            return user or self.user
+        request.auser = auser
+        response = await view_class.as_view()(request, **kwargs)
+        if user:
+            return response
+        await sync_to_async(response.render)()
+        return response.context_data
+
+    async def test_async_views_match_the_regular_views(self):
+        for query in ({}, {'charter': self.charter.pk, 'breed': 'D', 'page': 2}, {'paginate': 'cursor', 'search': 'dog'}):
+            expected = await sync_to_async(self.sync_context)(DogListView, query)
+            context = await self.async_context(AsyncDogListView, query)
+            self.assertEqual([dog.pk for dog in context['dogs']], [dog.pk for dog in expected['dogs']])
+            self.assertEqual(context['facets'], expected['facets'])
+            self.assertEqual(context.get('page_title'), expected.get('page_title'))
+            self.assertEqual(context['page_obj'].has_next(), expected['page_obj'].has_next())
+
+        # Before the regular view caches the fragment the dogs are shown in
+        context = await self.async_context(AsyncCharterDetailView, {}, pk=self.charter.pk)
+        expected = await sync_to_async(self.sync_context)(CharterDetailView, {}, pk=self.charter.pk)
+        self.assertEqual(context['charter'], expected['charter'])
+        self.assertEqual([dog.pk for dog in context['dogs']], [dog.pk for dog in expected['dogs'][:3]])
+
+    async def test_login_required(self):
+        response = await self.async_context(AsyncDogListView, {}, user=AnonymousUser())
+        self.assertEqual(response.status_code, 302)
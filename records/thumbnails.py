@@ -0,0 +1,106 @@
+import posixpath
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from records.storage import content_addressed_storage, upload_directory
+
+# Image processing only: nothing in this module touches the database, so it can run
+# inside the process_photo_jobs worker pool.
+
+THUMBNAILS_DIR = 'thumbnails'
+
+# Rendition name -> (width, height, crop). Cropped renditions fill the box exactly
+# (object-fit: cover in the templates), the others fit inside it.
+RENDITIONS = {
+    'card': (600, 300, True),      # dog_list.html cards, 150px tall at 2x
+    'admin': (200, 200, True),     # DogAdmin preview, 100x100 at 2x
+    'header': (600, 600, False),   # dog_detail.html header, max 300x300 at 2x
+}
+THUMBNAIL_FORMAT = 'JPEG'
+THUMBNAIL_QUALITY = 85
+ORIENTATION_TAG = 0x0112
+
+
+def thumbnail_name(name, rendition):
+    """photos/husky.jpeg -> photos/thumbnails/husky_card.jpg"""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, THUMBNAILS_DIR, f'{stem}_{rendition}.jpg')
+
+
+def existing_thumbnail_url(fieldfile, rendition):
+    """URL of a rendition of fieldfile, or None if it has not been generated yet."""
+    name = thumbnail_name(fieldfile.name, rendition)
+    if not fieldfile.storage.exists(name):
+        return None
+    return fieldfile.storage.url(name)
+
+
+def render_thumbnail(image, rendition):
+    """Returns the JPEG bytes of one rendition of an already opened PIL image."""
+    width, height, crop = RENDITIONS[rendition]
+    if crop:
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail((width, height), Image.LANCZOS)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = BytesIO()
+    # Saving without exif= drops the original metadata (camera, GPS) from the rendition
+    image.save(output, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def strip_metadata(image):
+    """
+    Returns the bytes of image re-encoded without EXIF data (orientation applied to the
+    pixels first), or None if it carries no EXIF data.
+    """
+    exif = image.getexif()
+    if not exif:
+        return None
+    image_format = image.format
+    options = {'icc_profile': image.info.get('icc_profile')}
+    if exif.get(ORIENTATION_TAG, 1) == 1:
+        transposed = image
+        if image_format == 'JPEG':
+            # Reuses the original quantization tables, so the pixels are not degraded
+            options['quality'] = 'keep'
+    else:
+        transposed = ImageOps.exif_transpose(image)
+        if image_format == 'JPEG':
+            options['quality'] = 90
+    output = BytesIO()
+    transposed.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def process_photo(name, storage=None, originals=None):
+    """
+    Heavy work for a newly uploaded photo: writes its missing renditions and, if it carries
+    EXIF data, a stripped copy. Blobs are content addressed and may be shared, so the original
+    is never rewritten: the copy is a new blob the caller points the photo's records to.
+    Returns the name of the photo to show and the names of the files written.
+    """
+    storage = storage or default_storage
+    originals = originals or content_addressed_storage
+    with storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        image.load()
+    written = []
+
+    stripped = strip_metadata(image)
+    if stripped is not None:
+        name = originals.save(
+            posixpath.join(upload_directory(name), posixpath.basename(name)), ContentFile(stripped)
+        )
+        written.append(name)
+    image = ImageOps.exif_transpose(image)
+
+    for rendition in RENDITIONS:
+        rendition_name = thumbnail_name(name, rendition)
+        if not storage.exists(rendition_name):
+            written.append(storage.save(rendition_name, ContentFile(render_thumbnail(image, rendition))))
+    return name, written
@@ -1,26 +1,42 @@
 from django.urls import path
 from . import views
+from .asynchronous import select_view
 
 app_name = 'records'
 urlpatterns = [
     # Charter URLs
-    path('charter/<int:pk>/', views.CharterDetailView.as_view(), name='charter_detail'),
+    path('charter/<int:pk>/', select_view(views.CharterDetailView, views.AsyncCharterDetailView), name='charter_detail'),
     path('charter/create/', views.CharterCreateView.as_view(), name='charter_create'),
     path('charter/<int:pk>/edit/', views.CharterUpdateView.as_view(), name='charter_edit'),
     path('charter/<int:pk>/delete/', views.CharterDeleteView.as_view(), name='charter_delete'),
+    path('charter/<int:pk>/weigh-in/', views.WeighInView.as_view(), name='charter_weigh_in'),
+    path('charter/<int:pk>/weights/', views.CharterWeightTrendView.as_view(), name='charter_weights'),
 
     # Dog URLs
-    path('dogs/', views.DogListView.as_view(), name='dog_list'),  # Optional: list all dogs
+    path('dogs/', select_view(views.DogListView, views.AsyncDogListView), name='dog_list'),  # Optional: list all dogs
+    path('dogs/export/<str:file_format>/', views.DogExportView.as_view(), name='dog_export'),
     path('dog/<int:pk>/', views.DogDetailView.as_view(), name='dog_detail'),
     path('dog/create/', views.DogCreateView.as_view(), name='dog_create'),
     path('dog/<int:pk>/edit/', views.DogUpdateView.as_view(), name='dog_edit'),
     path('dog/<int:pk>/delete/', views.DogDeleteView.as_view(), name='dog_delete'),
+    path('dog/<int:pk>/weights/', views.DogWeightHistoryView.as_view(), name='dog_weights'),
+
+    # Document URLs
+    path('document/<int:pk>/download/', views.DogDocumentDownloadView.as_view(), name='document_download'),
 
     # Contact URLs
     path('contacts/', views.ContactListView.as_view(), name='contact_list'),  # Optional: list all contacts
+    path('contacts/export/<str:file_format>/', views.ContactExportView.as_view(), name='contact_export'),
     path('contact/<int:pk>/', views.ContactDetailView.as_view(), name='contact_detail'),
     path('contact/create/', views.ContactCreateView.as_view(), name='contact_create'),
     path('contact/<int:pk>/edit/', views.ContactUpdateView.as_view(), name='contact_edit'),
     path('contact/<int:pk>/delete/', views.ContactDeleteView.as_view(), name='contact_delete'),
 
+    # Import URLs
+    path('import/', views.ImportView.as_view(), name='import'),
+
+    # JSON API URLs
+    path('api/<str:resource>/', views.ApiListView.as_view(), name='api_list'),
+    path('api/<str:resource>/changes/', views.ApiChangesView.as_view(), name='api_changes'),
+
 ]
\ No newline at end of file
@@ -0,0 +1,54 @@
+from functools import reduce
+from operator import or_
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Fields that must not repeat between records, with the label used in messages. They are
+# not unique in the schema because existing records may repeat them; instead every check
+# is one query, an OR of index lookups (see the EntityInfo and Dog indexes), that excludes
+# the records being checked and finds all conflicting fields at once.
+ENTITY_UNIQUE_FIELDS = {'name': 'Name', 'email': 'Email', 'phone': 'Phone'}
+DOG_UNIQUE_FIELDS = {'microchip_id': 'Microchip ID'}
+
+
+def taken_values(instances, fields):
+    """{field: values} of the instances' field values already used by other rows, in one query"""
+    model = type(instances[0]) if instances else None
+    values = {
+        field: {getattr(instance, field) for instance in instances if getattr(instance, field)}
+        for field in fields
+    }
+    taken = {field: set() for field in fields}
+    conditions = [Q(**{f'{field}__in': field_values}) for field, field_values in values.items() if field_values]
+    if not conditions:
+        return taken
+
+    rows = model._default_manager.filter(reduce(or_, conditions))
+    rows = rows.exclude(pk__in=[instance.pk for instance in instances if instance.pk is not None])
+    for row in rows.values_list(*fields):
+        for field, value in zip(fields, row):
+            if value in values[field]:
+                taken[field].add(value)
+    return taken
+
+
+def unique_conflicts(instances, fields):
+    """{id(instance): {field: message}} for the instances with a value another row already has"""
+    taken = taken_values(instances, list(fields))
+    conflicts = {}
+    for instance in instances:
+        messages = {
+            field: f'{label} {getattr(instance, field)} already exists'
+            for field, label in fields.items()
+            if getattr(instance, field) in taken[field]
+        }
+        if messages:
+            conflicts[id(instance)] = messages
+    return conflicts
+
+
+def validate_unique_fields(instance, fields):
+    """Raises a ValidationError listing every field whose value another row already has."""
+    conflicts = unique_conflicts([instance], fields)
+    if conflicts:
+        raise ValidationError(conflicts[id(instance)])
@@ -1,46 +1,70 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
+import csv
+import io
+import posixpath
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import ValidationError
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.shortcuts import redirect
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect, get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from django.views.generic import (
     DetailView, CreateView, UpdateView, DeleteView,
-    ListView
+    FormView, ListView, View
+)
+from .models import (
+    Dog, Contact, Charter, CharterStats, EntityInfo, DogPhotoRecord, DogDocumentRecord, DogWeightRecord,
+    DogHealthStatus
+)
+from .api import RESOURCES, api_response
+from .asynchronous import AsyncLoginRequiredMixin, run_concurrently
+from .caching import CachedObjectMixin, VersionedCacheMixin, cached, model_versions
+from .downloads import serve_file
+from .exports import CONTACT_EXPORT, DOG_EXPORT, EXPORT_FORMATS, export_response
+from .pagination import CursorPaginationMixin
+from .replicas import ReplicaReadMixin
+from .search import search_dogs, search_entities
+from .sync import sync_response
+from .facets import apply_facets, build_facets, range_filters, selected_facets
+from .forms import DogForm, ContactForm, CharterForm, ImportForm, WeighInForm
+from .imports import ContactImporter, DogImporter
+from .statistics import counters_from_stats, global_context
+from .weights import (
+    DEFAULT_POINTS, MAX_POINTS, TREND_DAYS, charter_weight_trends, dog_weight_history, record_weigh_in, weight_chart
 )
-from .models import Dog, Contact, Charter, DogHealthStatus
-from .forms import DogForm, ContactForm, CharterForm
 # Create your views here.
 # =============================================================================
 # CHARTER VIEWS
 # =============================================================================
 
-class CharterDetailView(LoginRequiredMixin, DetailView):
+class CharterDetailView(LoginRequiredMixin, ReplicaReadMixin, CachedObjectMixin, DetailView):
     """Charter detail with dogs and contacts"""
     model = Charter
     template_name = 'records/charter_detail.html'
     context_object_name = 'charter'
+    cache_models = (Charter, CharterStats, EntityInfo, Dog)
+
+    def get_queryset(self):
+        return Charter.objects.select_related('entity_info', 'stats')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         charter = self.object
 
-        # Get related objects
-        dogs = charter.housed_dogs.select_related('owner').all()
-
-        # Charter statistics
+        # Charter statistics, read from the precomputed CharterStats row
         context.update({
-            'dogs': dogs,
-            'charter_stats': {
-                'total_dogs': dogs.count(),
-                'owned_dogs': dogs.filter(owner__isnull=False).count(),
-                'unowned_dogs': dogs.filter(owner__isnull=True).count(),
-                'healthy_dogs': dogs.filter(health_status=DogHealthStatus.HEALTHY).count(),
-                'sick_dogs': dogs.filter(health_status=DogHealthStatus.SICK).count(),
-                'passed_away_dogs': dogs.filter(health_status=DogHealthStatus.PASSED_AWAY).count(),
-                'unspecified_health_dogs': dogs.filter(health_status=DogHealthStatus.UNSPECIFIED).count(),
-            }
+            'dogs': self.get_dogs(),
+            'charter_stats': global_context(counters_from_stats(getattr(charter, 'stats', None))),
         })
         return context
 
+    def get_dogs(self):
+        return self.object.housed_dogs.select_related('owner').all()
+
 
 class CharterCreateView(LoginRequiredMixin, CreateView):
     model = Charter
@@ -180,49 +204,80 @@ class ContactDeleteView(LoginRequiredMixin, DeleteView):
 # DOG VIEWS
 # =============================================================================
 
-class DogListView(LoginRequiredMixin, ListView):
-    """List all dogs - useful for search/filtering later"""
+class DogFilterMixin:
+    """Dog filters read from the query string, shared by the dog list and its export"""
+
+    def get_filtered_queryset(self):
+        """Dogs matching every filter except the facets, which build_facets counts against"""
+        queryset = Dog.objects.all()
+        charter_id = self.request.GET.get('charter')
+        if charter_id:
+            queryset = queryset.filter(charter_id=charter_id)
+
+        # Age (months) and weight (kg) ranges
+        queryset = queryset.filter(**range_filters(self.request.GET))
+
+        queryset = search_dogs(queryset, self.request.GET.get('search'))
+        return queryset
+
+    def get_matching_queryset(self):
+        return apply_facets(self.get_filtered_queryset(), selected_facets(self.request.GET))
+
+
+class DogListView(LoginRequiredMixin, ReplicaReadMixin, DogFilterMixin, CursorPaginationMixin, VersionedCacheMixin, ListView):
+    """List all dogs - useful for search/filtering later; ?paginate=cursor for keyset pages"""
     model = Dog
     template_name = 'records/dog_list.html'
     context_object_name = 'dogs'
     paginate_by = 20  # Pagination for large lists
+    # Dog cards are cached fragments
+    cache_models = (Dog, DogPhotoRecord, Charter, EntityInfo)
 
     def get_queryset(self):
-        queryset = Dog.objects.select_related('charter', 'owner').all()
-        charter_id = self.request.GET.get('charter')
-        if charter_id:
-            queryset = queryset.filter(charter_id=charter_id)
-        
-        # Filter by adoption status
-        status = self.request.GET.get('status')
-        if status:
-            queryset = queryset.filter(adoption_status=status)
-        
-        return queryset.order_by('-created')
+        queryset = self.get_matching_queryset()
+        return queryset.select_related('charter__entity_info', 'owner').order_by('-created', '-id')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        charter_id = self.request.GET.get('charter')
-        if charter_id:
-            try:
-                charter = Charter.objects.get(id=charter_id)
+        if self.request.GET.get('charter'):
+            charter = self.get_charter()
+            if charter:
                 context['charter'] = charter
-                context['page_title'] = f'Dogs in {charter.name}'
-            except Charter.DoesNotExist:
-                pass
+                context['page_title'] = f'Dogs in {charter.entity_info.name}'
         else:
             context['page_title'] = 'All Dogs'
+        context['facets'] = self.get_facets()
         return context
 
+    def get_charter(self):
+        """The charter the list is filtered on, if any"""
+        charter_id = self.request.GET.get('charter')
+        if not charter_id:
+            return None
+        try:
+            return Charter.objects.select_related('entity_info').get(id=charter_id)
+        except Charter.DoesNotExist:
+            return None
+
+    def get_facets(self):
+        return build_facets(self.get_filtered_queryset(), self.request.GET)
 
-class DogDetailView(LoginRequiredMixin, DetailView):
+
+class DogDetailView(LoginRequiredMixin, CachedObjectMixin, DetailView):
     model = Dog
     template_name = 'records/dog_detail.html'
     context_object_name = 'dog'
+    cache_models = (Dog, DogPhotoRecord, DogDocumentRecord, DogWeightRecord, Charter, EntityInfo)
 
     def get_queryset(self):
         # Optimize query with related objects
-        return Dog.objects.select_related('charter', 'owner')
+        return Dog.objects.select_related('charter__entity_info', 'owner')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Called by the template only when the cached fragment is rendered
+        context['weight_chart'] = lambda: weight_chart(dog_weight_history(self.object.pk))
+        return context
 
 
 class DogCreateView(LoginRequiredMixin, CreateView):
@@ -284,21 +339,51 @@ class DogDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+class DogExportView(LoginRequiredMixin, ReplicaReadMixin, DogFilterMixin, View):
+    """Streams the dogs matching the dog list's filters as CSV or XLSX"""
+
+    def get(self, request, file_format):
+        if file_format not in EXPORT_FORMATS:
+            raise Http404(f'Unknown export format {file_format}')
+        queryset = self.get_matching_queryset().order_by('-created', '-id')
+        return export_response(DOG_EXPORT, queryset, file_format)
+
+
+# =============================================================================
+# DOCUMENT VIEWS
+# =============================================================================
+
+class DogDocumentDownloadView(LoginRequiredMixin, View):
+    """Streams a dog document; ?download=1 asks the browser to save it instead of showing it"""
+
+    def get(self, request, pk):
+        document = get_object_or_404(DogDocumentRecord, pk=pk)
+        extension = posixpath.splitext(document.document.name)[1]
+        return serve_file(
+            request,
+            document.document,
+            filename=f'{document.title}{extension}',
+            as_attachment=bool(request.GET.get('download')),
+        )
+
+
 # =============================================================================
 # CONTACT VIEWS
 # =============================================================================
 
-class ContactListView(LoginRequiredMixin, ListView):
-    """List all contacts - useful for search/filtering later"""
+class ContactListView(LoginRequiredMixin, ReplicaReadMixin, CursorPaginationMixin, ListView):
+    """List all contacts - useful for search/filtering later; ?paginate=cursor for keyset pages"""
     model = Contact
     template_name = 'records/contact_list.html'
     context_object_name = 'contacts'
     paginate_by = 20  # Pagination for large lists
+    cursor_field = 'entity_info__created'
 
     def get_queryset(self):
         queryset = Contact.objects.select_related('entity_info').all()
         # Note: Contact doesn't have charter field anymore
-        return queryset.order_by('-entity_info__created')
+        queryset = search_entities(queryset, self.request.GET.get('search'))
+        return queryset.order_by('-entity_info__created', '-id')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -306,5 +391,212 @@ class ContactListView(LoginRequiredMixin, ListView):
         return context
 
 
+class ContactExportView(LoginRequiredMixin, ReplicaReadMixin, View):
+    """Streams the contacts matching the contact list's search as CSV or XLSX"""
+
+    def get(self, request, file_format):
+        if file_format not in EXPORT_FORMATS:
+            raise Http404(f'Unknown export format {file_format}')
+        queryset = search_entities(Contact.objects.all(), request.GET.get('search'))
+        return export_response(CONTACT_EXPORT, queryset.order_by('-entity_info__created', '-id'), file_format)
+
+
+# =============================================================================
+# IMPORT VIEWS
+# =============================================================================
+
+class ImportView(LoginRequiredMixin, UserPassesTestMixin, FormView):
+    """Staff-only CSV import of dogs or contacts; lists the rows that were rejected"""
+    template_name = 'records/import.html'
+    form_class = ImportForm
+    errors_shown = 500
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def form_valid(self, form):
+        data = form.cleaned_data
+        if data['records'] == 'dogs':
+            importer = DogImporter(charter=data['charter'], dry_run=data['dry_run'])
+        else:
+            importer = ContactImporter(dry_run=data['dry_run'])
+        # Read straight from the uploaded (memory or temporary) file, row by row
+        file = io.TextIOWrapper(data['file'].file, encoding='utf-8-sig', newline='')
+        try:
+            result = importer.run(file)
+        except ValidationError as error:
+            form.add_error('file', error)
+            return self.form_invalid(form)
+        except (UnicodeDecodeError, csv.Error):
+            form.add_error('file', 'The file is not a UTF-8 encoded CSV file.')
+            return self.form_invalid(form)
+        if result.created and not data['dry_run']:
+            messages.success(self.request, f"Imported {result.created} {data['records']}.")
+        return self.render_to_response(self.get_context_data(
+            form=form,
+            result=result,
+            dry_run=data['dry_run'],
+            errors=result.errors[:self.errors_shown],
+            hidden_errors=max(len(result.errors) - self.errors_shown, 0),
+        ))
+
+
+# =============================================================================
+# WEIGHT VIEWS
+# =============================================================================
+
+def query_int(request, name, default, low, high):
+    """Integer query parameter, clamped to [low, high]; default when missing or invalid"""
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        value = default
+    return min(max(value, low), high)
+
+
+class DogWeightHistoryView(LoginRequiredMixin, ReplicaReadMixin, View):
+    """A dog's weight history as JSON, downsampled to ?points= points"""
+
+    def get(self, request, pk):
+        points = query_int(request, 'points', DEFAULT_POINTS, 2, MAX_POINTS)
+        key = f'records:weights:dog:{pk}:{points}:{model_versions(Dog, DogWeightRecord)}'
+
+        def compute():
+            if not Dog.objects.filter(pk=pk).exists():
+                return None
+            return [
+                {'date': point['date'].isoformat(), 'weight_kg': point['weight_kg']}
+                for point in dog_weight_history(pk, points)
+            ]
+
+        history = cached(key, compute)
+        if history is None:
+            raise Http404('Dog not found')
+        return JsonResponse({'dog': pk, 'points': history})
+
+
+class CharterWeightTrendView(LoginRequiredMixin, ReplicaReadMixin, View):
+    """Growth and loss of a charter's dogs over the last ?days= days as JSON"""
+
+    def get(self, request, pk):
+        days = query_int(request, 'days', TREND_DAYS, 1, 3650)
+        key = f'records:weights:charter:{pk}:{days}:{model_versions(Charter, Dog, DogWeightRecord)}'
+
+        def compute():
+            if not Charter.objects.filter(pk=pk).exists():
+                return None
+            trends = charter_weight_trends(pk, days)
+            for week in trends['weekly']:
+                week['week'] = week['week'].date().isoformat()
+            return trends
+
+        trends = cached(key, compute)
+        if trends is None:
+            raise Http404('Charter not found')
+        return JsonResponse({'charter': pk, **trends})
+
+
+class WeighInView(LoginRequiredMixin, FormView):
+    """Weigh-in session for a charter's kennel, saved in one transaction"""
+    template_name = 'records/weigh_in.html'
+    form_class = WeighInForm
+
+    def get_charter(self):
+        if not hasattr(self, 'charter'):
+            self.charter = get_object_or_404(Charter.objects.select_related('entity_info'), pk=self.kwargs['pk'])
+        return self.charter
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['dogs'] = list(
+            self.get_charter().housed_dogs.exclude(
+                health_status=DogHealthStatus.PASSED_AWAY
+            ).only('pk', 'charter', 'name', 'current_weight_kg').order_by('name', 'pk')
+        )
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['charter'] = self.get_charter()
+        return context
+
+    def form_valid(self, form):
+        records = record_weigh_in(form.weights, form.cleaned_data['record_date'])
+        messages.success(self.request, f'Recorded {len(records)} weights.')
+        return redirect('records:charter_detail', pk=self.get_charter().pk)
+
+
+# =============================================================================
+# API VIEWS
+# =============================================================================
+
+class ApiListView(LoginRequiredMixin, ReplicaReadMixin, View):
+    """JSON pages of dogs, charters or contacts for the mobile apps (see records.api)"""
+    # API clients get a 403 rather than the login page
+    raise_exception = True
+
+    def get(self, request, resource):
+        if resource not in RESOURCES:
+            raise Http404(f'Unknown resource {resource}')
+        return api_response(request, RESOURCES[resource])
+
+
+@method_decorator(gzip_page, name='dispatch')
+class ApiChangesView(LoginRequiredMixin, ReplicaReadMixin, View):
+    """Gzipped feed of the dogs, charters or contacts changed since ?since= (see records.sync)"""
+    raise_exception = True
+
+    def get(self, request, resource):
+        if resource not in RESOURCES:
+            raise Http404(f'Unknown resource {resource}')
+        return sync_response(request, resource, RESOURCES[resource])
+
+
+# =============================================================================
+# ASYNC VIEWS (served instead of the views above when ASYNC_VIEWS is on)
+# =============================================================================
+
+class AsyncCharterDetailView(AsyncLoginRequiredMixin, CharterDetailView):
+    """CharterDetailView reading the charter and its first dogs at the same time"""
+
+    async def get(self, request, *args, **kwargs):
+        await sync_to_async(self.get_cache_versions, thread_sensitive=False)()
+        self.object, self.first_dogs = await run_concurrently(self.get_object, self.read_first_dogs)
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    def read_first_dogs(self):
+        # The template shows three dogs, inside a cached fragment
+        pk = self.kwargs[self.pk_url_kwarg]
+        if cache.has_key(make_template_fragment_key('charter_detail', [pk, self.get_cache_versions()])):
+            return []
+        return list(Dog.objects.filter(charter_id=pk).select_related('owner')[:3])
+
+    def get_dogs(self):
+        return self.first_dogs
+
+
+class AsyncDogListView(AsyncLoginRequiredMixin, DogListView):
+    """DogListView reading the page, the filter charter and the facet counts at the same time"""
+
+    async def get(self, request, *args, **kwargs):
+        self.paginated, self.charter, self.facets, _ = await run_concurrently(
+            self.read_page, super().get_charter, super().get_facets, self.get_cache_versions
+        )
+        return self.render_to_response(self.get_context_data())
+
+    def read_page(self):
+        self.object_list = self.get_queryset()
+        paginator, page, dogs, is_paginated = super().paginate_queryset(
+            self.object_list, self.get_paginate_by(self.object_list)
+        )
+        page.object_list = dogs = list(dogs)
+        return paginator, page, dogs, is_paginated
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.paginated
 
+    def get_charter(self):
+        return self.charter
 
+    def get_facets(self):
+        return self.facets
@@ -0,0 +1,138 @@
+from datetime import timedelta
+from functools import partial
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Avg, Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+from records.caching import bump_version
+from records.models import Dog, DogWeightRecord
+
+# Weight histories are served downsampled: a dog weighed daily for years still comes back
+# as a handful of points that keep the shape of the curve. Charter trends are computed by
+# the database (first and last weigh-in per dog in the period, weekly averages) rather than
+# by loading the records.
+DEFAULT_POINTS = 60
+MAX_POINTS = 500
+TREND_DAYS = 90
+# A dog whose weight changed by less than this share over the period counts as stable
+STABLE_CHANGE = 0.03
+
+
+def downsample(points, target):
+    """
+    Reduces (x, y, ...) points sorted by x to at most target points with
+    Largest-Triangle-Three-Buckets: the first and last points are kept, and from each
+    bucket in between the point forming the largest triangle with its neighbours.
+    """
+    if len(points) <= target:
+        return list(points)
+    if target < 3:
+        return [points[0], points[-1]][:max(target, 0)]
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (target - 2)
+    previous = points[0]
+    for bucket in range(target - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        # The next bucket's average stands in for the point not chosen yet
+        following = points[end:min(int((bucket + 2) * bucket_size) + 1, len(points) - 1)] or [points[-1]]
+        next_x = sum(point[0] for point in following) / len(following)
+        next_y = sum(point[1] for point in following) / len(following)
+
+        best, best_area = None, -1
+        for point in points[start:end]:
+            area = abs(
+                (previous[0] - next_x) * (point[1] - previous[1])
+                - (previous[0] - point[0]) * (next_y - previous[1])
+            )
+            if area > best_area:
+                best, best_area = point, area
+        sampled.append(best)
+        previous = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def dog_weight_history(dog_id, points=DEFAULT_POINTS):
+    """[{'date', 'weight_kg'}] of a dog's weigh-ins, oldest first, downsampled to points."""
+    records = DogWeightRecord.objects.filter(dog_id=dog_id).order_by('record_date', 'id')
+    series = [
+        (record_date.timestamp(), weight_kg, record_date)
+        for record_date, weight_kg in records.values_list('record_date', 'weight_kg')
+    ]
+    return [
+        {'date': record_date, 'weight_kg': weight_kg}
+        for timestamp, weight_kg, record_date in downsample(series, points)
+    ]
+
+
+def weight_chart(history, width=600, height=160, padding=8):
+    """SVG polyline coordinates for a history from dog_weight_history()"""
+    if len(history) < 2:
+        return None
+    dates = [point['date'].timestamp() for point in history]
+    weights = [point['weight_kg'] for point in history]
+    low, high = min(weights), max(weights)
+    x_scale = (width - 2 * padding) / ((dates[-1] - dates[0]) or 1)
+    y_scale = (height - 2 * padding) / ((high - low) or 1)
+    coordinates = ' '.join(
+        f'{padding + (date - dates[0]) * x_scale:.1f},{height - padding - (weight - low) * y_scale:.1f}'
+        for date, weight in zip(dates, weights)
+    )
+    return {'points': coordinates, 'width': width, 'height': height, 'min_kg': low, 'max_kg': high}
+
+
+def charter_weight_trends(charter_id, days=TREND_DAYS):
+    """
+    Growth and loss of a charter's dogs over the last days: how many gained, lost or kept
+    their weight between their first and last weigh-in of the period, the average change,
+    and the weekly average weight. Two queries.
+    """
+    since = timezone.now() - timedelta(days=days)
+    records = DogWeightRecord.objects.filter(dog=OuterRef('pk'), record_date__gte=since)
+    dogs = Dog.objects.filter(charter_id=charter_id).annotate(
+        first_kg=Subquery(records.order_by('record_date', 'id').values('weight_kg')[:1]),
+        last_kg=Subquery(records.order_by('-record_date', '-id').values('weight_kg')[:1]),
+    ).filter(first_kg__isnull=False).annotate(change_kg=F('last_kg') - F('first_kg'))
+    summary = dogs.aggregate(
+        weighed=Count('pk'),
+        gaining=Count('pk', filter=Q(change_kg__gt=F('first_kg') * STABLE_CHANGE)),
+        losing=Count('pk', filter=Q(change_kg__lt=F('first_kg') * -STABLE_CHANGE)),
+        average_change_kg=Avg('change_kg'),
+    )
+    summary['stable'] = summary['weighed'] - summary['gaining'] - summary['losing']
+
+    weekly = DogWeightRecord.objects.filter(
+        dog__charter_id=charter_id, record_date__gte=since
+    ).annotate(
+        week=TruncWeek('record_date')
+    ).values('week').annotate(
+        average_kg=Avg('weight_kg'), weigh_ins=Count('pk'), dogs=Count('dog', distinct=True)
+    ).order_by('week')
+    return {'days': days, **summary, 'weekly': list(weekly)}
+
+
+def record_weigh_in(weights, record_date=None):
+    """
+    Records a weigh-in session, {dog ID: weight in kg} for a whole kennel, in one
+    transaction: one INSERT for the records and one UPDATE of the dogs' current weights.
+    """
+    record_date = record_date or timezone.now()
+    records = [
+        DogWeightRecord(dog_id=dog_id, weight_kg=weight_kg, record_date=record_date)
+        for dog_id, weight_kg in weights.items()
+    ]
+    for record in records:
+        record.clean()
+    if not records:
+        raise ValidationError('No weights were entered')
+
+    with transaction.atomic():
+        DogWeightRecord.objects.bulk_create(records)
+        # From the latest weigh-in rather than this session's, which may be backdated
+        Dog.objects.filter(pk__in=weights).refresh_current_weights()
+        # bulk_create and update() send no signals
+        transaction.on_commit(partial(bump_version, Dog, DogWeightRecord))
+    return records